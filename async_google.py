@@ -0,0 +1,143 @@
+"""Асинхронный режим работы с Google Drive, Sheets и Docs.
+
+AsyncGoogleClient выполняет блокирующие запросы googleapiclient в пуле
+потоков (у каждого потока свои клиенты и соединения), поэтому независимые
+вызовы можно запускать одновременно через asyncio.gather::
+
+    async with AsyncGoogleClient() as google:
+        form, base = await asyncio.gather(
+            google.get_values(FORM_RESPONSES_ID, "A:Z"),
+            google.get_values(BASE_ID, "A:U"),
+        )
+
+Для проверки без доступа к Google можно передать api_endpoints с адресами
+локального сервера и credentials=AnonymousCredentials().
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from google_services import new_service
+
+ASYNC_WORKERS = 8
+
+# Версии API, с которыми работает фасад
+API_VERSIONS = {"drive": "v3", "sheets": "v4", "docs": "v1"}
+
+
+class AsyncGoogleClient:
+    """Асинхронный фасад над используемыми в проекте методами Google API."""
+
+    def __init__(self, service_account_file=None, workers=ASYNC_WORKERS,
+                 credentials=None, api_endpoints=None):
+        self.service_account_file = service_account_file
+        self.credentials = credentials
+        self.api_endpoints = api_endpoints or {}
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._local = threading.local()
+
+    def _service(self, api):
+        services = getattr(self._local, "services", None)
+        if services is None:
+            services = self._local.services = {}
+        if api not in services:
+            services[api] = new_service(
+                api, API_VERSIONS[api], self.service_account_file,
+                credentials=self.credentials,
+                api_endpoint=self.api_endpoints.get(api))
+        return services[api]
+
+    def _execute(self, api, make_request):
+        return make_request(self._service(api)).execute()
+
+    async def _call(self, api, make_request):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._execute, api, make_request)
+
+    async def close(self):
+        self._executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.close()
+        return False
+
+    # ----------------------------- Drive ----------------------------- #
+
+    async def list_files(self, **kwargs):
+        return await self._call("drive", lambda s: s.files().list(**kwargs))
+
+    async def get_file(self, file_id, **kwargs):
+        return await self._call(
+            "drive", lambda s: s.files().get(fileId=file_id, **kwargs))
+
+    async def create_file(self, body, **kwargs):
+        return await self._call(
+            "drive", lambda s: s.files().create(body=body, **kwargs))
+
+    async def copy_file(self, file_id, body, **kwargs):
+        return await self._call(
+            "drive", lambda s: s.files().copy(fileId=file_id, body=body, **kwargs))
+
+    async def update_file(self, file_id, body=None, **kwargs):
+        return await self._call(
+            "drive", lambda s: s.files().update(fileId=file_id, body=body, **kwargs))
+
+    # ----------------------------- Sheets ---------------------------- #
+
+    async def get_sheet_titles(self, spreadsheet_id):
+        """Названия листов таблицы в порядке их следования."""
+        response = await self._call(
+            "sheets",
+            lambda s: s.spreadsheets().get(
+                spreadsheetId=spreadsheet_id, fields="sheets.properties.title"),
+        )
+        return [sheet["properties"]["title"] for sheet in response.get("sheets", [])]
+
+    async def get_sheet_properties(self, spreadsheet_id, fields="sheets.properties", **kwargs):
+        """Листы таблицы (элементы sheets ответа spreadsheets.get)."""
+        response = await self._call(
+            "sheets",
+            lambda s: s.spreadsheets().get(
+                spreadsheetId=spreadsheet_id, fields=fields, **kwargs),
+        )
+        return response.get("sheets", [])
+
+    async def get_values(self, spreadsheet_id, range, **kwargs):
+        response = await self._call(
+            "sheets",
+            lambda s: s.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id, range=range, **kwargs),
+        )
+        return response.get("values", [])
+
+    async def batch_get_values(self, spreadsheet_id, ranges, **kwargs):
+        response = await self._call(
+            "sheets",
+            lambda s: s.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheet_id, ranges=ranges, **kwargs),
+        )
+        return [value_range.get("values", [])
+                for value_range in response.get("valueRanges", [])]
+
+    async def batch_update_values(self, spreadsheet_id, body):
+        return await self._call(
+            "sheets",
+            lambda s: s.spreadsheets().values().batchUpdate(
+                spreadsheetId=spreadsheet_id, body=body),
+        )
+
+    # ------------------------------ Docs ----------------------------- #
+
+    async def create_document(self, body):
+        return await self._call("docs", lambda s: s.documents().create(body=body))
+
+    async def batch_update_document(self, document_id, requests):
+        return await self._call(
+            "docs",
+            lambda s: s.documents().batchUpdate(
+                documentId=document_id, body={"requests": requests}),
+        )
@@ -1,6 +1,17 @@
-import pygsheets
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
+import sys
+
+import pandas as pd
+
+import sheets_loader
+from drive_listing import iter_children
+from google_services import (
+    get_docs_service,
+    get_drive_service,
+    get_pygsheets_client,
+    get_sheets_service,
+)
+from profiling import PROFILE_FLAG, stage, start_profiling
+from student_schema import BDNS_SCHEMA, OPK_SCHEMA, apply_schema
 
 # Константы для столбцов
 VMK_COLUMNS = [
@@ -34,53 +45,80 @@ OPK_COLUMNS = [
 ]
 
 
+def same_value(raw_a, raw_b, parsed_a, parsed_b):
+    """Равны ли ячейки: совпадает их текст или оба значения, приведённые к схеме.
+
+    Ячейки, которые не удалось разобрать (пропуск после приведения), равны
+    только при одинаковом тексте.
+    """
+    if str(raw_a).strip() == str(raw_b).strip():
+        return True
+    return pd.notna(parsed_a) and pd.notna(parsed_b) and parsed_a == parsed_b
+
+
 class DatabaseComparator:
     def __init__(self, vmk_sheet_id, folder_id, credentials_file):
         self.vmk_sheet_id = vmk_sheet_id
         self.folder_id = folder_id
         self.credentials_file = credentials_file
-        self.gc = pygsheets.authorize(service_file=self.credentials_file)
-        self.doc_credentials = service_account.Credentials.from_service_account_file(
-            self.credentials_file,
-            scopes=[
-                "https://www.googleapis.com/auth/documents",
-                "https://www.googleapis.com/auth/drive",
-            ],
-        )
-        self.drive_service = build(
-            "drive", "v3", credentials=self.doc_credentials)
+
+    # Клиенты берутся из общего реестра и создаются при первом обращении
+    @property
+    def gc(self):
+        return get_pygsheets_client(self.credentials_file)
+
+    @property
+    def drive_service(self):
+        return get_drive_service(self.credentials_file)
+
+    @property
+    def docs_service(self):
+        return get_docs_service(self.credentials_file)
 
     def find_opk_sheet_id(self, sheet_name):
-        query = f"name = '{sheet_name}' and mimeType = 'application/vnd.google-apps.spreadsheet' and '{
-            self.folder_id}' in parents"
-        response = (
-            self.drive_service.files()
-            .list(q=query, spaces="drive", fields="files(id, name)")
-            .execute()
+        sheet = next(
+            iter_children(
+                self.drive_service,
+                self.folder_id,
+                name=sheet_name,
+                mime_type="application/vnd.google-apps.spreadsheet",
+                fields="id",
+            ),
+            None,
         )
-        files = response.get("files", [])
-        if not files:
+        if sheet is None:
             raise FileNotFoundError(
                 f"Таблица '{sheet_name}' не найдена в указанной папке."
             )
-        return files[0]["id"]
+        return sheet["id"]
 
     def load_sheets(self, opk_sheet_id):
-        opk_sheet = self.gc.open_by_key(opk_sheet_id)
-        vmk_sheet = self.gc.open_by_key(self.vmk_sheet_id)
-        return opk_sheet[0].get_as_df(), vmk_sheet[0].get_as_df()
+        # Только сравниваемые столбцы первых листов обеих баз, текстом как в
+        # таблице (к типам они приводятся в compare_sheets); неизменившаяся
+        # база берётся из локальной копии
+        return sheets_loader.load_sheets(
+            get_sheets_service(self.credentials_file),
+            [
+                sheets_loader.SheetSpec(opk_sheet_id, 0, OPK_COLUMNS),
+                sheets_loader.SheetSpec(self.vmk_sheet_id, 0, VMK_COLUMNS),
+            ],
+            typed=False,
+            snapshots=sheets_loader.SnapshotCache(self.drive_service),
+        )
 
     def compare_sheets(self, df_opk, df_vmk):
-        df_opk_selected = df_opk.rename(
-            columns={
-                "Студ. билет": "Студенческий",
-                "Профбилет": "Профсоюзный",
-                "бюдж\\контр": "Форма",
-                "Справки": "Срок действия",
-                "Счет": "Счёт",
-            }
-        )[VMK_COLUMNS]
+        opk_columns = {
+            "Студ. билет": "Студенческий",
+            "Профбилет": "Профсоюзный",
+            "бюдж\\контр": "Форма",
+            "Справки": "Срок действия",
+            "Счет": "Счёт",
+        }
+        df_opk_selected = df_opk.rename(columns=opk_columns)[VMK_COLUMNS]
         df_vmk_selected = df_vmk[VMK_COLUMNS]
+        # Значения, приведённые к схемам баз: номера числами, даты датами
+        opk_parsed = apply_schema(df_opk, OPK_SCHEMA).rename(columns=opk_columns)
+        vmk_parsed = apply_schema(df_vmk, BDNS_SCHEMA)
 
         output = []
         if len(df_opk_selected) != len(df_vmk_selected):
@@ -104,9 +142,11 @@ class DatabaseComparator:
                 )
                 continue
 
-            vmk_row = vmk_rows.iloc[0]
+            vmk_idx = vmk_rows.index[0]
+            vmk_row = vmk_rows.loc[vmk_idx]
             for column in VMK_COLUMNS:
-                if opk_row[column] != vmk_row[column]:
+                if not same_value(opk_row[column], vmk_row[column],
+                                  opk_parsed.at[idx, column], vmk_parsed.at[vmk_idx, column]):
                     mismatches.append(
                         {
                             "Фамилия": opk_row["Фамилия"],
@@ -134,9 +174,8 @@ class DatabaseComparator:
         return output
 
     def create_report(self, output):
-        docs_service = build("docs", "v1", credentials=self.doc_credentials)
         document = (
-            docs_service.documents()
+            self.docs_service.documents()
             .create(body={"title": "Отчет о различиях с базой ОПК"})
             .execute()
         )
@@ -176,23 +215,29 @@ class DatabaseComparator:
 
             current_index += len(line)
 
-        docs_service.documents().batchUpdate(
+        self.docs_service.documents().batchUpdate(
             documentId=document_id, body={"requests": requests}
         ).execute()
 
-        file_service = build("drive", "v3", credentials=self.doc_credentials)
-        file_service.files().update(
+        self.drive_service.files().update(
             fileId=document_id, addParents=self.folder_id
         ).execute()
 
         document_url = f"https://docs.google.com/document/d/{document_id}"
         return document_url
 
-    def run(self):
-        opk_sheet_id = self.find_opk_sheet_id("Копия базы ОПК")
-        df_opk, df_vmk = self.load_sheets(opk_sheet_id)
-        output = self.compare_sheets(df_opk, df_vmk)
-        report_url = self.create_report(output)
+    def run(self, profile=False):
+        # profile=True - профилирование по этапам, см. profiling.py
+        if profile:
+            start_profiling()
+        with stage("folders"):
+            opk_sheet_id = self.find_opk_sheet_id("Копия базы ОПК")
+        with stage("sheet_load"):
+            df_opk, df_vmk = self.load_sheets(opk_sheet_id)
+        with stage("join"):
+            output = self.compare_sheets(df_opk, df_vmk)
+        with stage("docs"):
+            report_url = self.create_report(output)
         print(f"Отчет готов: {report_url}")
 
 
@@ -202,4 +247,4 @@ if __name__ == "__main__":
         folder_id="1dXJ-Ll1sgUrRXXlc74GU28D1QLX-yOJI",
         credentials_file="credentials.json",
     )
-    comparator.run()
+    comparator.run(profile=PROFILE_FLAG in sys.argv[1:])
@@ -1,33 +1,17 @@
 # __________ #
 from datetime import datetime
-from oauth2client.service_account import ServiceAccountCredentials
-import apiclient
-import httplib2
-import pygsheets
+import asyncio
 import pandas as pd
 
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google.oauth2 import service_account
-
-credentials = service_account.Credentials.from_service_account_file(
-    "credentials.json", scopes=["https://www.googleapis.com/auth/drive"]
-)
-drive_service = build("drive", "v3", credentials)
+from async_google import AsyncGoogleClient
+from google_services import get_docs_service, get_drive_service
+from profiling import profile_from_argv, set_stage
+from sheets_loader import SheetSpec, SnapshotCache, load_sheets_async
 
+# python big_list.py --profile - запуск с профилированием по этапам
+profile_from_argv()
 
 CREDENTIALS_FILE = "credentials.json"  # имя файла с закрытым ключом
-credentials = ServiceAccountCredentials.from_json_keyfile_name(
-    CREDENTIALS_FILE,
-    [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ],
-)
-httpAuth = credentials.authorize(httplib2.Http())
-sheets_service = apiclient.discovery.build("sheets", "v4", http=httpAuth)
-
-gc = pygsheets.authorize(service_file="credentials.json")
 
 
 # Считывание ID таблиц начальников курса
@@ -43,56 +27,40 @@ table1 = "1-pZ7CbACZC8a5v2p14Ll8QygtjOQgw9C8fCYAECbzd4"  # 2
 # table5 = "1p8U5muSV43oiyXB222i2uEPIAm9Wc-swPGT0LmBInMU"  # 6
 # table6 = '1ZaDMcPsslzJXeWYBCW-vgQnjsO1wrSe43LaC9mx_wG8' # 1
 
-base1 = gc.open_by_key(table1)
-# base2 = gc.open_by_key(table2)
-# base3 = gc.open_by_key(table3)
-# base4 = gc.open_by_key(table4)
-# base5 = gc.open_by_key(table5)
-# base6 = gc.open_by_key(table6)
-
-df_base1 = base1[0]
-df_base1_1 = base1[1]
-# df_base2 = base2[0]
-# df_base2_1 = base2[1]
-# df_base3 = base3[0]
-# df_base3_1 = base3[1]
-# df_base4 = base4[0]
-# df_base4_1 = base4[1]
-# df_base5 = base5[0]
-# df_base5_1 = base5[1]
-# df_base6 = base6[0]
-# df_base6_1 = base6[1]
-
-df1 = df_base1.get_as_df()
-df1_1 = df_base1_1.get_as_df()
-# df2 = df_base2.get_as_df()
-# df2_1 = df_base2_1.get_as_df()
-# df3 = df_base3.get_as_df()
-# df3_1 = df_base3_1.get_as_df()
-# df4 = df_base4.get_as_df()
-# df4_1 = df_base4_1.get_as_df()
-# df5 = df_base5.get_as_df()
-# df5_1 = df_base5_1.get_as_df()
-# df6 = df_base6.get_as_df()
-# df6_1 = df_base6_1.get_as_df()
+tables = [
+    table1,
+    # table2,
+    # table3,
+    # table4,
+    # table5,
+    # table6,
+]
+BASE_ID = "1Cqa_CERAIpnf3jCPoczB498na8drEMZpDAlUrz9_1cU"
+
+
+async def load_worksheets(spreadsheet_ids, sheets_count=2):
+    """Загружает первые sheets_count листов каждой таблицы одновременно.
+
+    Листы одной таблицы читаются одним batchGet, неизменившиеся таблицы
+    берутся из локальных копий. Возвращает для каждой таблицы список
+    DataFrame её листов.
+    """
+    async with AsyncGoogleClient(CREDENTIALS_FILE) as google:
+        frames = await load_sheets_async(
+            google,
+            [SheetSpec(spreadsheet_id, i)
+             for spreadsheet_id in spreadsheet_ids for i in range(sheets_count)],
+            typed=False, snapshots=SnapshotCache())
+    return [frames[i:i + sheets_count] for i in range(0, len(frames), sheets_count)]
+
+
+# Таблицы начальников курса и база БДНС загружаются параллельно
+set_stage("sheet_load")
+*course_frames, base_frames = asyncio.run(load_worksheets(tables + [BASE_ID]))
 
 # Объединение всех датафреймов один
-df = pd.concat(
-    [
-        df1,
-        df1_1,
-        # df2,
-        # df2_1,
-        # df3,
-        # df3_1,
-        # df4,
-        # df4_1,
-        # df5,
-        # df5_1,
-        # df6,
-        # df6_1,
-    ]
-)
+set_stage("join")
+df = pd.concat([frame for frames in course_frames for frame in frames])
 
 # Первоначальная подготовка данных: отсеивание отчисленных, сортировка,
 # перестановка столбцов, создание столбца для профсоюзного билета
@@ -107,12 +75,7 @@ df2_final["Номер проф. билета"] = ""
 
 
 # Второй этап обработки данных с помощью базы БДНС
-base = gc.open_by_key("1Cqa_CERAIpnf3jCPoczB498na8drEMZpDAlUrz9_1cU")
-df_base = base[0]
-df_base1 = base[1]
-df_1 = df_base.get_as_df()
-df_2 = df_base1.get_as_df()
-df = pd.concat([df_1, df_2])
+df = pd.concat(base_frames)
 x, y = df2_final.shape
 final_df = df2_final
 
@@ -148,6 +111,7 @@ csv_data = final_df.to_csv(r" my_data.csv", index=False)
 
 # ------------------- Работа с гугл-документом -------------------------------------#
 
+set_stage("docs")
 
 # Получение текущей даты
 current_date = datetime.now().date()
@@ -156,18 +120,9 @@ current_date = datetime.now().date()
 SERVICE_ACCOUNT_FILE = "credentials.json"
 
 FOLDER_ID = "1dsrZwqADzh3vPCpuhrjuMI0cdgVsQb-V"
-# Аутентификация с использованием учетных данных службы
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE,
-    scopes=[
-        "https://www.googleapis.com/auth/drive",
-        "https://www.googleapis.com/auth/documents",
-    ],
-)
-
-# Создание экземпляра клиента для работы с API Google Drive и Google Docs
-drive_service = build("drive", "v3", credentials=credentials)
-docs_service = build("docs", "v1", credentials=credentials)
+# Клиенты для работы с API Google Drive и Google Docs
+drive_service = get_drive_service(SERVICE_ACCOUNT_FILE)
+docs_service = get_docs_service(SERVICE_ACCOUNT_FILE)
 
 # ________________________________________________________ #
 
@@ -1,9 +1,11 @@
-import gspread
 from gspread_formatting import *
-from google.oauth2 import service_account
-from oauth2client.service_account import ServiceAccountCredentials
-from googleapiclient.discovery import build
-import pandas as pd
+
+from google_services import get_drive_service, get_gspread_client, get_sheets_service
+from profiling import profile_from_argv, set_stage
+from sheets_loader import SheetSpec, SnapshotCache, load_sheets
+
+# python course_heads.py --profile - запуск с профилированием по этапам
+profile_from_argv()
 
 
 def design(worksheet, rows_num):
@@ -113,26 +115,24 @@ def design(worksheet, rows_num):
 
 
 # Аутентификация
-scope = ['https://spreadsheets.google.com/feeds',
-         'https://www.googleapis.com/auth/drive']
-credentials = service_account.Credentials.from_service_account_file(
-    'credentials.json')
-drive_service = build('drive', 'v3', credentials=credentials)
-credentials = ServiceAccountCredentials.from_json_keyfile_name(
-    'credentials.json', scope)
-client = gspread.authorize(credentials)
+drive_service = get_drive_service('credentials.json')
+client = get_gspread_client('credentials.json')
 
 
 # Загрузка нашей базы
+set_stage("sheet_load")
 table = client.open_by_key('19DuW3CRvYameij1eFNCyyijRyC9O7HtFvNjgbazg_zk')
-df = [pd.DataFrame()] * 3
-for i in range(3):
-    sheet = table.get_worksheet(i)
-    df[i] = (pd.DataFrame(sheet.get_all_records()))[
-        ['Фамилия', 'Имя', 'Отчество', 'Направление', 'Курс', 'Студенческий']]
+# Три листа базы загружаются одним batchGet (или из локальной копии, если
+# база не менялась)
+df = load_sheets(get_sheets_service('credentials.json'), [
+    SheetSpec(table.id, i,
+              ['Фамилия', 'Имя', 'Отчество', 'Направление', 'Курс', 'Студенческий'])
+    for i in range(3)
+], snapshots=SnapshotCache(drive_service))
 
 
 # Создание папки, где будут лежать 6 таблиц
+set_stage("folders")
 parent_folder_id = '1c6BiUKFSt6nr7_jKcHOS2wJW5haoJxcw'
 folder_metadata = {
     'name': 'Таблицы начальникам курсов',
@@ -144,6 +144,7 @@ folder = drive_service.files().create(
 
 
 # Создание таблиц бакалавриата с доступом редактора для всех
+set_stage("upload")
 sheet_names = ['Бюджет ЧП', 'Контракт ЧП']
 for i in range(4):
     table = client.create(f'{i + 1} курс', folder_id=folder['id'])
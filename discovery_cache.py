@@ -0,0 +1,190 @@
+"""Локальный кэш discovery-документов Google API.
+
+Документы Drive v3, Docs v1 и Sheets v4 один раз скачиваются командой
+``python discovery_cache.py warm`` и дальше читаются с диска, так что
+создание клиентов не требует обращения к сети. Кэш версионирован:
+рядом с документами хранится manifest.json с ревизией каждого документа
+и версией googleapiclient. Документ, сохранённый другой версией
+библиотеки или более старый, чем поставляемый с ней, не используется -
+клиент создаётся по документу из библиотеки, пока кэш не обновят warm.
+
+``python discovery_cache.py bench`` сравнивает время создания клиентов
+с загрузкой документа из сети, из документов внутри библиотеки и из кэша.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import httplib2
+from googleapiclient.discovery import (
+    DISCOVERY_URI,
+    V2_DISCOVERY_URI,
+    build,
+    build_from_document,
+)
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.version import __version__ as googleapiclient_version
+
+from local_cache import atomic_path, atomic_write_json, load_json
+
+# Версия формата кэша: при её изменении старые файлы не используются
+CACHE_FORMAT = 1
+CACHE_DIR = os.path.join(".dsin_cache", "discovery", f"v{CACHE_FORMAT}")
+MANIFEST_FILE = "manifest.json"
+
+# API, которые используются в проекте
+SERVICES = [("drive", "v3"), ("docs", "v1"), ("sheets", "v4")]
+
+# Уже разобранные документы: клиенты для разных потоков создаются из одного
+_parsed_documents = {}
+
+
+def _document_path(name, version, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"{name}.{version}.json")
+
+
+def load_manifest(cache_dir=CACHE_DIR):
+    """Читает manifest.json кэша, если его нет - пустой словарь."""
+    return load_json(os.path.join(cache_dir, MANIFEST_FILE), {})
+
+
+def _revision(content):
+    return json.loads(content).get("revision") if content else None
+
+
+def load_document(name, version, cache_dir=CACHE_DIR):
+    """Возвращает закэшированный discovery-документ или None.
+
+    Документ не используется, если он сохранён другой версией
+    googleapiclient, его ревизия не совпадает с записанной в manifest.json
+    или документ внутри библиотеки новее.
+    """
+    path = _document_path(name, version, cache_dir)
+    entry = load_manifest(cache_dir).get(f"{name}.{version}")
+    if not os.path.exists(path) or entry is None:
+        return None
+    if entry.get("googleapiclient") != googleapiclient_version:
+        return None
+    with open(path, encoding="utf-8") as file:
+        content = file.read()
+    revision = _revision(content)
+    if revision != entry.get("revision"):
+        return None
+    static_revision = _revision(get_static_doc(name, version))
+    if static_revision and revision and static_revision > revision:
+        return None
+    return content
+
+
+def save_document(name, version, content, cache_dir=CACHE_DIR):
+    """Сохраняет discovery-документ и обновляет manifest.json."""
+    document = json.loads(content)
+    with atomic_path(_document_path(name, version, cache_dir)) as tmp_path:
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(content)
+
+    manifest = load_manifest(cache_dir)
+    manifest[f"{name}.{version}"] = {
+        "revision": document.get("revision"),
+        "fetched_at": datetime.now().isoformat(timespec="seconds"),
+        "googleapiclient": googleapiclient_version,
+    }
+    atomic_write_json(os.path.join(cache_dir, MANIFEST_FILE), manifest)
+
+
+def build_service(name, version, cache_dir=CACHE_DIR, **kwargs):
+    """Создаёт клиент API по документу из кэша.
+
+    Если документа в кэше нет, используется документ, поставляемый
+    вместе с googleapiclient, - тоже без обращения к сети.
+    """
+    key = (name, version, cache_dir)
+    document = _parsed_documents.get(key)
+    if document is None:
+        content = load_document(name, version, cache_dir) or get_static_doc(name, version)
+        if content is None:
+            return build(name, version, static_discovery=True, **kwargs)
+        document = _parsed_documents[key] = json.loads(content)
+    return build_from_document(document, **kwargs)
+
+
+def fetch_document(name, version, http=None):
+    """Скачивает актуальный discovery-документ из сети."""
+    http = http or httplib2.Http()
+    for uri in (V2_DISCOVERY_URI, DISCOVERY_URI):
+        url = uri.replace("{api}", name).replace("{apiVersion}", version)
+        response, content = http.request(url)
+        if response.status == 200:
+            return content.decode("utf-8")
+    raise RuntimeError(f"Не удалось скачать discovery-документ {name} {version}")
+
+
+def warm(cache_dir=CACHE_DIR):
+    """Скачивает документы всех используемых API в кэш."""
+    for name, version in SERVICES:
+        content = fetch_document(name, version)
+        save_document(name, version, content, cache_dir)
+        revision = json.loads(content).get("revision")
+        print(f"{name} {version}: ревизия {revision} сохранена в {cache_dir}")
+
+
+def _measure(builder, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        builder()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench(repeat=5, cache_dir=CACHE_DIR):
+    """Сравнивает время создания клиентов без кэша и с кэшем."""
+    # Учётные данные не нужны: замеряется только создание клиента
+    http = httplib2.Http()
+    print(f"{'API':<12}{'сеть, мс':>12}{'библиотека, мс':>18}{'кэш, мс':>12}")
+    for name, version in SERVICES:
+        if load_document(name, version, cache_dir) is None:
+            save_document(name, version, fetch_document(name, version, http), cache_dir)
+        cold = _measure(
+            lambda: build_from_document(fetch_document(name, version, http), http=http),
+            repeat)
+        static = _measure(
+            lambda: build(name, version, static_discovery=True, http=http), repeat)
+
+        def from_cache():
+            # Без сброса замерялся бы разобранный документ в памяти, а не диск
+            _parsed_documents.clear()
+            return build_service(name, version, cache_dir, http=http)
+
+        cached = _measure(from_cache, repeat)
+        print(f"{name + ' ' + version:<12}{cold * 1000:>12.1f}"
+              f"{static * 1000:>18.1f}{cached * 1000:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Кэш discovery-документов Google API.")
+    parser.add_argument(
+        'command',
+        choices=['warm', 'bench'],
+        help='warm - скачать документы в кэш, bench - замерить время создания клиентов')
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=CACHE_DIR,
+        help=f'Папка кэша (по умолчанию: {CACHE_DIR})')
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='Число повторов каждого замера (по умолчанию: 5)')
+    args = parser.parse_args()
+
+    if args.command == 'warm':
+        warm(args.cache_dir)
+    else:
+        bench(args.repeat, args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
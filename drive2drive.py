@@ -0,0 +1,500 @@
+"""Перенос файлов с Google Диска на Яндекс Диск профкома.
+
+    python drive2drive.py <папка на Яндекс Диске> [--folder ID папки Drive]
+
+Файлы не сохраняются ни на диск, ни целиком в память: части файла,
+скачанные из Drive (MediaIoBaseDownload, по DOWNLOAD_CHUNK_SIZE), через
+ChunkPipe сразу уходят в тело PUT-запроса загрузки на Яндекс Диск
+(Transfer-Encoding: chunked). Между скачиванием и загрузкой лежит не
+больше BUFFER_CHUNKS частей: если Яндекс принимает медленнее, скачивание
+ждёт. Несколько файлов передаются параллельно, в конце печатается
+скорость в МБ/с.
+
+Загрузку на Яндекс Диск нельзя продолжить с середины файла, поэтому
+докачка работает пофайлово: файл, который уже лежит на Яндекс Диске
+с тем же md5, пропускается, а оборвавшаяся передача повторяется целиком.
+Повторный запуск после сбоя переносит только недостающее.
+
+Ярлыки, которые drive_batch создаёт вместо копий неизменённых документов,
+переносятся как файлы: по shortcutDetails.targetId берётся сам документ
+и загружается под именем ярлыка.
+
+Первый запуск обходит всю папку, а в CHANGES_CURSOR_FILE сохраняется
+закладка ленты изменений Drive (changes.getStartPageToken). Следующие
+запуски читают только изменения с этой закладки и переносят новые и
+изменённые файлы, лежащие внутри папки, так что время синхронизации
+зависит от числа изменений, а не от размера архива. Если часть файлов
+перенести не удалось, закладка не сдвигается.
+
+Адрес API берётся из DSIN_YANDEX_API, токен - из DSIN_YANDEX_TOKEN или
+файла YANDEX_TOKEN_FILE. Для проверки без сети Google подменяется
+режимом DSIN_GOOGLE_MODE=fake, а Яндекс Диск - локальным сервером
+``python fake_google.py serve-yandex``.
+"""
+import argparse
+import os
+import posixpath
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseDownload
+
+from drive_listing import FOLDER_MIME_TYPE, SHORTCUT_MIME_TYPE, iter_children
+from google_services import get_drive_service, new_service
+from local_cache import JsonStore
+from profiling import profile_from_argv, stage
+from quota import MAX_RETRIES, RETRY_STATUSES, backoff_delay, call_with_retry, is_retryable
+
+SERVICE_ACCOUNT_FILE = "credentials.json"
+ROOT_FOLDER_ID = "10oXbgb7tBzFp41KpfXwmfWbepmnhZ9ch"
+YANDEX_TOKEN_FILE = "yandex_token.txt"
+YANDEX_API = os.environ.get("DSIN_YANDEX_API", "https://cloud-api.yandex.net/v1/disk")
+# Число файлов, передаваемых одновременно
+TRANSFER_WORKERS = 4
+# Размер части, скачиваемой из Drive одним запросом
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+# Сколько скачанных частей может ждать загрузки (память на один файл -
+# примерно (BUFFER_CHUNKS + 2) * DOWNLOAD_CHUNK_SIZE)
+BUFFER_CHUNKS = 2
+# Таймаут соединения и чтения ответа Яндекс Диска, с
+YANDEX_TIMEOUT = 60
+# Документы, таблицы и формы Google нельзя скачать как файл
+GOOGLE_APPS_MIME_PREFIX = "application/vnd.google-apps."
+# Закладки ленты изменений Drive для каждой пары папок
+CHANGES_CURSOR_FILE = os.path.join(".dsin_cache", "drive2drive_changes.json")
+# Ярлыки (их создаёт drive_batch вместо копий неизменённых документов)
+# переносятся как файлы, на которые они указывают
+FILE_FIELDS = "id,name,mimeType,md5Checksum,shortcutDetails(targetId)"
+TARGET_FIELDS = "id,mimeType,md5Checksum,trashed"
+CHANGE_FIELDS = ("nextPageToken,newStartPageToken,"
+                 f"changes(fileId,removed,file({FILE_FIELDS},parents,trashed))")
+
+
+class TransferAborted(Exception):
+    """Загрузка остановилась, и скачанные части больше некому передавать."""
+
+
+class ChunkPipe:
+    """Ограниченная очередь частей файла между скачиванием и загрузкой.
+
+    Со стороны Drive это файл для MediaIoBaseDownload (write блокируется,
+    пока очередь полна), со стороны Яндекс Диска - итератор по частям.
+    """
+
+    _END = object()
+
+    def __init__(self, capacity=BUFFER_CHUNKS):
+        self.size = 0
+        self.error = None
+        self._chunks = queue.Queue(maxsize=capacity)
+        self._aborted = threading.Event()
+
+    def _put(self, item):
+        while not self._aborted.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise TransferAborted()
+
+    def write(self, data):
+        if data:
+            self._put(bytes(data))
+            self.size += len(data)
+
+    def close(self, error=None):
+        """Конец файла; error будет выброшена на стороне загрузки."""
+        self.error = error
+        try:
+            self._put(self._END)
+        except TransferAborted:
+            pass
+
+    def abort(self):
+        """Освобождает скачивание, если загрузка больше не читает части."""
+        self._aborted.set()
+
+    def __iter__(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is self._END:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield chunk
+
+
+def read_token(path=YANDEX_TOKEN_FILE):
+    """OAuth-токен Яндекс Диска."""
+    token = os.environ.get("DSIN_YANDEX_TOKEN")
+    if token:
+        return token
+    with open(path, encoding="utf-8") as file:
+        return file.read().strip()
+
+
+class YandexDisk:
+    """Клиент REST API Яндекс Диска, у каждого потока своя requests.Session."""
+
+    def __init__(self, token, api=YANDEX_API):
+        self.api = api.rstrip("/")
+        self.headers = {"Authorization": f"OAuth {token}"}
+        self._local = threading.local()
+        self._folders = set()
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _request(self, method, endpoint, **kwargs):
+        return self.session.request(
+            method, self.api + endpoint, headers=self.headers, timeout=YANDEX_TIMEOUT, **kwargs)
+
+    def md5(self, path):
+        """md5 файла path или None, если его нет."""
+        response = self._request("GET", "/resources", params={"path": path, "fields": "md5"})
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json().get("md5")
+
+    def makedirs(self, path):
+        """Создаёт папку path вместе с недостающими родительскими."""
+        current = ""
+        for name in path.strip("/").split("/"):
+            current += "/" + name
+            with self._lock:
+                if current in self._folders:
+                    continue
+            response = self._request("PUT", "/resources", params={"path": current})
+            # 409 - папка уже есть
+            if response.status_code != 409:
+                response.raise_for_status()
+            with self._lock:
+                self._folders.add(current)
+
+    def upload(self, path, chunks):
+        """Загружает файл, тело которого выдаёт итератор chunks."""
+        response = self._request(
+            "GET", "/resources/upload", params={"path": path, "overwrite": "true"})
+        response.raise_for_status()
+        link = response.json()
+        # Тело-итератор requests отправляет по частям, не собирая в памяти
+        response = self.session.request(
+            link.get("method", "PUT"), link["href"], data=chunks, timeout=YANDEX_TIMEOUT)
+        response.raise_for_status()
+
+
+def _is_retryable(exception):
+    if isinstance(exception, requests.HTTPError):
+        return exception.response.status_code in RETRY_STATUSES
+    return is_retryable(exception)
+
+
+def _download(service, file_id, pipe):
+    """Скачивает файл Drive по частям в pipe (выполняется в своём потоке)."""
+    error = None
+    try:
+        downloader = MediaIoBaseDownload(
+            pipe, service.files().get_media(fileId=file_id), chunksize=DOWNLOAD_CHUNK_SIZE)
+        done = False
+        while not done:
+            _, done = call_with_retry(
+                downloader.next_chunk, ("drive", "read"), method="drive.files.get_media")
+    except Exception as e:
+        error = e
+    finally:
+        pipe.close(error)
+
+
+def transfer_file(service, disk, file_id, path, md5=None):
+    """Переносит файл Drive file_id в path на Яндекс Диске.
+
+    Возвращает число переданных байт или None, если файл с таким md5
+    уже перенесён.
+    """
+    if md5 and disk.md5(path) == md5:
+        return None
+    for attempt in range(MAX_RETRIES + 1):
+        pipe = ChunkPipe()
+        downloader = threading.Thread(
+            target=_download, args=(service, file_id, pipe), name=f"download-{file_id}")
+        downloader.start()
+        try:
+            disk.upload(path, iter(pipe))
+            return pipe.size
+        except Exception as e:
+            if attempt == MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Яндекс Диск, '{path}': {e}. Повтор через {delay:.1f} с")
+            time.sleep(delay)
+        finally:
+            pipe.abort()
+            downloader.join()
+
+
+def _yandex_name(name):
+    return name.replace("/", "_")
+
+
+def _shortcut_target(service, shortcut, targets):
+    """Файл, на который указывает ярлык, или None, если его уже нет.
+
+    targets - уже прочитанные файлы по ID, чтобы не запрашивать один
+    документ для каждого ярлыка на него.
+    """
+    target_id = shortcut.get("shortcutDetails", {}).get("targetId")
+    if target_id is None:
+        return None
+    if target_id not in targets:
+        try:
+            targets[target_id] = service.files().get(
+                fileId=target_id, fields=TARGET_FIELDS).execute()
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            targets[target_id] = None
+    target = targets[target_id]
+    if target is None or target.get("trashed"):
+        return None
+    return target
+
+
+def _transfer(service, file, path, targets):
+    """Задание на перенос файла Drive или None, если его нельзя скачать.
+
+    Для ярлыка переносится файл, на который он указывает, под именем ярлыка.
+    """
+    if file["mimeType"] == SHORTCUT_MIME_TYPE:
+        target = _shortcut_target(service, file, targets)
+        if target is None:
+            print(f"Пропущен '{path}': файл, на который указывает ярлык, удалён")
+            return None
+        file = target
+    if file["mimeType"].startswith(GOOGLE_APPS_MIME_PREFIX):
+        print(f"Пропущен '{path}': файлы Google не скачиваются как есть")
+        return None
+    return file["id"], path, file.get("md5Checksum")
+
+
+def list_transfers(service, folder_id, target_path):
+    """Список (ID файла, путь на Яндекс Диске, md5) для всех файлов папки Drive."""
+    transfers = []
+    targets = {}
+    folders = [(folder_id, target_path)]
+    while folders:
+        folder_id, path = folders.pop()
+        for file in iter_children(service, folder_id, fields=FILE_FIELDS):
+            file_path = posixpath.join(path, _yandex_name(file["name"]))
+            if file["mimeType"] == FOLDER_MIME_TYPE:
+                folders.append((file["id"], file_path))
+            else:
+                transfer = _transfer(service, file, file_path, targets)
+                if transfer:
+                    transfers.append(transfer)
+    return transfers
+
+
+class ChangesCursor(JsonStore):
+    """JSON-файл: (ID папки Drive, папка на Яндекс Диске) -> закладка ленты изменений.
+
+    С повреждённой закладкой папка просто обходится целиком.
+    """
+
+    def __init__(self, path=CHANGES_CURSOR_FILE):
+        super().__init__(path)
+
+    def get(self, folder_id, target_path):
+        return super().get(f"{folder_id}:{target_path}")
+
+    def set(self, folder_id, target_path, page_token):
+        super().set(f"{folder_id}:{target_path}", page_token)
+
+
+def list_changes(service, page_token):
+    """Файлы, изменённые после page_token, и закладка для следующего запуска.
+
+    Удалённые и перемещённые в корзину файлы не возвращаются.
+    """
+    files = {}
+    while True:
+        response = service.changes().list(
+            pageToken=page_token, pageSize=1000, spaces="drive", fields=CHANGE_FIELDS).execute()
+        for change in response.get("changes", []):
+            file = change.get("file")
+            if change.get("removed") or file is None or file.get("trashed"):
+                files.pop(change["fileId"], None)
+            else:
+                files[change["fileId"]] = file
+        if "newStartPageToken" in response:
+            return list(files.values()), response["newStartPageToken"]
+        page_token = response["nextPageToken"]
+
+
+def changed_transfers(service, folder_id, target_path, files):
+    """Задания на перенос тех изменённых файлов, что лежат внутри folder_id.
+
+    Путь папки восстанавливается по цепочке родителей (files.get), уже
+    известные папки запоминаются, поэтому запросов столько, сколько
+    различных папок среди изменений.
+    """
+    # ID папки -> путь на Яндекс Диске или None, если папка вне folder_id
+    paths = {folder_id: target_path}
+
+    def folder_path(start_id):
+        chain = []
+        current = start_id
+        path = None
+        while current not in paths:
+            try:
+                folder = service.files().get(
+                    fileId=current, fields="name,parents,trashed").execute()
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                folder = {}
+            chain.append((current, folder))
+            if folder.get("trashed") or not folder.get("parents"):
+                break
+            current = folder["parents"][0]
+        else:
+            path = paths[current]
+        for chain_id, folder in reversed(chain):
+            if path is not None and folder.get("parents"):
+                path = posixpath.join(path, _yandex_name(folder["name"]))
+            else:
+                path = None
+            paths[chain_id] = path
+        return paths[start_id]
+
+    transfers = []
+    targets = {}
+    for file in files:
+        if file["mimeType"] == FOLDER_MIME_TYPE:
+            continue
+        for parent_id in file.get("parents", []):
+            path = folder_path(parent_id)
+            if path is not None:
+                transfer = _transfer(
+                    service, file, posixpath.join(path, _yandex_name(file["name"])), targets)
+                if transfer:
+                    transfers.append(transfer)
+                break
+    return transfers
+
+
+def report_speed(files, skipped, size, started):
+    """Печатает итоговую скорость переноса в МБ/с."""
+    elapsed = time.monotonic() - started
+    megabytes = size / 1024 / 1024
+    speed = megabytes / elapsed if elapsed > 0 else 0.0
+    print(f"Перенесено файлов: {files} (уже были на Яндекс Диске: {skipped}), "
+          f"{megabytes:.1f} МБ за {elapsed:.1f} с ({speed:.2f} МБ/с)")
+
+
+def transfer_files(transfers, disk, workers=TRANSFER_WORKERS, service_account_file=None):
+    """Переносит файлы параллельно в workers потоков.
+
+    transfers - список (ID файла, путь на Яндекс Диске, md5 или None).
+    Возвращает число файлов, которые перенести не удалось.
+    """
+    local = threading.local()
+
+    def run(file_id, path, md5):
+        # httplib2 не потокобезопасен, поэтому у каждого потока свой клиент
+        service = getattr(local, "service", None)
+        if service is None:
+            service = local.service = new_service("drive", "v3", service_account_file)
+        disk.makedirs(posixpath.dirname(path))
+        return transfer_file(service, disk, file_id, path, md5)
+
+    started = time.monotonic()
+    files = skipped = size = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [(path, executor.submit(run, file_id, path, md5))
+                   for file_id, path, md5 in transfers]
+        for path, future in futures:
+            try:
+                transferred = future.result()
+            except Exception as e:
+                print(f"Не удалось перенести '{path}': {e}")
+                failed += 1
+                continue
+            if transferred is None:
+                skipped += 1
+            else:
+                files += 1
+                size += transferred
+    report_speed(files, skipped, size, started)
+    return failed
+
+
+def sync(service, disk, folder_id, target_path, cursor=None,
+         workers=TRANSFER_WORKERS, service_account_file=None):
+    """Переносит новые и изменённые файлы папки folder_id в target_path.
+
+    Без закладки в cursor папка обходится целиком, с закладкой читается
+    только лента изменений Drive. Закладка сдвигается, если все файлы
+    перенесены без ошибок.
+    """
+    page_token = cursor.get(folder_id, target_path) if cursor is not None else None
+    with stage("folders"):
+        if page_token is None:
+            # Закладка берётся до обхода, чтобы не потерять изменения,
+            # сделанные во время переноса
+            new_token = service.changes().getStartPageToken().execute()["startPageToken"]
+            transfers = list_transfers(service, folder_id, target_path)
+        else:
+            files, new_token = list_changes(service, page_token)
+            transfers = changed_transfers(service, folder_id, target_path, files)
+            print(f"Изменённых файлов на Google Диске: {len(files)}, "
+                  f"из них внутри папки: {len(transfers)}")
+    with stage("upload"):
+        failed = transfer_files(transfers, disk, workers, service_account_file)
+    if cursor is None:
+        return
+    if failed:
+        print("Закладка изменений не сдвинута: файлы с ошибками будут повторены")
+    else:
+        cursor.set(folder_id, target_path, new_token)
+
+
+def main():
+    profile_from_argv()
+    parser = argparse.ArgumentParser(
+        description="Перенос файлов с Google Диска на Яндекс Диск.")
+    parser.add_argument('target', help='Папка на Яндекс Диске, например /ДСИН')
+    parser.add_argument(
+        '--folder',
+        default=ROOT_FOLDER_ID,
+        help='ID папки на Google Диске (по умолчанию: ROOT_FOLDER_ID)')
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help='Обойти всю папку, не используя ленту изменений')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=TRANSFER_WORKERS,
+        help=f'Число файлов, передаваемых одновременно (по умолчанию: {TRANSFER_WORKERS})')
+    args = parser.parse_args()
+
+    cursor = ChangesCursor()
+    if args.full:
+        cursor.set(args.folder, args.target, None)
+    sync(get_drive_service(SERVICE_ACCOUNT_FILE), YandexDisk(read_token()),
+         args.folder, args.target, cursor, args.workers, SERVICE_ACCOUNT_FILE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""Пакетная работа с Google Drive.
+
+Создание папок студентов и копирование их документов отправляются
+batch-запросами Drive (до 100 операций за один HTTP-запрос), а копия
+сразу получает итоговое имя, так что отдельное переименование не нужно.
+Запросы внутри batch учитываются в квоте Drive по отдельности, поэтому
+перед отправкой каждый из них проходит через общий ограничитель частоты,
+а завершившиеся временной ошибкой отправляются повторно.
+
+С preallocate_ids ID папок заранее выделяются через files.generateIds,
+поэтому копии документов не ждут ответа на создание папки: папки и копии
+уходят вместе, в одних и тех же batch-запросах.
+
+С copy_index (см. drive_dedup.py) документы, копия которых уже есть
+у студента, не копируются заново: вместо копии создаётся ярлык.
+
+С manifest (CopyManifest) выделенные ID папок и копий и отметки о готовых
+операциях сохраняются на диск до отправки запросов. Если запуск упал на
+середине, повторный запуск пропускает готовое, а недоделанное отправляет
+с теми же ID: то, что успело создаться, Drive отклоняет с 409, и
+дубликаты папок и файлов не появляются.
+"""
+import json
+import os
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+import metrics
+from drive_listing import FOLDER_MIME_TYPE, SHORTCUT_MIME_TYPE
+from drive_pool import drive_write_limiter, report_throughput
+from local_cache import atomic_write_json, load_json
+from quota import MAX_RETRIES, backoff_delay, call_with_retry, is_idempotent, is_retryable, request_kind
+
+# Drive принимает не больше 100 запросов в одном batch-запросе
+BATCH_SIZE = 100
+# files.generateIds выдаёт не больше 1000 ID за запрос
+GENERATE_IDS_MAX = 1000
+MANIFEST_DIR = os.path.join(".dsin_cache", "manifests")
+
+
+def generate_ids(service, count):
+    """Выделяет count ID для файлов и папок, которые ещё будут созданы."""
+    ids = []
+    while len(ids) < count:
+        response = service.files().generateIds(
+            count=min(GENERATE_IDS_MAX, count - len(ids)), space="drive").execute()
+        ids.extend(response["ids"])
+    return ids
+
+
+class IdAllocator:
+    """Общий для потоков запас заранее выделенных ID Drive."""
+
+    def __init__(self, chunk=100):
+        self.chunk = chunk
+        self._ids = []
+        self._lock = threading.Lock()
+
+    def next(self, service):
+        """Следующий свободный ID, при необходимости запрашивает новые."""
+        with self._lock:
+            if not self._ids:
+                self._ids = generate_ids(service, self.chunk)
+            return self._ids.pop()
+
+
+class CopyManifest:
+    """ID и состояние папок и копий документов одного запуска.
+
+    Записи ведутся по ключу студента (номер студенческого), а не по имени
+    папки: у однофамильцев с одинаковыми инициалами имена папок совпадают.
+    Без path состояние хранится только в памяти: ID всё равно выделяются
+    заранее, поэтому повторы запросов внутри запуска тоже безопасны.
+    """
+
+    def __init__(self, path=None, ids=None):
+        self.path = path
+        self.ids = ids or IdAllocator()
+        self._entries = {"folders": {}, "documents": {}}
+        self._lock = threading.RLock()
+        if path:
+            self._entries = load_json(path, self._entries)
+
+    @classmethod
+    def for_folder(cls, parent_folder_id, manifest_dir=MANIFEST_DIR):
+        """Манифест запуска, копирующего документы в parent_folder_id."""
+        return cls(os.path.join(manifest_dir, f"{parent_folder_id}.json"))
+
+    @staticmethod
+    def document_key(student, new_filename, file_id):
+        return f"{student}/{new_filename}/{file_id}"
+
+    def _entry(self, service, kind, key):
+        with self._lock:
+            entry = self._entries[kind].get(key)
+            if entry is None:
+                entry = self._entries[kind][key] = {"id": self.ids.next(service), "done": False}
+            return entry
+
+    def folder(self, service, student):
+        """{"id": ..., "done": ...} папки студента, ID выделяется при первом обращении."""
+        return self._entry(service, "folders", student)
+
+    def document(self, service, student, new_filename, file_id):
+        """{"id": ..., "done": ...} копии документа студента."""
+        return self._entry(
+            service, "documents", self.document_key(student, new_filename, file_id))
+
+    def mark_done(self, kind, key):
+        with self._lock:
+            self._entries[kind][key]["done"] = True
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            atomic_write_json(self.path, self._entries)
+
+
+def _error_status(exception):
+    return exception.resp.status if isinstance(exception, HttpError) else None
+
+
+def _missing_parent(exception, parent_ids):
+    """Копия упала, потому что папка из этого же batch ещё не создана."""
+    if not parent_ids or _error_status(exception) != 404:
+        return False
+    content = exception.content.decode("utf-8", errors="replace") \
+        if isinstance(exception.content, bytes) else str(exception.content)
+    return any(parent_id in content for parent_id in parent_ids)
+
+
+def execute_batch(service, requests, batch_size=BATCH_SIZE,
+                  limiter=drive_write_limiter, new_parents=None):
+    """Выполняет запросы пачками и возвращает список пар (ответ, ошибка).
+
+    Порядок результатов совпадает с порядком запросов. Запросы, упавшие
+    с временной ошибкой (429, 5xx, превышение квоты), повторяются; создание
+    и копирование без заранее выделенного ID - только после 429 и
+    превышения квоты (см. quota.is_retryable).
+    new_parents - ID папок, создаваемых этими же запросами: Drive выполняет
+    запросы одного batch в произвольном порядке, поэтому копия в такую
+    папку, упавшая с 404, тоже повторяется.
+    """
+    results = [(None, None)] * len(requests)
+    # Batch только из GET (files.get) расходует квоту чтения
+    kind = "read" if all(request_kind(request.method) == "read" for request in requests) \
+        else "write"
+    idempotent = [is_idempotent(request.methodId, request.body) for request in requests]
+    started = [0.0]
+    traffic = [0, 0]
+
+    def callback(request_id, response, exception):
+        index = int(request_id)
+        results[index] = (response, exception)
+        # Каждый ответ внутри batch записывается в статистику под своим методом
+        sent = _body_size(requests[index].body)
+        received = len(json.dumps(response).encode("utf-8")) if response is not None else 0
+        traffic[0] += sent
+        traffic[1] += received
+        metrics.record(requests[index].methodId, time.monotonic() - started[0],
+                       sent=sent, received=received, failed=exception is not None)
+
+    pending = list(range(len(requests)))
+    for attempt in range(MAX_RETRIES + 1):
+        for start in range(0, len(pending), batch_size):
+            batch = service.new_batch_http_request(callback=callback)
+            for index in pending[start:start + batch_size]:
+                if limiter is not None:
+                    limiter.acquire()
+                batch.add(requests[index], request_id=str(index))
+            traffic[:] = [0, 0]
+
+            def execute():
+                started[0] = time.monotonic()
+                return batch.execute()
+
+            call_with_retry(execute, ("drive", kind), method="drive.batch",
+                            traffic=lambda: tuple(traffic),
+                            idempotent=all(idempotent[index]
+                                           for index in pending[start:start + batch_size]))
+        pending = [index for index in pending
+                   if results[index][1] is not None
+                   and (is_retryable(results[index][1], idempotent[index])
+                        or _missing_parent(results[index][1], new_parents))]
+        if not pending or attempt == MAX_RETRIES:
+            break
+        time.sleep(backoff_delay(attempt))
+    return results
+
+
+def _body_size(body):
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    return len(body or b"")
+
+
+def folder_request(service, folder_name, parent_folder_id, folder_id=None):
+    """Запрос на создание папки (с заранее выделенным ID, если он задан)."""
+    file_metadata = {
+        "name": folder_name,
+        "mimeType": FOLDER_MIME_TYPE,
+        "parents": [parent_folder_id],
+    }
+    if folder_id is not None:
+        file_metadata["id"] = folder_id
+    return service.files().create(body=file_metadata, fields="id")
+
+
+def copy_request(service, file_id, new_filename, destination_folder_id, copy_id=None):
+    """Запрос на копирование файла в папку сразу под новым именем."""
+    file_metadata = {"name": new_filename, "parents": [destination_folder_id]}
+    if copy_id is not None:
+        file_metadata["id"] = copy_id
+    return service.files().copy(fileId=file_id, body=file_metadata, fields="id")
+
+
+def shortcut_request(service, name, target_id, destination_folder_id, shortcut_id=None):
+    """Запрос на создание ярлыка на файл target_id в папке."""
+    file_metadata = {
+        "name": name,
+        "mimeType": SHORTCUT_MIME_TYPE,
+        "parents": [destination_folder_id],
+        "shortcutDetails": {"targetId": target_id},
+    }
+    if shortcut_id is not None:
+        file_metadata["id"] = shortcut_id
+    return service.files().create(body=file_metadata, fields="id")
+
+
+def created(exception):
+    """Файл с заранее выделенным ID создан (409 - создан прошлой попыткой)."""
+    return exception is None or _error_status(exception) == 409
+
+
+# Папка создаётся так же, как любой файл с заранее выделенным ID
+folder_created = created
+
+
+def document_requests(service, student, folder_name, files, folder_id, reused=None,
+                      copy_index=None, manifest=None):
+    """Запросы на копии документов студента в его папку.
+
+    student - ключ студента в manifest, files - пары (итоговое имя файла,
+    ID исходного файла), reused - прежние копии из CopyIndex.plan: для них
+    создаётся ярлык или ничего не делается. С manifest копии получают
+    заранее выделенные ID, а уже сделанные пропускаются. Возвращает список
+    (ключ студента, имя папки, имя файла, ID исходного файла, ID копии или
+    None, запрос).
+    """
+    requests = []
+    for new_filename, file_id in files:
+        target_id = (reused or {}).get((folder_name, file_id))
+        if target_id is not None and not copy_index.shortcuts:
+            continue
+        copy_id = None
+        if manifest is not None:
+            entry = manifest.document(service, student, new_filename, file_id)
+            if entry["done"]:
+                continue
+            copy_id = entry["id"]
+        if target_id is None:
+            request = copy_request(service, file_id, new_filename, folder_id, copy_id)
+        else:
+            request = shortcut_request(service, new_filename, target_id, folder_id, copy_id)
+        requests.append((student, folder_name, new_filename, file_id, copy_id, request))
+    return requests
+
+
+def record_copies(copies, copy_results, reused=None, copy_index=None, manifest=None,
+                  failed=None):
+    """Печатает ошибки копирования, отмечает готовые копии в copy_index и manifest.
+
+    Возвращает число успешно обработанных документов. В множество failed
+    добавляются ключи студентов, документ которых скопировать не удалось.
+    """
+    copied = 0
+    for (student, folder_name, new_filename, file_id, copy_id, _), (response, exception) \
+            in zip(copies, copy_results):
+        if not (created(exception) if copy_id else exception is None):
+            print(f"Не удалось скопировать файл '{new_filename}' в папку '{folder_name}': {exception}")
+            if failed is not None:
+                failed.add(student)
+            continue
+        copied += 1
+        if manifest is not None:
+            manifest.mark_done(
+                "documents", manifest.document_key(student, new_filename, file_id))
+        if copy_index is not None and (folder_name, file_id) not in (reused or {}):
+            copy_index.record(folder_name, file_id, copy_id or response["id"])
+    return copied
+
+
+def _ingest_preallocated(service, parent_folder_id, students, reused, copy_index, manifest):
+    folder_ids = [manifest.folder(service, student)["id"] for student, _, _ in students]
+    folders = []
+    copies = []
+    for (student, folder_name, files), folder_id in zip(students, folder_ids):
+        if not manifest.folder(service, student)["done"]:
+            folders.append((student, folder_name, folder_request(
+                service, folder_name, parent_folder_id, folder_id)))
+        copies += document_requests(
+            service, student, folder_name, files.items(), folder_id, reused, copy_index, manifest)
+    # ID сохраняются до отправки, чтобы повторный запуск использовал те же
+    manifest.save()
+    results = execute_batch(
+        service, [request for *_, request in folders] + [request for *_, request in copies],
+        new_parents=set(folder_ids))
+
+    failed = set()
+    for (student, folder_name, _), (_, exception) in zip(folders, results):
+        if folder_created(exception):
+            manifest.mark_done("folders", student)
+        else:
+            print(f"Не удалось создать папку '{folder_name}': {exception}")
+            failed.add(student)
+    copied = record_copies(
+        copies, results[len(folders):], reused, copy_index, manifest, failed)
+    manifest.save()
+    return [None if student in failed else folder_id
+            for (student, _, _), folder_id in zip(students, folder_ids)], copied
+
+
+def ingest_student_documents(service, parent_folder_id, students, preallocate_ids=False,
+                             copy_index=None, manifest=None):
+    """Создаёт папки студентов и копирует в них документы.
+
+    students - список (ключ студента, имя папки, {итоговое имя файла: ID
+    исходного файла}); ключ (например, номер студенческого) различает
+    однофамильцев с одинаковыми именами папок.
+    Возвращает список ID созданных папок в том же порядке (None, если папку
+    создать или скопировать в неё какой-либо документ не удалось). С
+    preallocate_ids папки и копии отправляются одними batch-запросами, не
+    дожидаясь создания папок. С copy_index уже скопированные ранее
+    документы заменяются ярлыками. С manifest
+    (ID тоже выделяются заранее) повторный запуск продолжает прерванный.
+    """
+    started = time.monotonic()
+    reused = {}
+    if copy_index is not None:
+        reused = copy_index.plan(
+            service, [(folder_name, list(files.items())) for _, folder_name, files in students])
+    if preallocate_ids or manifest is not None:
+        folder_ids, copied = _ingest_preallocated(
+            service, parent_folder_id, students, reused, copy_index,
+            manifest if manifest is not None else CopyManifest())
+    else:
+        folder_ids, copied = _ingest_sequential(
+            service, parent_folder_id, students, reused, copy_index)
+    if copy_index is not None:
+        copy_index.save()
+    report_throughput(copied, started)
+    return folder_ids
+
+
+def _ingest_sequential(service, parent_folder_id, students, reused, copy_index):
+    folder_results = execute_batch(
+        service,
+        [folder_request(service, folder_name, parent_folder_id)
+         for _, folder_name, _ in students],
+    )
+
+    folder_ids = []
+    copies = []
+    for (student, folder_name, files), (response, exception) in zip(students, folder_results):
+        if exception is not None:
+            print(f"Не удалось создать папку '{folder_name}': {exception}")
+            folder_ids.append(None)
+            continue
+        folder_id = response["id"]
+        folder_ids.append(folder_id)
+        copies += document_requests(
+            service, student, folder_name, files.items(), folder_id, reused, copy_index)
+
+    copy_results = execute_batch(service, [request for *_, request in copies])
+    failed = set()
+    copied = record_copies(copies, copy_results, reused, copy_index, failed=failed)
+    return [None if student in failed else folder_id
+            for (student, _, _), folder_id in zip(students, folder_ids)], copied
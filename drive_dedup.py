@@ -0,0 +1,79 @@
+"""Индекс уже скопированных документов студентов по md5Checksum.
+
+Каждый семестр студенты присылают в форме ссылки на те же паспорта,
+анкеты и справки, и раньше каждый раз создавалась новая копия. CopyIndex
+хранит в JSON-файле для каждого студента (имени его папки) соответствие
+md5Checksum исходного файла -> ID уже сделанной копии. Перед копированием
+контрольные суммы исходных файлов и существование прежних копий
+проверяются batch-запросами files.get, и для неизменившегося документа
+вместо новой копии создаётся ярлык на прежнюю (или документ пропускается,
+если shortcuts=False).
+"""
+import os
+import threading
+
+from drive_batch import execute_batch
+from local_cache import atomic_write_json, load_json
+
+COPY_INDEX_FILE = os.path.join(".dsin_cache", "copied_documents.json")
+
+
+class CopyIndex:
+    """Студент -> {md5Checksum исходного файла: ID его копии}."""
+
+    def __init__(self, path=COPY_INDEX_FILE, shortcuts=True):
+        self.path = path
+        self.shortcuts = shortcuts
+        # ID исходного файла -> md5Checksum, загруженные в этом запуске
+        self._checksums = {}
+        self._lock = threading.Lock()
+        self._copies = load_json(path, {})
+
+    def _get_files(self, service, file_ids, fields):
+        file_ids = list(dict.fromkeys(file_ids))
+        results = execute_batch(
+            service,
+            [service.files().get(fileId=file_id, fields=fields) for file_id in file_ids],
+            limiter=None,
+        )
+        return {file_id: response for file_id, (response, exception)
+                in zip(file_ids, results) if exception is None}
+
+    def plan(self, service, students):
+        """Находит документы, которые уже были скопированы и не изменились.
+
+        students - список пар (имя папки студента, [(имя копии, ID исходного
+        файла), ...]). Возвращает {(имя папки, ID исходного файла): ID
+        прежней копии} для документов, которые копировать не нужно.
+        """
+        sources = self._get_files(
+            service, [file_id for _, files in students for _, file_id in files],
+            "id,md5Checksum")
+        with self._lock:
+            for file_id, source in sources.items():
+                if source.get("md5Checksum"):
+                    self._checksums[file_id] = source["md5Checksum"]
+            candidates = {}
+            for student, files in students:
+                copies = self._copies.get(student, {})
+                for _, file_id in files:
+                    copy_id = copies.get(self._checksums.get(file_id))
+                    if copy_id:
+                        candidates[(student, file_id)] = copy_id
+        if not candidates:
+            return {}
+        # Прежняя копия могла быть удалена вручную
+        existing = self._get_files(service, candidates.values(), "id,trashed")
+        return {key: copy_id for key, copy_id in candidates.items()
+                if copy_id in existing and not existing[copy_id].get("trashed")}
+
+    def record(self, student, source_file_id, copy_id):
+        """Запоминает копию исходного файла в папке студента."""
+        with self._lock:
+            checksum = self._checksums.get(source_file_id)
+            if checksum:
+                self._copies.setdefault(student, {})[checksum] = copy_id
+
+    def save(self):
+        with self._lock:
+            atomic_write_json(self.path, self._copies)
@@ -0,0 +1,190 @@
+"""Поиск папок Google Диска по пути с постоянным кэшем.
+
+enabling.py и extending.py при каждом запуске спускаются от корневой
+папки к «УГ 2026-2027» → «Октябрь» → «Включение»/«Продление», и раньше
+на каждом уровне делали отдельный files.list. FolderResolver хранит
+найденные ID в JSON-файле по полному пути и при повторном запуске
+проверяет закэшированную папку одним files.get (не удалена, не в корзине,
+лежит там же и называется так же). Если проверка не прошла, путь
+ищется заново, отсутствующие папки создаются.
+
+FolderIndex один раз обходит всё дерево папок под корневой папкой
+(несколько постраничных files.list на уровень) и дальше отвечает на
+вопрос «есть ли папка X внутри Y» без запросов к Drive. Папки, созданные
+за время запуска, добавляются в индекс.
+"""
+import os
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from drive_listing import FOLDER_MIME_TYPE, iter_children
+from local_cache import JsonStore
+from quota import MAX_RETRIES, backoff_delay, is_retryable
+
+FOLDER_CACHE_FILE = os.path.join(".dsin_cache", "drive_folders.json")
+# Сколько родительских папок перечисляется в одном запросе обхода
+FOLDERS_PER_QUERY = 40
+
+
+class FolderCache(JsonStore):
+    """JSON-файл: путь папки (ID корня/имя/имя/...) -> ID папки."""
+
+    def __init__(self, path=FOLDER_CACHE_FILE):
+        super().__init__(path)
+
+    def discard(self, key):
+        """Удаляет путь и все пути внутри него."""
+        with self._lock:
+            for cached in list(self._data):
+                if cached == key or cached.startswith(key + "/"):
+                    del self._data[cached]
+            self._save()
+
+
+class FolderIndex:
+    """Индекс (родительская папка, имя) -> ID всех папок под root_id."""
+
+    def __init__(self, service, root_id):
+        self.service = service
+        self.root_id = root_id
+        self.crawled = False
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def crawl(self):
+        """Обходит дерево папок по уровням и заполняет индекс."""
+        level = [self.root_id]
+        seen = {self.root_id}
+        while level:
+            next_level = []
+            for start in range(0, len(level), FOLDERS_PER_QUERY):
+                chunk = set(level[start:start + FOLDERS_PER_QUERY])
+                for folder in iter_children(self.service, chunk, mime_type=FOLDER_MIME_TYPE,
+                                            fields="id,name,parents"):
+                    for parent_id in folder.get("parents", []):
+                        if parent_id in chunk:
+                            self.add(folder["name"], parent_id, folder["id"])
+                    if folder["id"] not in seen:
+                        seen.add(folder["id"])
+                        next_level.append(folder["id"])
+            level = next_level
+        self.crawled = True
+        print(f"Загружен индекс папок: {len(seen) - 1}")
+        return self
+
+    def get(self, name, parent_id):
+        """ID папки name внутри parent_id или None."""
+        with self._lock:
+            return self._children.get((parent_id, name))
+
+    def add(self, name, parent_id, folder_id):
+        """Добавляет в индекс папку, созданную во время запуска."""
+        with self._lock:
+            # Если папок с одним именем несколько, используется первая
+            self._children.setdefault((parent_id, name), folder_id)
+
+
+class FolderResolver:
+    """Возвращает ID папки по пути от корневой папки, создавая недостающие.
+
+    Использование::
+
+        resolver = FolderResolver(drive_service, ROOT_FOLDER_ID)
+        folder_id = resolver.resolve("УГ 2026-2027", "Октябрь", "Включение")
+
+    С обойдённым FolderIndex поиск и проверка папок не требуют запросов.
+    """
+
+    def __init__(self, service, root_id, cache=None, index=None):
+        self.service = service
+        self.root_id = root_id
+        self.cache = cache if cache is not None else FolderCache()
+        self.index = index
+        # Папки, уже проверенные в этом запуске
+        self._checked = set()
+
+    def _key(self, names):
+        return "/".join([self.root_id, *names])
+
+    def _is_valid(self, folder_id, name, parent_id):
+        """Проверяет закэшированную папку одним запросом files.get."""
+        if folder_id in self._checked:
+            return True
+        if self.index is not None and self.index.crawled:
+            return self.index.get(name, parent_id) == folder_id
+        try:
+            folder = self.service.files().get(
+                fileId=folder_id, fields="name,parents,trashed").execute()
+        except HttpError as e:
+            if e.resp.status == 404:
+                return False
+            raise
+        valid = (not folder.get("trashed") and folder.get("name") == name
+                 and parent_id in folder.get("parents", []))
+        if valid:
+            self._checked.add(folder_id)
+        return valid
+
+    def _cached_prefix(self, names):
+        """Самый длинный закэшированный и действительный префикс пути."""
+        for depth in range(len(names), 0, -1):
+            folder_id = self.cache.get(self._key(names[:depth]))
+            if folder_id is None:
+                continue
+            parent_id = self.cache.get(self._key(names[:depth - 1])) \
+                if depth > 1 else self.root_id
+            if parent_id and self._is_valid(folder_id, names[depth - 1], parent_id):
+                return depth, folder_id
+            self.cache.discard(self._key(names[:depth]))
+        return 0, self.root_id
+
+    def find(self, name, parent_id):
+        """ID папки name внутри parent_id или None."""
+        if self.index is not None and self.index.crawled:
+            return self.index.get(name, parent_id)
+        folder = next(iter_children(
+            self.service, parent_id, name=name, mime_type=FOLDER_MIME_TYPE, fields="id"), None)
+        return folder["id"] if folder else None
+
+    def create(self, name, parent_id):
+        """Создаёт папку name внутри parent_id.
+
+        files.create без заранее выделенного ID сам не повторяется (см.
+        quota.is_idempotent), поэтому после временной ошибки папка сначала
+        ищется, и создание повторяется, только если её действительно нет.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                folder = self.service.files().create(
+                    body={"name": name, "parents": [parent_id], "mimeType": FOLDER_MIME_TYPE},
+                    fields="id",
+                ).execute()
+                break
+            except Exception as e:
+                if attempt == MAX_RETRIES or not is_retryable(e):
+                    raise
+                folder = next(iter_children(
+                    self.service, parent_id, name=name, mime_type=FOLDER_MIME_TYPE,
+                    fields="id"), None)
+                if folder is not None:
+                    break
+                time.sleep(backoff_delay(attempt))
+        if self.index is not None:
+            self.index.add(name, parent_id, folder["id"])
+        return folder["id"]
+
+    def resolve(self, *names, create=True):
+        """ID папки root/names[0]/names[1]/...; None, если её нет и create=False."""
+        depth, folder_id = self._cached_prefix(names)
+        for index in range(depth, len(names)):
+            found = self.find(names[index], folder_id)
+            if found is None:
+                if not create:
+                    return None
+                found = self.create(names[index], folder_id)
+            folder_id = found
+            self._checked.add(folder_id)
+            self.cache.set(self._key(names[:index + 1]), folder_id)
+        return folder_id
@@ -0,0 +1,51 @@
+"""Постраничный обход files.list на Google Диске.
+
+files.list отдаёт результаты страницами, причём страница может оказаться
+неполной или даже пустой, хотя дальше ещё есть файлы, поэтому чтение
+только первой страницы незаметно теряет результаты в больших папках.
+iter_files идёт по nextPageToken до конца, запрашивает по PAGE_SIZE
+файлов с узкой маской fields и отдаёт файлы по мере получения страниц,
+не собирая весь список в памяти. Для поиска одного файла достаточно
+``next(iter_children(...), None)``: лишние страницы не запрашиваются.
+"""
+PAGE_SIZE = 1000
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+SHORTCUT_MIME_TYPE = "application/vnd.google-apps.shortcut"
+
+
+def quote_query(value):
+    """Экранирует строку для подстановки в запрос files.list."""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def iter_files(service, query, fields="id,name", page_size=PAGE_SIZE, **kwargs):
+    """Файлы, подходящие под запрос query, с полями fields."""
+    page_token = None
+    while True:
+        response = service.files().list(
+            q=query,
+            fields=f"nextPageToken,files({fields})",
+            pageSize=page_size,
+            pageToken=page_token,
+            **kwargs,
+        ).execute()
+        yield from response.get("files", [])
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return
+
+
+def iter_children(service, parent_ids, name=None, mime_type=None, fields="id,name", **kwargs):
+    """Файлы внутри папки parent_ids (ID или несколько ID), не из корзины.
+
+    name и mime_type дополнительно отбирают файлы по имени и типу.
+    """
+    if isinstance(parent_ids, str):
+        parent_ids = [parent_ids]
+    parents = " or ".join(f"'{parent_id}' in parents" for parent_id in parent_ids)
+    conditions = [f"({parents})", "trashed = false"]
+    if name is not None:
+        conditions.append(f"name = '{quote_query(name)}'")
+    if mime_type is not None:
+        conditions.append(f"mimeType = '{mime_type}'")
+    return iter_files(service, " and ".join(conditions), fields, **kwargs)
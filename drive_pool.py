@@ -0,0 +1,137 @@
+"""Параллельное выполнение изменяющих запросов к Google Drive.
+
+DrivePool запускает работу по студентам в ограниченном пуле потоков.
+Каждый поток получает собственный клиент Drive (httplib2 не потокобезопасен),
+а все изменяющие запросы (создание, копирование, переименование) проходят
+через общий на процесс token bucket, настроенный под квоту Drive на
+пользователя, чтобы не получать 403 rateLimitExceeded.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google_services import new_service
+
+# Число одновременно работающих потоков
+DRIVE_WORKERS = 8
+# Drive выдерживает около 3 изменяющих запросов в секунду от одного
+# пользователя на длительном интервале, кратковременно - больше
+DRIVE_WRITE_RATE = 3.0
+DRIVE_WRITE_BURST = 10
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов по алгоритму token bucket."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Ждёт, пока в корзине наберётся нужное число токенов, и забирает их."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Общий на процесс ограничитель изменяющих запросов к Drive
+drive_write_limiter = TokenBucket(DRIVE_WRITE_RATE, DRIVE_WRITE_BURST)
+
+
+class RateLimitedHttp:
+    """Обёртка над http-клиентом: изменяющие запросы ждут токен."""
+
+    def __init__(self, http, limiter):
+        self.http = http
+        self.limiter = limiter
+
+    def request(self, uri, method="GET", *args, **kwargs):
+        if method != "GET":
+            self.limiter.acquire()
+        return self.http.request(uri, method, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+def report_throughput(files, started):
+    """Печатает итоговую скорость обработки файлов."""
+    elapsed = time.monotonic() - started
+    speed = files / elapsed if elapsed > 0 else 0.0
+    print(f"Обработано файлов: {files} за {elapsed:.1f} с ({speed:.2f} файлов/с)")
+
+
+class DrivePool:
+    """Ограниченный пул потоков для работы с Google Drive.
+
+    Использование::
+
+        with DrivePool(workers=8) as pool:
+            pool.submit(copy_student_files, folder_name, urls)
+
+    Задача вызывается как ``fn(service, *args)`` с клиентом Drive своего
+    потока и должна вернуть число обработанных файлов. При выходе из блока
+    пул дожидается всех задач и печатает скорость в файлах в секунду.
+    """
+
+    def __init__(self, workers=DRIVE_WORKERS, limiter=drive_write_limiter,
+                 service_account_file=None):
+        self.workers = workers
+        self.limiter = limiter
+        self.service_account_file = service_account_file
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._local = threading.local()
+        self._futures = []
+        self._started = time.monotonic()
+
+    def service(self):
+        """Клиент Drive текущего потока."""
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = new_service(
+                "drive", "v3", self.service_account_file,
+                http_wrapper=lambda http: RateLimitedHttp(http, self.limiter))
+            self._local.service = service
+        return service
+
+    def _run(self, fn, args):
+        return fn(self.service(), *args)
+
+    def submit(self, fn, *args):
+        """Ставит задачу в очередь пула и возвращает Future."""
+        future = self._executor.submit(self._run, fn, args)
+        self._futures.append(future)
+        return future
+
+    def wait(self):
+        """Дожидается всех задач и возвращает общее число обработанных файлов."""
+        files = 0
+        for future in self._futures:
+            try:
+                files += future.result() or 0
+            except Exception as e:
+                print(f"Ошибка при работе с Google Диском: {e}")
+        self._futures = []
+        return files
+
+    def __enter__(self):
+        self._started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        files = self.wait()
+        self._executor.shutdown()
+        if exc_type is None:
+            report_throughput(files, self._started)
+        return False
@@ -1,16 +1,28 @@
-import gspread
 from gspread_formatting import *
-from google.oauth2 import service_account
-from oauth2client.service_account import ServiceAccountCredentials
-from googleapiclient.discovery import build
+from gspread.utils import rowcol_to_a1
 import pandas as pd
-import pygsheets
-import apiclient
-import httplib2
 from datetime import datetime
+import asyncio
 import os
 import sys
 
+from async_google import AsyncGoogleClient
+from drive_batch import CopyManifest, ingest_student_documents
+from drive_dedup import CopyIndex
+from drive_folders import FolderResolver
+from google_services import (
+    get_docs_service,
+    get_drive_service,
+    get_gspread_client,
+    get_sheets_service,
+    new_service,
+)
+from profiling import profile_from_argv, set_stage
+from sheets_loader import RowCursor, SheetSpec, SnapshotCache, load_sheets_async, read_new_rows
+
+# python enabling.py --profile - запуск с профилированием по этапам
+profile_from_argv()
+
 # TODO: Добавлять контрактников в отдельный файл
 
 # -----------------------------------------------------------------------------------------#
@@ -28,57 +40,38 @@ SERVICE_ACCOUNT_FILE = "credentials.json"
 ROOT_FOLDER_ID = "10oXbgb7tBzFp41KpfXwmfWbepmnhZ9ch"
 FORM_RESPONSES_ID = "1fZhfUDWSGGr6uHQVdMpA1O2KNX32uXpKe8hMMNkoeMM"
 BASE_ID = '1Cqa_CERAIpnf3jCPoczB498na8drEMZpDAlUrz9_1cU'
-BASE_RANGE = 'A1:U1000'
+# Столбцы базы БДНС, которые заполняет скрипт (строки не ограничены)
+BASE_RANGE = 'A:U'
+# Ускорения ниже включены по умолчанию; переменная окружения со значением
+# 0 выключает их, например DSIN_RESUMABLE_COPIES=0 python enabling.py
+# ID папок студентов выделяются заранее (files.generateIds), чтобы папки и
+# копии документов уходили одними batch-запросами
+PREALLOCATE_FOLDER_IDS = os.environ.get("DSIN_PREALLOCATE_FOLDER_IDS", "1") != "0"
+# Неизменившиеся документы, уже скопированные студенту раньше, заменяются
+# ярлыками на прежние копии (см. drive_dedup.py)
+DEDUP_DOCUMENTS = os.environ.get("DSIN_DEDUP_DOCUMENTS", "1") != "0"
+# Сделанные копии отмечаются в манифесте (.dsin_cache/manifests), и
+# повторный запуск после сбоя докопирует только недостающее без дубликатов
+RESUMABLE_COPIES = os.environ.get("DSIN_RESUMABLE_COPIES", "1") != "0"
+# Таблица ответов читается только после строки, обработанной прошлым
+# запуском (отметка в .dsin_cache/sheet_rows.json), а не целиком
+INCREMENTAL_FORM = os.environ.get("DSIN_INCREMENTAL_FORM", "1") != "0"
 
 # -----------------------------------------------------------------------------------------#
 # --------------------------------------АУТЕНТИФИКАЦИЯ-------------------------------------#
 # -----------------------------------------------------------------------------------------#
 
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive",
-]
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE
-)
-drive_service = build("drive", "v3", credentials=credentials)
-credentials = ServiceAccountCredentials.from_json_keyfile_name(
-    SERVICE_ACCOUNT_FILE, scope
-)
-client = gspread.authorize(credentials)
+# Клиенты создаются один раз на процесс, см. google_services.py
+drive_service = get_drive_service(SERVICE_ACCOUNT_FILE)
+client = get_gspread_client(SERVICE_ACCOUNT_FILE)
 
 # -----------------------------------------------------------------------------------------#
 # --------------------------------ЛОГИКА ПО РАБОТЕ С ПАПКАМИ-------------------------------#
 # -----------------------------------------------------------------------------------------#
 
 
-def find_folder(service, folder_name, parent_folder_id=0):
-    if parent_folder_id == 0:
-        query = f"name = '{folder_name}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-    else:
-        query = f"name = '{folder_name}' and '{parent_folder_id}' in parents and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-    results = service.files().list(q=query, fields="files(id, name)").execute()
-    items = results.get("files", [])
-    return items
-
-
-def create_folder(service, folder_name, parent_folder_id=0):
-    if parent_folder_id == 0:
-        file_metadata = {
-            "name": folder_name,
-            "mimeType": "application/vnd.google-apps.folder",
-        }
-    else:
-        file_metadata = {
-            "name": folder_name,
-            "parents": [parent_folder_id],
-            "mimeType": "application/vnd.google-apps.folder",
-        }
-    file = service.files().create(body=file_metadata, fields="id").execute()
-    return file.get("id")
-
-
-# Поиск папки "УГ" в корневой папке
+# Название папки "УГ" в корневой папке
+set_stage("folders")
 current_year = datetime.now().year
 if datetime.now().month >= 9:
     # Если сейчас сентябрь или позже, то учебный год начинается в этом году
@@ -87,15 +80,9 @@ else:
     # Иначе учебный год начался в предыдущем году
     start_year = current_year - 1
 end_year = start_year + 1
-folder_name = f"УГ {start_year}-{end_year}"
+year_folder = f"УГ {start_year}-{end_year}"
 
-folders = find_folder(drive_service, folder_name, ROOT_FOLDER_ID)
-if not folders:
-    folder_id = create_folder(drive_service, folder_name, ROOT_FOLDER_ID)
-else:
-    folder_id = folders[0]["id"]
-
-# Поиск папки текущего месяца в папке УГ
+# Название папки текущего месяца в папке УГ
 months = {
     "January": "Январь",
     "February": "Февраль",
@@ -112,27 +99,18 @@ months = {
 }
 current_month = datetime.now().strftime("%B")
 current_month = months[current_month]
-folders = find_folder(drive_service, current_month, folder_id)
-if not folders:
-    folder_id = create_folder(drive_service, current_month, folder_id)
-else:
-    folder_id = folders[0]["id"]
-
-# Поиск папки "Включение" в папке текущего месяца
-folder_name = "Включение"
-folders = find_folder(drive_service, folder_name, folder_id)
-if not folders:
-    folder_id = create_folder(drive_service, folder_name, folder_id)
-else:
-    folder_id = folders[0]["id"]
 
-PARENT_FOLDER_ID = folder_id
+# Папка "Включение" в папке текущего месяца. ID папок кэшируются между
+# запусками (см. drive_folders.py), недостающие папки создаются
+folder_resolver = FolderResolver(drive_service, ROOT_FOLDER_ID)
+PARENT_FOLDER_ID = folder_resolver.resolve(year_folder, current_month, "Включение")
 
 # -----------------------------------------------------------------------------------------#
 # --------------------------------------ТАБЛИЦА--------------------------------------------#
 # -----------------------------------------------------------------------------------------#
 
 # Создание таблицы
+set_stage("upload")
 sh = client.create("Таблица включения", folder_id=PARENT_FOLDER_ID)
 ws = sh.sheet1
 
@@ -164,18 +142,48 @@ format_cell_range(ws, "A1:N1", fmt)
 set_row_height(ws, "1", 40)
 set_column_width(ws, "A:N", 200)
 
-# Копирование и сортировка таблицы со студентами
-gc = pygsheets.authorize(service_file=SERVICE_ACCOUNT_FILE)
-base = gc.open_by_key(FORM_RESPONSES_ID)
 
-df_base = base[0]
-df = df_base.get_as_df()
-df2 = df.loc[(df["Статус"] == "Внести") & (df["База данных"] != "Ок")]
+# Таблица ответов на форму и база БДНС не зависят друг от друга,
+# поэтому загружаем их одновременно
+async def load_sources():
+    """Загружает таблицу ответов на форму и базу БДНС параллельно.
+
+    Из таблицы ответов окнами читаются только строки на включение, ещё без
+    отметки "Ок" в базе данных, и с INCREMENTAL_FORM - только после отметки
+    прошлого запуска. Ответы, которым ещё не проставлен статус, не дают
+    отметке продвинуться дальше них, а строки до отметки, снова отмеченные
+    на включение, перечитываются (recheck). База БДНС берётся из локальной
+    копии, если с прошлого запуска не менялась.
+
+    read_new_rows работает в отдельном потоке, поэтому ему нужен свой
+    клиент Sheets: общий клиент google_services не потокобезопасен.
+    """
+    async with AsyncGoogleClient(SERVICE_ACCOUNT_FILE) as google:
+        (form_df, form_mark), (base_df,) = await asyncio.gather(
+            asyncio.to_thread(
+                read_new_rows, new_service("sheets", "v4", SERVICE_ACCOUNT_FILE), FORM_RESPONSES_ID,
+                lambda chunk: (chunk["Статус"] == "Внести") & (chunk["База данных"] != "Ок"),
+                form_cursor.get("enabling", FORM_RESPONSES_ID) if INCREMENTAL_FORM else None,
+                pending=lambda chunk: chunk["Статус"] == "",
+                recheck=["Статус", "База данных"]),
+            load_sheets_async(google, [SheetSpec(BASE_ID, 0, range=BASE_RANGE)],
+                              typed=False, snapshots=SnapshotCache()),
+        )
+    return form_df, form_mark, base_df
+
+
+set_stage("sheet_load")
+form_cursor = RowCursor()
+df2, form_mark, base_df = asyncio.run(load_sources())
+
+# Копирование и сортировка таблицы со студентами
+set_stage("join")
 df2 = df2.sort_values(["ФИО"])
 df2_final = df2.iloc[:, [1, 3, 4, 5, 6, 7, 8, 9, 20, 22]]
 
 # Заполняем таблицу на включение данными из отсортированной таблицы со
 # студентами
+set_stage("upload")
 i = 2
 for index, row in df2_final.iterrows():
     insert_data = row["ФИО"].split()
@@ -196,18 +204,6 @@ for index, row in df2_final.iterrows():
     ws.update([insert_data], f"A{i}:N{i}")
     i += 1
 
-# -----------------------------------------------------------------------------------------#
-# -------------------------Вставляем "Ок" в пустые строки в таблице------------------------#
-# -----------------------------------------------------------------------------------------#
-
-x, y = df.shape
-spreadsheet = client.open_by_key(FORM_RESPONSES_ID)
-worksheet = spreadsheet.sheet1
-for i in range(x):
-    if df["Статус"][i] == "Внести" and df["База данных"][i] != "Ок":
-        worksheet.update_cell(i + 2, 26, "Ок")
-
-
 # -----------------------------------------------------------------------------------------#
 # ----------------------Создаем папки с документами в папке "Включение"--------------------#
 # -----------------------------------------------------------------------------------------#
@@ -221,80 +217,55 @@ def get_file_id_from_url(file_url):
     return file_url[pos + len("id="):]  # возвращает идентификатор файла
 
 
-# Функция копирования файла в папку
-def copy_file(service, file_id, destination_folder_id):
-    """Копирует файл на Google Диске в другую папку."""
-    copied_file = {"parents": [destination_folder_id]}
-    try:
-        copied_file = service.files().copy(fileId=file_id, body=copied_file).execute()
-        return copied_file.get("id")
-    except Exception as e:
-        print(f"Не удалось скопировать файл: {e}")
-
-
-# Функция копирования файлов пользователя в его папку
-def copy_files_of_user(parent_folder_id, file_url, service):
-    # Получение идентификатора файла из ссылки
-    file_id = get_file_id_from_url(file_url)
-
-    # Копирование файла в новую папку
-    copied_file_id = copy_file(service, file_id, parent_folder_id)
-    return copied_file_id
-
-
-# Функция переименования файла
-def rename_file(file_id, new_filename, service):
-    file_metadata = {"name": new_filename}
-    # Выполняем запрос к Google Drive API для обновления метаданных файла
-    try:
-        file = service.files().update(fileId=file_id, body=file_metadata).execute()
-    except Exception as e:
-        print(f"Произошла ошибка при изменении имени файла: {e}")
-
+# Документы студента: столбец таблицы ответов -> имя копии в его папке
+STUDENT_DOCUMENTS = {
+    "Паспорт": "Паспорт.pdf",
+    "Анкета": "Анкета.pdf",
+    "Реквизиты счёта карты": "Реквизиты счёта карты.pdf",
+    "Подтверждающие документы": "Подтверждающие документы.pdf",
+}
 
-# Создание папок с документами для каждого студента
+# Создание папок с документами для каждого студента. Папки и копии файлов
+# отправляются batch-запросами, копия сразу создаётся с итоговым именем.
+# Студент в манифесте определяется номером студенческого (четвёртый столбец
+# ответов), а без номера - строкой формы: имена папок у однофамильцев совпадают
+students = []
 for index, row in df2.iterrows():
     arr = row["ФИО"].split()
-    folder = create_folder(
-        drive_service, f"{arr[0]}{arr[1][0]}{arr[2][0]}", PARENT_FOLDER_ID
-    )
-    first_file_url = row["Паспорт"]
-    second_file_url = row["Анкета"]
-    third_file_url = row["Реквизиты счёта карты"]
-    fourth_file_url = row["Подтверждающие документы"]
-    file_id = copy_files_of_user(folder, first_file_url, drive_service)
-    rename_file(file_id, "Паспорт.pdf", drive_service)
-    file_id = copy_files_of_user(folder, second_file_url, drive_service)
-    rename_file(file_id, "Анкета.pdf", drive_service)
-    file_id = copy_files_of_user(folder, third_file_url, drive_service)
-    rename_file(file_id, "Реквизиты счёта карты.pdf", drive_service)
-    file_id = copy_files_of_user(folder, fourth_file_url, drive_service)
-    rename_file(file_id, "Подтверждающие документы.pdf", drive_service)
+    files = {
+        new_filename: get_file_id_from_url(row[column])
+        for column, new_filename in STUDENT_DOCUMENTS.items()
+    }
+    student = str(row.iloc[3]).strip() or f"строка {index + 2}"
+    students.append((student, f"{arr[0]}{arr[1][0]}{arr[2][0]}", files))
+student_folders = ingest_student_documents(
+    drive_service, PARENT_FOLDER_ID, students,
+    preallocate_ids=PREALLOCATE_FOLDER_IDS,
+    copy_index=CopyIndex() if DEDUP_DOCUMENTS else None,
+    manifest=CopyManifest.for_folder(PARENT_FOLDER_ID) if RESUMABLE_COPIES else None)
 
 # -----------------------------------------------------------------------------------------#
-# -----------------------------------------БАЗА БДНС---------------------------------------#
+# -------------------------Вставляем "Ок" в пустые строки в таблице------------------------#
 # -----------------------------------------------------------------------------------------#
 
+# "Ок" ставится только строкам, документы которых скопированы: остальные
+# строки (и манифест их копирования) подхватит следующий запуск. Индекс df2 -
+# номер строки листа минус 2; все отметки уходят одним запросом
+done_rows = [index for index, folder_id in zip(df2.index, student_folders)
+             if folder_id is not None]
+if done_rows:
+    client.open_by_key(FORM_RESPONSES_ID).sheet1.batch_update(
+        [{"range": rowcol_to_a1(i + 2, 26), "values": [["Ок"]]} for i in sorted(done_rows)])
+# Отметка сдвигается, только если обработаны все прочитанные строки
+if INCREMENTAL_FORM and len(done_rows) == len(df2):
+    form_cursor.set("enabling", FORM_RESPONSES_ID, form_mark)
 
-# Функция по загрузке таблицы в dataframe
-def load_sheet_to_dataframe(service):
-    """Загружаем данные из Google Таблицы в pandas DataFrame"""
-    sheet = service.spreadsheets()
-    result = sheet.values().get(spreadsheetId=BASE_ID, range=BASE_RANGE).execute()
-    values = result.get('values', [])
-
-    # Преобразуем данные в DataFrame
-    if values:
-        # Используем первую строку как заголовок
-        df = pd.DataFrame(values[1:], columns=values[0])
-    else:
-        df = pd.DataFrame()  # Пустой DataFrame, если таблица пуста
+# -----------------------------------------------------------------------------------------#
+# -----------------------------------------БАЗА БДНС---------------------------------------#
+# -----------------------------------------------------------------------------------------#
 
-    return df
 
 # Функция обновления таблицы по dataframe
-
-
 def update_sheet_from_dataframe(service, df):
     """Обновляем Google Таблицу на основе pandas DataFrame"""
     sheet = service.spreadsheets()
@@ -316,8 +287,9 @@ def update_sheet_from_dataframe(service, df):
 
 
 # Обновляем базу БДНС
-base_service = build('sheets', 'v4', credentials=credentials)
-base_df = load_sheet_to_dataframe(base_service)
+set_stage("join")
+base_service = get_sheets_service(SERVICE_ACCOUNT_FILE)
+# База БДНС (base_df) уже загружена вместе с таблицей ответов на форму
 necessary_rows = df2.iloc[:, [0, 1, 13, 3, 4, 5,
                               6, 7, 8, 9, 20, 11, 12, 16, 17, 18, 19, 22]]
 # Создаем строки, которые будем вставлять
@@ -356,6 +328,7 @@ base_df.drop_duplicates(inplace=True, ignore_index=True)
 base_df.sort_values(by=['Фамилия', 'Имя', 'Отчество'],
                     inplace=True, ignore_index=True)
 base_df.to_csv('base_df.csv', index=False, encoding='utf-8-sig')
+set_stage("upload")
 update_sheet_from_dataframe(base_service, base_df)
 
 
@@ -363,20 +336,12 @@ update_sheet_from_dataframe(base_service, base_df)
 # -----------------------------------------ДОКУМЕНТ----------------------------------------#
 # -----------------------------------------------------------------------------------------#
 
+set_stage("docs")
 # Получение текущей даты
 current_date = datetime.now().date()
 
-# Аутентификация с использованием учетных данных службы
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE,
-    scopes=[
-        "https://www.googleapis.com/auth/drive",
-        "https://www.googleapis.com/auth/documents",
-    ],
-)
-
-# Создание экземпляра клиента для работы с API Google Docs
-docs_service = build("docs", "v1", credentials=credentials)
+# Клиент для работы с API Google Docs
+docs_service = get_docs_service(SERVICE_ACCOUNT_FILE)
 
 # Создание метаданных для нового файла
 file_metadata = {
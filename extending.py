@@ -1,7 +1,4 @@
 # __________ #
-from oauth2client.service_account import ServiceAccountCredentials
-import apiclient
-import httplib2
 import os
 import sys
 
@@ -9,32 +6,37 @@ import sys
 # path = 'scripts/debug/extending.txt'
 # sys.stderr = open(path, 'w')
 
-import pygsheets
 import pandas as pd
-import gspread
 from datetime import datetime
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google.oauth2 import service_account
-
-credentials = service_account.Credentials.from_service_account_file(
-    "credentials.json", scopes=["https://www.googleapis.com/auth/drive"]
+from gspread.utils import rowcol_to_a1
+
+from drive_folders import FolderIndex, FolderResolver
+from drive_batch import (
+    CopyManifest,
+    IdAllocator,
+    document_requests,
+    execute_batch,
+    folder_created,
+    folder_request,
+    record_copies,
+)
+from drive_dedup import CopyIndex
+from drive_pool import DRIVE_WORKERS, DrivePool
+from google_services import (
+    get_docs_service,
+    get_drive_service,
+    get_gspread_client,
+    get_sheets_service,
 )
-drive_service = build("drive", "v3", credentials)
+from profiling import profile_from_argv, set_stage
+from sheets_loader import RowCursor, SheetSpec, SnapshotCache, load_sheets, read_new_rows
+from student_schema import BDNS_SCHEMA, INT, convert
 
+# python extending.py --profile - запуск с профилированием по этапам
+profile_from_argv()
 
 CREDENTIALS_FILE = "credentials.json"  # имя файла с закрытым ключом
-credentials = ServiceAccountCredentials.from_json_keyfile_name(
-    CREDENTIALS_FILE,
-    [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ],
-)
-httpAuth = credentials.authorize(httplib2.Http())
-sheets_service = apiclient.discovery.build("sheets", "v4", http=httpAuth)
 
-gc = pygsheets.authorize(service_file="credentials.json")
 
 # ИЗМЕНЯЕМАЯ ИНФОРМАЦИЯ
 # Folder ID
@@ -43,51 +45,33 @@ ROOT_FOLDER_ID = "10oXbgb7tBzFp41KpfXwmfWbepmnhZ9ch"
 status_table = "1Cqa_CERAIpnf3jCPoczB498na8drEMZpDAlUrz9_1cU"
 # Считывание ID таблицы ответов на форму
 table = "1fZhfUDWSGGr6uHQVdMpA1O2KNX32uXpKe8hMMNkoeMM"
+# Ускорения ниже включены по умолчанию; переменная окружения со значением
+# 0 выключает их, например DSIN_RESUMABLE_COPIES=0 python extending.py
+# ID новых папок студентов выделяются заранее (files.generateIds), чтобы
+# папка и копии документов уходили одним batch-запросом
+PREALLOCATE_FOLDER_IDS = os.environ.get("DSIN_PREALLOCATE_FOLDER_IDS", "1") != "0"
+# Неизменившиеся документы, уже скопированные студенту раньше, заменяются
+# ярлыками на прежние копии (см. drive_dedup.py)
+DEDUP_DOCUMENTS = os.environ.get("DSIN_DEDUP_DOCUMENTS", "1") != "0"
+# Сделанные копии отмечаются в манифесте (.dsin_cache/manifests), и
+# повторный запуск после сбоя докопирует только недостающее без дубликатов
+RESUMABLE_COPIES = os.environ.get("DSIN_RESUMABLE_COPIES", "1") != "0"
+# Таблица ответов читается только после строки, обработанной прошлым
+# запуском (отметка в .dsin_cache/sheet_rows.json), а не целиком
+INCREMENTAL_FORM = os.environ.get("DSIN_INCREMENTAL_FORM", "1") != "0"
 
 # -----------------------------------------------------------#
 
 # ----------------------РАБОТА С ПАПКАМИ----------------------------#
 
 # ----------------------АУТЕНТИФИКАЦИЯ------------------------------#
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive",
-]
-credentials = service_account.Credentials.from_service_account_file(
-    CREDENTIALS_FILE)
-drive_service = build("drive", "v3", credentials=credentials)
-credentials = ServiceAccountCredentials.from_json_keyfile_name(
-    CREDENTIALS_FILE, scope)
-client = gspread.authorize(credentials)
-
-
-def find_folder(service, folder_name, parent_folder_id=0):
-    if parent_folder_id == 0:
-        query = f"name = '{folder_name}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-    else:
-        query = f"name = '{folder_name}' and '{parent_folder_id}' in parents and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-    results = service.files().list(q=query, fields="files(id, name)").execute()
-    items = results.get("files", [])
-    return items
+# Клиенты создаются один раз на процесс, см. google_services.py
+drive_service = get_drive_service(CREDENTIALS_FILE)
+client = get_gspread_client(CREDENTIALS_FILE)
 
 
-def create_folder(service, folder_name, parent_folder_id=0):
-    if parent_folder_id == 0:
-        file_metadata = {
-            "name": folder_name,
-            "mimeType": "application/vnd.google-apps.folder",
-        }
-    else:
-        file_metadata = {
-            "name": folder_name,
-            "parents": [parent_folder_id],
-            "mimeType": "application/vnd.google-apps.folder",
-        }
-    file = service.files().create(body=file_metadata, fields="id").execute()
-    return file.get("id")
-
-
-# Поиск папки "УГ" в корневой папке
+# Название папки "УГ" в корневой папке
+set_stage("folders")
 current_year = datetime.now().year
 if datetime.now().month >= 9:
     # Если сейчас сентябрь или позже, то учебный год начинается в этом году
@@ -96,15 +80,9 @@ else:
     # Иначе учебный год начался в предыдущем году
     start_year = current_year - 1
 end_year = start_year + 1
-folder_name = f"УГ {start_year}-{end_year}"
-
-folders = find_folder(drive_service, folder_name, ROOT_FOLDER_ID)
-if not folders:
-    folder_id = create_folder(drive_service, folder_name, ROOT_FOLDER_ID)
-else:
-    folder_id = folders[0]["id"]
+year_folder = f"УГ {start_year}-{end_year}"
 
-# Поиск папки текущего месяца в папке УГ
+# Название папки текущего месяца в папке УГ
 months = {
     "January": "Январь",
     "February": "Февраль",
@@ -121,75 +99,48 @@ months = {
 }
 current_month = datetime.now().strftime("%B")
 current_month = months[current_month]
-folders = find_folder(drive_service, current_month, folder_id)
-if not folders:
-    folder_id = create_folder(drive_service, current_month, folder_id)
-else:
-    folder_id = folders[0]["id"]
 
-# Поиск папки "Продление" в папке текущего месяца
-folder_name = "Продление"
-folders = find_folder(drive_service, folder_name, folder_id)
-if not folders:
-    folder_id = create_folder(drive_service, folder_name, folder_id)
-else:
-    folder_id = folders[0]["id"]
+# Всё дерево папок под корневой папкой загружается одним обходом, дальше
+# поиск папок (в том числе папок студентов) не требует запросов к Drive
+folder_index = FolderIndex(drive_service, ROOT_FOLDER_ID).crawl()
 
-FOLDER_ID = folder_id
+# Папка "Продление" в папке текущего месяца. ID папок кэшируются между
+# запусками (см. drive_folders.py), недостающие папки создаются
+folder_resolver = FolderResolver(drive_service, ROOT_FOLDER_ID, index=folder_index)
+FOLDER_ID = folder_resolver.resolve(year_folder, current_month, "Продление")
 
 # ---------НУЖНЫЕ ПАПКИ НАЙДЕНЫ ИЛИ СОЗДАНЫ----------------
 
 # Первый этап (Сбор информации из таблицы ответов на форму)
+set_stage("sheet_load")
 inter_file = " my_data.csv"  # Временный файл
-base = gc.open_by_key(table)
-df_base = base[0]
-df = df_base.get_as_df()
-
-# Отсеиваем только нужный период
-df = df.loc[df["База данных"] != "Ок"]
-
-# Считали данные таблицы в датафрейм, вытаскиваем только нужные нам
-# (продление), сортируем
-df2 = df.loc[df["Статус"] == "Продлить"]
+# Таблица ответов читается окнами: из каждого окна остаются только строки
+# на продление за нужный период (ещё без отметки "Ок" в базе данных), а с
+# INCREMENTAL_FORM - только строки после отметки прошлого запуска. Ответы без
+# проставленного статуса не дают отметке продвинуться дальше них, а строки до
+# отметки, снова отмеченные на продление, перечитываются (recheck)
+form_cursor = RowCursor()
+df2, form_mark = read_new_rows(
+    get_sheets_service(CREDENTIALS_FILE), table,
+    lambda chunk: (chunk["База данных"] != "Ок") & (chunk["Статус"] == "Продлить"),
+    form_cursor.get("extending", table) if INCREMENTAL_FORM else None,
+    pending=lambda chunk: chunk["Статус"] == "",
+    typed=True, recheck=["Статус", "База данных"])
 
 # Если людей на продление нет, завершаем работу
 if df2.empty:
+    if INCREMENTAL_FORM:
+        form_cursor.set("extending", table, form_mark)
     print("Нет людей на продление в этом периоде")
     exit(1)
 
-# Проставляем ОК
-# Установка доступа к Google Sheets
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive",
-]
-credentials = ServiceAccountCredentials.from_json_keyfile_name(
-    "credentials.json", scope
-)
-gc2 = gspread.authorize(credentials)
-answer_base = gc2.open_by_key(table).sheet1
-# Получаем все данные из таблицы в виде списка списков
-data = answer_base.get_all_values()
-
-# Создаем DataFrame из полученных данных
-df = pd.DataFrame(data[1:], columns=data[0])
-
-x, y = df2.shape
-for i in range(0, x):
-    # Находим индекс строки, в которой нужно изменить значение
-    value = df2.iat[i, 1]
-    index = df[df["ФИО"] == str(value)].index.tolist()
-    # Меняем значение в другом столбце
-    if index:
-        index = (
-            index[0] + 2
-        )  # Прибавляем 2, потому что индексация в Google Sheets начинается с 1 и нумерация строк считается с 2
-        answer_base.update_cell(index, 26, "Ок")
-        print("Ок!")
-    else:
-        print("Не Ок")
-
-df2 = df2.sort_values(["ФИО"]).reset_index(drop=True)
+set_stage("join")
+df2 = df2.sort_values(["ФИО"])
+# Индекс df2 - номер строки листа минус 2 (нумерация строк в Google Sheets
+# начинается с 1, первая строка - заголовки); по нему после копирования
+# документов проставляется "Ок"
+form_rows = df2.index.tolist()
+df2 = df2.reset_index(drop=True)
 new_df = df2["ФИО"].str.split(expand=True)
 new_df.columns = ["Фамилия", "Имя", "Отчество"]
 
@@ -202,9 +153,12 @@ final_df = pd.concat([new_df, df2_final], axis=1)
 # Первый этап завершён
 
 # Второй этап сверка с базой БДНС
-base = gc.open_by_key(status_table)
-df_base = base[0]
-df = df_base.get_as_df()
+set_stage("sheet_load")
+# База БДНС берётся из локальной копии, если с прошлого запуска не менялась
+bdns_snapshots = SnapshotCache(drive_service)
+df = load_sheets(get_sheets_service(CREDENTIALS_FILE), [SheetSpec(status_table, 0)],
+                 snapshots=bdns_snapshots)[0]
+set_stage("join")
 x, y = final_df.shape
 # С помощью базы данных заполняем недостающие данные
 for i in range(0, int(x)):
@@ -221,29 +175,22 @@ for i in range(0, int(x)):
 
 # Обновление сроков истечение документов в таблице БДНС
 # Подключаемся к базе статусов БДНС
-# Установка доступа к Google Sheets
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive",
-]
-credentials = ServiceAccountCredentials.from_json_keyfile_name(
-    "credentials.json", scope
-)
-gc2 = gspread.authorize(credentials)
-status_base = gc2.open_by_key(status_table).sheet1
+set_stage("upload")
+status_base = client.open_by_key(status_table).sheet1
 
-# Получаем все данные из таблицы в виде списка списков
-data = status_base.get_all_values()
-
-# Создаем DataFrame из полученных данных
-df = pd.DataFrame(data[1:], columns=data[0])
+# Данные таблицы по схеме БДНС (номер студенческого - Int64): та же
+# ревизия, что загружена выше, поэтому повторного скачивания нет
+df = load_sheets(get_sheets_service(CREDENTIALS_FILE),
+                 [SheetSpec(status_table, 0, schema=BDNS_SCHEMA)],
+                 typed=False, snapshots=bdns_snapshots)[0]
 
 # Извлекаем номер студенческого и срок действия документов
 x, y = final_df.shape
 for i in range(0, x):
-    # Находим индекс строки, в которой нужно изменить значение
-    value = final_df.iat[i, 3]
-    index = df[df["Студенческий"] == str(value)].index.tolist()
+    # Находим индекс строки, в которой нужно изменить значение; номер из
+    # формы приводится к тому же типу, что и в базе
+    value = convert(pd.Series([final_df.iat[i, 3]]), INT)[0]
+    index = df[df["Студенческий"] == value].index.tolist() if pd.notna(value) else []
     # Меняем значение в другом столбце
     if index:
         index = (
@@ -256,6 +203,7 @@ for i in range(0, x):
 
 
 # Отбираем информацию для документа со справками
+set_stage("join")
 df3 = final_df.copy()
 sub_df = new_df.copy()
 x, y = sub_df.shape
@@ -281,37 +229,13 @@ final_sub_df["X"] = final_sub_df["X"].astype(str)
 
 # Укажите путь к вашему JSON файлу учетной записи службы
 SERVICE_ACCOUNT_FILE = "credentials.json"
-SCOPES = ["https://www.googleapis.com/auth/drive"]
 
 
 # -----------Описание вспомогательных функций---------------------#
-def authenticate():
-    """Авторизация и получение service."""
-    creds = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=SCOPES
-    )
-    service = build("drive", "v3", credentials=creds)
-    return service
-
-
-def get_folder_id(service, folder_name, parent_folder_id):
-    """Проверяет наличие папки на Google Диске и возвращает её ID."""
-    query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and '{parent_folder_id}' in parents and trashed=false"
-    results = (
-        service.files()
-        .list(q=query, spaces="drive", fields="files(id, name)")
-        .execute()
-    )
-    items = results.get("files", [])
-    if items:
-        # Папка найдена, возвращаем её ID
-        return items[0]["id"]
-    return None
-
-
 def create_folder(service, folder_name, parent_folder_id):
     """Создает папку на Google Диске, если её ещё нет."""
-    folder_id = get_folder_id(service, folder_name, parent_folder_id)
+    # Наличие папки проверяется по индексу, без запроса к Drive
+    folder_id = folder_index.get(folder_name, parent_folder_id)
     if folder_id:
         print(f"Папка '{folder_name}' уже существует с ID '{folder_id}'.")
         return folder_id
@@ -321,23 +245,11 @@ def create_folder(service, folder_name, parent_folder_id):
         "parents": [parent_folder_id],
     }
     folder = service.files().create(body=file_metadata, fields="id").execute()
+    folder_index.add(folder_name, parent_folder_id, folder.get("id"))
     print(f"Папка '{folder_name}' создана внутри '{parent_folder_id}'.")
     return folder.get("id")
 
 
-def copy_file(service, file_id, destination_folder_id):
-    """Копирует файл на Google Диске в другую папку."""
-    copied_file = {"parents": [destination_folder_id]}
-    try:
-        copied_file = service.files().copy(fileId=file_id, body=copied_file).execute()
-        print(
-            f"Файл с ID {file_id} успешно скопирован в папку с ID {destination_folder_id}."
-        )
-        return copied_file.get("id")
-    except Exception as e:
-        print(f"Не удалось скопировать файл: {e}")
-
-
 def get_file_id_from_url(file_url):
     """Получает идентификатор файла из ссылки на файл Google Диска."""
     # Ссылка формата https://drive.google.com/open?id=++++++++++++++++++++++
@@ -345,45 +257,126 @@ def get_file_id_from_url(file_url):
     return file_url[pos + len("id="):]
 
 
-def rename_file(file_id, new_filename, service):
-    file_metadata = {"name": new_filename}
-    # Выполняем запрос к Google Drive API для обновления метаданных файла
-    try:
-        file = service.files().update(fileId=file_id, body=file_metadata).execute()
-    except Exception as e:
-        print(f"Произошла ошибка при изменении имени файла: {e}")
-
-
-def copy_files_of_user(parent_folder_id, file_url, new_folder_name):
-    service = authenticate()
-
-    # Получение идентификатора файла из ссылки
-    file_id = get_file_id_from_url(file_url)
-
-    # Создание новой папки
-    new_folder_id = create_folder(service, new_folder_name, parent_folder_id)
-
-    # Копирование файла в новую папку
-    copy_file(service, file_id, new_folder_id)
-
-    rename_file(file_id, "Подтверждающий документ.pdf", service)
+# Общий для потоков запас заранее выделенных ID папок
+folder_ids = IdAllocator()
+# Индекс уже сделанных копий документов по md5Checksum
+copy_index = CopyIndex() if DEDUP_DOCUMENTS else None
+# Манифест копирования в папку этого месяца, общий для потоков
+manifest = CopyManifest.for_folder(FOLDER_ID) if RESUMABLE_COPIES else None
+# Ключи студентов, документы которых скопировать не удалось
+failed_students = set()
+
+
+def document_name(number):
+    """Имя копии number-го подтверждающего документа студента."""
+    if number == 1:
+        return "Подтверждающий документ.pdf"
+    return f"Подтверждающий документ {number}.pdf"
+
+
+def copy_files_of_user(service, parent_folder_id, file_urls, new_folder_name, student):
+    """Создаёт папку студента и копирует в неё его документы.
+
+    Выполняется в потоке DrivePool, service - клиент Drive этого потока.
+    student - ключ студента в манифесте. Новая папка и копии документов
+    отправляются одним batch-запросом. Возвращает число скопированных файлов.
+    """
+    # Получение идентификаторов файлов из ссылок; второй и следующие
+    # документы получают номер, чтобы имена в папке не совпадали
+    files = [(document_name(number), get_file_id_from_url(file_url))
+             for number, file_url in enumerate(file_urls, 1)]
+    reused = copy_index.plan(service, [(new_folder_name, files)]) if copy_index else {}
+
+    requests = []
+    # Папку студента из манифеста не ищем по имени: у однофамильцев
+    # с одинаковыми инициалами оно совпадает
+    entry = manifest.folder(service, student) if manifest is not None else None
+    new_folder_id = entry["id"] if entry else folder_index.get(new_folder_name, parent_folder_id)
+    if entry is not None and not entry["done"]:
+        requests.append(
+            folder_request(service, new_folder_name, parent_folder_id, new_folder_id))
+    elif new_folder_id:
+        print(f"Папка '{new_folder_name}' уже существует с ID '{new_folder_id}'.")
+    elif PREALLOCATE_FOLDER_IDS:
+        new_folder_id = folder_ids.next(service)
+        requests.append(
+            folder_request(service, new_folder_name, parent_folder_id, new_folder_id))
+    else:
+        new_folder_id = create_folder(service, new_folder_name, parent_folder_id)
+
+    # Копирование файлов в папку сразу под нужным именем
+    copies = document_requests(
+        service, student, new_folder_name, files, new_folder_id, reused, copy_index, manifest)
+    if manifest is not None:
+        # ID сохраняются до отправки, чтобы повторный запуск использовал те же
+        manifest.save()
+    results = execute_batch(
+        service, requests + [request for *_, request in copies],
+        new_parents={new_folder_id} if requests else None)
+    if requests:
+        _, exception = results.pop(0)
+        if not folder_created(exception):
+            print(f"Не удалось создать папку '{new_folder_name}': {exception}")
+            failed_students.add(student)
+            return 0
+        folder_index.add(new_folder_name, parent_folder_id, new_folder_id)
+        if manifest is not None:
+            manifest.mark_done("folders", student)
+        print(f"Папка '{new_folder_name}' создана внутри '{parent_folder_id}'.")
+    copied = record_copies(copies, results, reused, copy_index, manifest, failed_students)
+    if manifest is not None:
+        manifest.save()
+    return copied
 
 
 # ------------------------------------------------------------------#
 
 
 # Запуск для каждого из студентов
-# Для каждого студента создаётся папка с его документами
+# Для каждого студента создаётся папка с его документами. Файлы одного
+# студента обрабатываются в одной задаче, разные студенты - параллельно.
+# Студент определяется номером студенческого, а без номера - строкой формы:
+# имена папок у однофамильцев совпадают
+files_of_students = {}
+folder_names = {}
+student_keys = []
 x, y = final_sub_df.shape
 for i in range(0, int(x)):
+    student = str(final_df.iat[i, 3]).strip() or f"строка {form_rows[i] + 2}"
+    student_keys.append(student)
+    folder_names[student] = final_sub_df.iat[i, 1]
     for j in range(4, 8):
         elem = final_sub_df.iat[i, j]
         if not (pd.isnull(elem) or (elem == "")):
-            copy_files_of_user(FOLDER_ID, elem, final_sub_df.iat[i, 1])
+            files_of_students.setdefault(student, []).append(elem)
+
+set_stage("upload")
+with DrivePool(DRIVE_WORKERS, service_account_file=SERVICE_ACCOUNT_FILE) as pool:
+    tasks = {student: pool.submit(copy_files_of_user, FOLDER_ID, file_urls,
+                                  folder_names[student], student)
+             for student, file_urls in files_of_students.items()}
+failed_students.update(
+    student for student, task in tasks.items() if task.exception() is not None)
+if copy_index is not None:
+    copy_index.save()
+
+# Проставляем ОК только строкам, документы которых скопированы: остальные
+# строки (и манифест их копирования) подхватит следующий запуск; все
+# отметки уходят одним запросом
+done_rows = [index for index, student in zip(form_rows, student_keys)
+             if student not in failed_students]
+if done_rows:
+    client.open_by_key(table).sheet1.batch_update(
+        [{"range": rowcol_to_a1(index + 2, 26), "values": [["Ок"]]} for index in done_rows])
+print(f"Ок: {len(done_rows)}")
+# Отметка сдвигается, только если обработаны все прочитанные строки
+if INCREMENTAL_FORM and len(done_rows) == len(form_rows):
+    form_cursor.set("extending", table, form_mark)
 
 # --------------------РАБОТА С ПАПКАМИ ЗАВЕРШЕНА------------------------------#
 
 # Оставим только нужную информацию для документа "Справки"
+set_stage("join")
 final_sub_df = final_sub_df.iloc[:, [0, 1, 2, 3]]
 
 # Второй этап обработки данных завершён, создаём промежуточный CSV-файл с
@@ -415,26 +408,14 @@ final_df = final_df[
 
 # ------------------- Работа с гугл-документом -------------------------------------#
 
+set_stage("docs")
 
 # Получение текущей даты
 current_date = datetime.now().date()
 
-# Подставьте путь к файлу с вашими учетными данными и ID вашей целевой папки
-SERVICE_ACCOUNT_FILE = "credentials.json"
-
-
-# Аутентификация с использованием учетных данных службы
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE,
-    scopes=[
-        "https://www.googleapis.com/auth/drive",
-        "https://www.googleapis.com/auth/documents",
-    ],
-)
-
-# Создание экземпляра клиента для работы с API Google Drive и Google Docs
-drive_service = build("drive", "v3", credentials=credentials)
-docs_service = build("docs", "v1", credentials=credentials)
+# Клиенты для работы с API Google Drive и Google Docs
+drive_service = get_drive_service(SERVICE_ACCOUNT_FILE)
+docs_service = get_docs_service(SERVICE_ACCOUNT_FILE)
 
 # ________________________________________________________ #
 
@@ -841,18 +822,9 @@ docs_service.documents().batchUpdate(
 
 # ------------------- Работа с гугл-документом -------------------------------------#
 
-# Аутентификация с использованием учетных данных службы
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE,
-    scopes=[
-        "https://www.googleapis.com/auth/drive",
-        "https://www.googleapis.com/auth/documents",
-    ],
-)
-
-# Создание экземпляра клиента для работы с API Google Drive и Google Docs
-drive_service = build("drive", "v3", credentials=credentials)
-docs_service = build("docs", "v1", credentials=credentials)
+# Клиенты для работы с API Google Drive и Google Docs
+drive_service = get_drive_service(SERVICE_ACCOUNT_FILE)
+docs_service = get_docs_service(SERVICE_ACCOUNT_FILE)
 
 # ________________________________________________________ #
 
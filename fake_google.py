@@ -0,0 +1,1110 @@
+"""Поддельный Google API и запись/воспроизведение реальных запусков.
+
+Позволяет запускать enabling.py, extending.py, stat_base.py, bases_diff.py
+и остальные скрипты без обращения к настоящим таблицам и папкам. Режим
+выбирается переменными окружения, которые читает google_services.py:
+
+* ``DSIN_GOOGLE_MODE=fake`` - все запросы Drive v3, Sheets v4 и Docs v1
+  обрабатывает FakeGoogle прямо в процессе. Начальное состояние читается
+  из JSON-файла ``DSIN_FAKE_STATE``, задержка ответа задаётся в секундах
+  ``DSIN_FAKE_LATENCY``, доля ответов 429 - ``DSIN_FAKE_ERROR_RATE``;
+* ``DSIN_GOOGLE_MODE=record`` - запуск идёт в настоящий Google, а все ответы
+  сохраняются в кассету ``DSIN_CASSETTE`` (JSON);
+* ``DSIN_GOOGLE_MODE=replay`` - ответы берутся из кассеты, сеть и
+  credentials.json не нужны.
+
+Поддельный API можно поднять и как локальный HTTP-сервер, например для
+AsyncGoogleClient: ``python fake_google.py serve --state state.json``.
+Там же можно поднять FakeYandexDisk - замену REST API Яндекс Диска для
+drive2drive.py: ``python fake_google.py serve-yandex``.
+
+Формат файла состояния::
+
+    {
+        "files": [{"id": "...", "name": "...", "mimeType": "...", "parents": ["..."]}],
+        "spreadsheets": {"<id>": {"title": "...", "sheets": [{"title": "Лист1", "values": [[...]]}]}},
+        "documents": {"<id>": {"title": "..."}}
+    }
+"""
+import argparse
+import atexit
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httplib2
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from drive_listing import FOLDER_MIME_TYPE
+
+MODE_ENV = "DSIN_GOOGLE_MODE"
+CASSETTE_ENV = "DSIN_CASSETTE"
+STATE_ENV = "DSIN_FAKE_STATE"
+LATENCY_ENV = "DSIN_FAKE_LATENCY"
+ERROR_RATE_ENV = "DSIN_FAKE_ERROR_RATE"
+
+SPREADSHEET_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+DOCUMENT_MIME_TYPE = "application/vnd.google-apps.document"
+
+# Запросы получения токена не записываются в кассету
+TOKEN_HOSTS = ("oauth2.googleapis.com", "accounts.google.com")
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")[:-4] + "Z"
+
+
+def _json_response(status, payload):
+    return status, {"content-type": "application/json; charset=UTF-8"}, \
+        json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def _error(status, message, reason=None):
+    error = {"code": status, "message": message}
+    if reason:
+        error["errors"] = [{"reason": reason, "message": message}]
+    return _json_response(status, {"error": error})
+
+
+# ----------------------------- Запросы Drive ----------------------------- #
+
+_TOKEN_RE = re.compile(r"\s*('(?:\\.|[^'])*'|\(|\)|!=|>=|<=|=|<|>|[\w.]+)")
+
+
+def _tokenize(query):
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = _TOKEN_RE.match(query, position)
+        if not match:
+            raise ValueError(f"Не удалось разобрать запрос: {query}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+class DriveQuery:
+    """Разбор и проверка подмножества языка запросов files.list."""
+
+    def __init__(self, query):
+        self.tokens = _tokenize(query) if query else []
+        self.position = 0
+        self.tree = self._or() if self.tokens else None
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def _or(self):
+        node = self._and()
+        while self._peek() == "or":
+            self._next()
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self):
+        node = self._factor()
+        while self._peek() == "and":
+            self._next()
+            node = ("and", node, self._factor())
+        return node
+
+    def _factor(self):
+        token = self._next()
+        if token == "not":
+            return ("not", self._factor())
+        if token == "(":
+            node = self._or()
+            self._next()
+            return node
+        operator = self._next()
+        right = self._next()
+        return ("cmp", token, operator, right)
+
+    @staticmethod
+    def _value(token):
+        if token.startswith("'"):
+            return token[1:-1].replace("\\'", "'").replace("\\\\", "\\")
+        return {"true": True, "false": False}.get(token, token)
+
+    def _check(self, node, file):
+        kind = node[0]
+        if kind == "or":
+            return self._check(node[1], file) or self._check(node[2], file)
+        if kind == "and":
+            return self._check(node[1], file) and self._check(node[2], file)
+        if kind == "not":
+            return not self._check(node[1], file)
+        _, left, operator, right = node
+        if operator == "in":
+            return self._value(left) in file.get(right, [])
+        actual = file.get(left, False if left == "trashed" else None)
+        expected = self._value(right)
+        if operator == "=":
+            return actual == expected
+        if operator == "!=":
+            return actual != expected
+        if operator == "contains":
+            return isinstance(actual, str) and expected in actual
+        if actual is None:
+            return False
+        return {">": actual > expected, "<": actual < expected,
+                ">=": actual >= expected, "<=": actual <= expected}[operator]
+
+    def matches(self, file):
+        return self.tree is None or self._check(self.tree, file)
+
+
+# ------------------------------ Диапазоны A1 ------------------------------ #
+
+def _column_index(letters):
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+def column_letter(index):
+    """Буквенное обозначение столбца по его номеру (с нуля)."""
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord("A") + rest) + letters
+    return letters
+
+
+_CELL_RE = re.compile(r"^([A-Za-z]*)(\d*)$")
+
+
+def parse_a1(a1_range):
+    """Разбирает диапазон вида 'Лист'!A1:C10 на (лист, r0, c0, r1, c1).
+
+    Границы включительные и считаются с нуля, None - без ограничения.
+    """
+    sheet = None
+    if "!" in a1_range:
+        sheet, a1_range = a1_range.rsplit("!", 1)
+        if sheet.startswith("'"):
+            sheet = sheet[1:-1].replace("''", "'")
+    elif not _CELL_RE.match(a1_range.split(":")[0]):
+        # Указано только название листа
+        return a1_range.strip("'").replace("''", "'"), None, None, None, None
+    start, _, end = a1_range.partition(":")
+    start_col, start_row = _CELL_RE.match(start).groups()
+    if end:
+        end_col, end_row = _CELL_RE.match(end).groups()
+    else:
+        end_col, end_row = start_col, start_row
+    return (
+        sheet,
+        int(start_row) - 1 if start_row else None,
+        _column_index(start_col) if start_col else None,
+        int(end_row) - 1 if end_row else None,
+        _column_index(end_col) if end_col else None,
+    )
+
+
+def _user_entered(value):
+    """Преобразует значение так, как это делает Sheets для USER_ENTERED."""
+    if isinstance(value, str):
+        for cast in (int, float):
+            try:
+                return cast(value)
+            except ValueError:
+                pass
+    return value
+
+
+def _formatted(value):
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+# ------------------------------ FakeGoogle ------------------------------ #
+
+class FakeGoogle:
+    """Поддельные Drive v3, Sheets v4 и Docs v1 в памяти процесса.
+
+    handle(method, url, body, headers) возвращает (статус, заголовки, тело)
+    и используется транспортами HandlerHttp, HandlerAdapter и serve().
+    """
+
+    def __init__(self, state=None, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.files = {}
+        self.spreadsheets = {}
+        self.documents = {}
+        # Журнал изменений для changes.list: ID изменённых файлов по порядку
+        self.changes = []
+        self.requests = 0
+        self._ids = 0
+        self._lock = threading.RLock()
+        if state:
+            self.load(state)
+
+    # ----------------------------- Состояние ---------------------------- #
+
+    def new_id(self):
+        with self._lock:
+            self._ids += 1
+            return f"fake{self._ids:06d}"
+
+    def load(self, state):
+        """Загружает начальное состояние (словарь формата файла состояния)."""
+        for file in state.get("files", []):
+            self.add_file(**file)
+        for spreadsheet_id, spreadsheet in state.get("spreadsheets", {}).items():
+            self.add_spreadsheet(spreadsheet_id, spreadsheet.get("title", spreadsheet_id),
+                                 spreadsheet.get("sheets", []))
+        for document_id, document in state.get("documents", {}).items():
+            self.documents[document_id] = {
+                "documentId": document_id, "title": document.get("title", ""), "requests": []}
+
+    def dump(self):
+        """Текущее состояние в формате файла состояния."""
+        return {
+            "files": list(self.files.values()),
+            "spreadsheets": {
+                spreadsheet_id: {"title": spreadsheet["title"], "sheets": spreadsheet["sheets"]}
+                for spreadsheet_id, spreadsheet in self.spreadsheets.items()
+            },
+            "documents": self.documents,
+        }
+
+    def add_file(self, name, mimeType="application/pdf", parents=None, id=None, **extra):
+        file_id = id or self.new_id()
+        file = {
+            "id": file_id,
+            "name": name,
+            "mimeType": mimeType,
+            "parents": list(parents or []),
+            "trashed": False,
+            "modifiedTime": _now(),
+            "version": "1",
+        }
+        if mimeType not in (FOLDER_MIME_TYPE, SPREADSHEET_MIME_TYPE, DOCUMENT_MIME_TYPE):
+            file.setdefault("md5Checksum", hashlib.md5(file_id.encode()).hexdigest())
+            file.setdefault("size", "1024")
+        file.update(extra)
+        self.files[file_id] = file
+        self.changes.append(file_id)
+        if mimeType == SPREADSHEET_MIME_TYPE and file_id not in self.spreadsheets:
+            self.add_spreadsheet(file_id, name, [{"title": "Sheet1", "values": []}])
+        if mimeType == DOCUMENT_MIME_TYPE and file_id not in self.documents:
+            self.documents[file_id] = {"documentId": file_id, "title": name, "requests": []}
+        return file
+
+    def add_spreadsheet(self, spreadsheet_id, title, sheets):
+        self.spreadsheets[spreadsheet_id] = {
+            "title": title,
+            "sheets": [
+                {
+                    "sheetId": sheet.get("sheetId", index),
+                    "title": sheet["title"],
+                    "rowCount": sheet.get("rowCount", max(1000, len(sheet.get("values", [])))),
+                    "columnCount": sheet.get("columnCount", 26),
+                    "values": sheet.get("values", []),
+                }
+                for index, sheet in enumerate(sheets)
+            ],
+        }
+        if spreadsheet_id not in self.files:
+            self.add_file(title, SPREADSHEET_MIME_TYPE, id=spreadsheet_id)
+
+    def _touch(self, file_id):
+        file = self.files.get(file_id)
+        if file is not None:
+            file["modifiedTime"] = _now()
+            file["version"] = str(int(file.get("version", "0")) + 1)
+            self.changes.append(file_id)
+
+    # ----------------------------- Обработка ---------------------------- #
+
+    def handle(self, method, url, body=None, headers=None):
+        """Обрабатывает один HTTP-запрос к Google API."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                return _error(429, "Quota exceeded (fake)", "rateLimitExceeded")
+            parsed = urllib.parse.urlsplit(url)
+            query = urllib.parse.parse_qs(parsed.query)
+            params = {key: values[-1] for key, values in query.items()}
+            params["_multi"] = query
+            params["_range"] = (headers or {}).get("range")
+            if isinstance(body, bytes):
+                body = body.decode("utf-8")
+            path = parsed.path
+            try:
+                if path.startswith("/batch/"):
+                    return self._batch(body, headers or {})
+                payload = json.loads(body) if body and "json" in str(
+                    (headers or {}).get("content-type", "application/json")) else {}
+                if "/drive/v3/" in path:
+                    return self._drive(method, path.split("/drive/v3/", 1)[1], params, payload)
+                if path.startswith("/v4/spreadsheets"):
+                    return self._sheets(method, path[len("/v4/spreadsheets"):], params, payload)
+                if path.startswith("/v1/documents"):
+                    return self._docs(method, path[len("/v1/documents"):], payload)
+            except KeyError as e:
+                return _error(404, f"Not found: {e}", "notFound")
+            return _error(404, f"Unknown endpoint {method} {path}")
+
+    # -------------------------------- Drive ------------------------------- #
+
+    def _drive(self, method, path, params, payload):
+        parts = [urllib.parse.unquote(part) for part in path.split("/") if part]
+        if parts == ["files"] and method == "GET":
+            return self._list_files(params)
+        if parts == ["files"] and method == "POST":
+            return self._create_file(payload)
+        if parts == ["files", "generateIds"]:
+            count = int(params.get("count", 10))
+            return _json_response(200, {"kind": "drive#generatedIds", "space": "drive",
+                                        "ids": [self.new_id() for _ in range(count)]})
+        if parts == ["changes", "startPageToken"]:
+            return _json_response(200, {"startPageToken": str(len(self.changes) + 1)})
+        if parts == ["changes"]:
+            return self._list_changes(params)
+        if len(parts) == 2 and parts[0] == "files":
+            file = self.files[parts[1]]
+            if method == "GET":
+                if params.get("alt") == "media":
+                    return self._media(file, params["_range"])
+                return _json_response(200, file)
+            if method == "PATCH":
+                return self._update_file(file, params, payload)
+            if method == "DELETE":
+                del self.files[parts[1]]
+                self.changes.append(parts[1])
+                return 204, {}, b""
+        if len(parts) == 3 and parts[0] == "files" and parts[2] == "copy":
+            return self._copy_file(self.files[parts[1]], payload)
+        if len(parts) == 3 and parts[0] == "files" and parts[2] == "permissions":
+            self.files[parts[1]]
+            return _json_response(200, {"kind": "drive#permission", "id": self.new_id()})
+        return _error(404, f"Unknown Drive endpoint {method} {path}")
+
+    def _media(self, file, range_header):
+        content = file.get("content", "")
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", range_header or "")
+        if not match:
+            return 200, {"content-type": file["mimeType"]}, content
+        start = int(match.group(1))
+        end = min(int(match.group(2) or len(content) - 1), len(content) - 1)
+        if start >= len(content):
+            return 416, {"content-range": f"bytes */{len(content)}"}, b""
+        return 206, {"content-type": file["mimeType"],
+                     "content-range": f"bytes {start}-{end}/{len(content)}"}, \
+            content[start:end + 1]
+
+    def _list_changes(self, params):
+        start = int(params["pageToken"]) - 1
+        end = min(start + int(params.get("pageSize", 100)), len(self.changes))
+        changes = []
+        for file_id in self.changes[start:end]:
+            file = self.files.get(file_id)
+            change = {"kind": "drive#change", "changeType": "file", "fileId": file_id,
+                      "removed": file is None}
+            if file is not None:
+                change["file"] = file
+            changes.append(change)
+        payload = {"kind": "drive#changeList", "changes": changes}
+        if end < len(self.changes):
+            payload["nextPageToken"] = str(end + 1)
+        else:
+            payload["newStartPageToken"] = str(end + 1)
+        return _json_response(200, payload)
+
+    def _list_files(self, params):
+        query = DriveQuery(params.get("q", ""))
+        files = [file for file in self.files.values() if query.matches(file)]
+        page_size = min(int(params.get("pageSize", 100)), 1000)
+        start = int(params.get("pageToken", 0))
+        response = {"files": files[start:start + page_size]}
+        if start + page_size < len(files):
+            response["nextPageToken"] = str(start + page_size)
+        return _json_response(200, response)
+
+    def _check_new_file(self, payload):
+        """Ошибка Drive для файла с занятым ID или несуществующей папкой."""
+        if payload.get("id") in self.files:
+            return _error(409, "A file already exists with the provided ID.", "duplicate")
+        for parent_id in payload.get("parents", []):
+            if parent_id not in self.files:
+                return _error(404, f"File not found: {parent_id}.", "notFound")
+        return None
+
+    def _create_file(self, payload):
+        error = self._check_new_file(payload)
+        if error:
+            return error
+        file = self.add_file(
+            payload.get("name", "Untitled"),
+            payload.get("mimeType", "application/octet-stream"),
+            payload.get("parents"),
+            id=payload.get("id"),
+            **({"shortcutDetails": payload["shortcutDetails"]} if "shortcutDetails" in payload else {}),
+        )
+        return _json_response(200, file)
+
+    def _copy_file(self, source, payload):
+        error = self._check_new_file(payload)
+        if error:
+            return error
+        extra = {key: value for key, value in source.items()
+                 if key in ("md5Checksum", "size", "content")}
+        copy = self.add_file(
+            payload.get("name", source["name"]),
+            source["mimeType"],
+            payload.get("parents", source.get("parents")),
+            id=payload.get("id"),
+            **extra,
+        )
+        if source["id"] in self.spreadsheets:
+            original = self.spreadsheets[source["id"]]
+            self.add_spreadsheet(copy["id"], copy["name"], json.loads(json.dumps(original["sheets"])))
+        return _json_response(200, copy)
+
+    def _update_file(self, file, params, payload):
+        file.update({key: value for key, value in payload.items() if key != "id"})
+        if params.get("addParents"):
+            file["parents"] = file.get("parents", []) + params["addParents"].split(",")
+        if params.get("removeParents"):
+            removed = params["removeParents"].split(",")
+            file["parents"] = [parent for parent in file.get("parents", []) if parent not in removed]
+        self._touch(file["id"])
+        return _json_response(200, file)
+
+    # ------------------------------- Sheets ------------------------------- #
+
+    def _sheet(self, spreadsheet, title):
+        if title is None:
+            return spreadsheet["sheets"][0]
+        for sheet in spreadsheet["sheets"]:
+            if sheet["title"] == title:
+                return sheet
+        raise KeyError(title)
+
+    def _read(self, spreadsheet, a1_range, render):
+        title, r0, c0, r1, c1 = parse_a1(a1_range)
+        sheet = self._sheet(spreadsheet, title)
+        rows = sheet["values"][(r0 or 0):(None if r1 is None else r1 + 1)]
+        result = []
+        for row in rows:
+            cells = row[(c0 or 0):(None if c1 is None else c1 + 1)]
+            if render != "UNFORMATTED_VALUE":
+                cells = [_formatted(cell) for cell in cells]
+            while cells and cells[-1] in ("", None):
+                cells = cells[:-1]
+            result.append(cells)
+        while result and not result[-1]:
+            result.pop()
+        response = {"range": a1_range, "majorDimension": "ROWS"}
+        if result:
+            response["values"] = result
+        return response
+
+    def _write(self, spreadsheet, a1_range, values, input_option):
+        title, r0, c0, _, _ = parse_a1(a1_range)
+        sheet = self._sheet(spreadsheet, title)
+        r0, c0 = r0 or 0, c0 or 0
+        for i, row in enumerate(values):
+            target_row = r0 + i
+            while len(sheet["values"]) <= target_row:
+                sheet["values"].append([])
+            target = sheet["values"][target_row]
+            for j, value in enumerate(row):
+                while len(target) <= c0 + j:
+                    target.append("")
+                if value is not None:
+                    target[c0 + j] = _user_entered(value) if input_option == "USER_ENTERED" else value
+        sheet["rowCount"] = max(sheet["rowCount"], len(sheet["values"]))
+        return {"updatedRange": a1_range, "updatedRows": len(values),
+                "updatedCells": sum(len(row) for row in values)}
+
+    def _metadata(self, spreadsheet_id, ranges=None):
+        spreadsheet = self.spreadsheets[spreadsheet_id]
+        if ranges:
+            return self._grid_data(spreadsheet_id, ranges)
+        return {
+            "spreadsheetId": spreadsheet_id,
+            "properties": {"title": spreadsheet["title"], "locale": "ru_RU",
+                           "timeZone": "Europe/Moscow", "defaultFormat": {}},
+            "sheets": [
+                {"properties": {
+                    "sheetId": sheet["sheetId"],
+                    "title": sheet["title"],
+                    "index": index,
+                    "sheetType": "GRID",
+                    "gridProperties": {"rowCount": sheet["rowCount"],
+                                       "columnCount": sheet["columnCount"]},
+                }}
+                for index, sheet in enumerate(spreadsheet["sheets"])
+            ],
+        }
+
+    def _grid_data(self, spreadsheet_id, ranges):
+        """spreadsheets.get с ranges: только листы из ranges и их ячейки."""
+        spreadsheet = self.spreadsheets[spreadsheet_id]
+        metadata = self._metadata(spreadsheet_id)
+        sheets = {}
+        for a1_range in ranges:
+            title, r0, c0, _, _ = parse_a1(a1_range)
+            sheet = self._sheet(spreadsheet, title)
+            values = self._read(spreadsheet, a1_range, "FORMATTED_VALUE").get("values", [])
+            entry = sheets.setdefault(sheet["sheetId"], {
+                "properties": metadata["sheets"][spreadsheet["sheets"].index(sheet)]["properties"],
+                "data": []})
+            entry["data"].append({
+                "startRow": r0 or 0, "startColumn": c0 or 0,
+                "rowData": [{"values": [{"formattedValue": str(cell)} if cell != "" else {}
+                                        for cell in row]} for row in values],
+            })
+        metadata["sheets"] = list(sheets.values())
+        return metadata
+
+    def _sheets(self, method, path, params, payload):
+        path = urllib.parse.unquote(path).lstrip("/")
+        if not path and method == "POST":
+            spreadsheet_id = self.new_id()
+            sheets = [{"title": sheet["properties"]["title"]} for sheet in payload.get("sheets", [])]
+            title = payload.get("properties", {}).get("title", "Untitled")
+            self.add_spreadsheet(spreadsheet_id, title, sheets or [{"title": "Sheet1"}])
+            return _json_response(200, self._metadata(spreadsheet_id))
+        spreadsheet_id, _, rest = path.partition("/")
+        if ":" in spreadsheet_id and not rest:
+            spreadsheet_id, action = spreadsheet_id.split(":", 1)
+            if action == "batchUpdate":
+                return self._sheets_batch_update(spreadsheet_id, payload)
+        spreadsheet = self.spreadsheets[spreadsheet_id]
+        render = params.get("valueRenderOption", "FORMATTED_VALUE")
+        if not rest:
+            return _json_response(200, self._metadata(
+                spreadsheet_id, params.get("_multi", {}).get("ranges")))
+        if rest == "values:batchGet":
+            ranges = params["_multi"].get("ranges", [])
+            return _json_response(200, {
+                "spreadsheetId": spreadsheet_id,
+                "valueRanges": [self._read(spreadsheet, a1_range, render) for a1_range in ranges],
+            })
+        if rest == "values:batchUpdate":
+            option = payload.get("valueInputOption", "RAW")
+            responses = [self._write(spreadsheet, data["range"], data["values"], option)
+                         for data in payload.get("data", [])]
+            self._touch(spreadsheet_id)
+            return _json_response(200, {"spreadsheetId": spreadsheet_id, "responses": responses})
+        if rest.startswith("values/"):
+            a1_range = rest[len("values/"):]
+            if a1_range.endswith(":append"):
+                a1_range = a1_range[:-len(":append")]
+                title = parse_a1(a1_range)[0]
+                sheet = self._sheet(spreadsheet, title)
+                start = len(sheet["values"])
+                prefix = "'{}'!".format(sheet["title"].replace("'", "''"))
+                updates = self._write(spreadsheet, f"{prefix}A{start + 1}", payload.get("values", []),
+                                      params.get("valueInputOption", "RAW"))
+                self._touch(spreadsheet_id)
+                return _json_response(200, {"spreadsheetId": spreadsheet_id, "updates": updates})
+            if a1_range.endswith(":clear"):
+                return _json_response(200, {"spreadsheetId": spreadsheet_id})
+            if method == "GET":
+                return _json_response(200, self._read(spreadsheet, a1_range, render))
+            if method == "PUT":
+                response = self._write(spreadsheet, a1_range, payload.get("values", []),
+                                       params.get("valueInputOption", "RAW"))
+                self._touch(spreadsheet_id)
+                return _json_response(200, response)
+        return _error(404, f"Unknown Sheets endpoint {method} {path}")
+
+    def _sheets_batch_update(self, spreadsheet_id, payload):
+        spreadsheet = self.spreadsheets[spreadsheet_id]
+        replies = []
+        for request in payload.get("requests", []):
+            reply = {}
+            if "addSheet" in request:
+                properties = request["addSheet"].get("properties", {})
+                sheet_id = properties.get("sheetId", max(
+                    [sheet["sheetId"] for sheet in spreadsheet["sheets"]] + [0]) + 1)
+                grid = properties.get("gridProperties", {})
+                spreadsheet["sheets"].append({
+                    "sheetId": sheet_id,
+                    "title": properties.get("title", f"Sheet{sheet_id}"),
+                    "rowCount": grid.get("rowCount", 1000),
+                    "columnCount": grid.get("columnCount", 26),
+                    "values": [],
+                })
+                reply = {"addSheet": {"properties": {
+                    "sheetId": sheet_id, "title": spreadsheet["sheets"][-1]["title"],
+                    "index": len(spreadsheet["sheets"]) - 1,
+                    "gridProperties": {"rowCount": spreadsheet["sheets"][-1]["rowCount"],
+                                       "columnCount": spreadsheet["sheets"][-1]["columnCount"]}}}}
+            elif "deleteSheet" in request:
+                sheet_id = request["deleteSheet"]["sheetId"]
+                spreadsheet["sheets"] = [sheet for sheet in spreadsheet["sheets"]
+                                         if sheet["sheetId"] != sheet_id]
+            elif "insertDimension" in request:
+                dimension = request["insertDimension"]["range"]
+                if dimension.get("dimension") == "ROWS":
+                    for sheet in spreadsheet["sheets"]:
+                        if sheet["sheetId"] == dimension.get("sheetId", sheet["sheetId"]):
+                            count = dimension["endIndex"] - dimension["startIndex"]
+                            sheet["values"][dimension["startIndex"]:dimension["startIndex"]] = \
+                                [[] for _ in range(count)]
+                            sheet["rowCount"] += count
+                            break
+            replies.append(reply)
+        self._touch(spreadsheet_id)
+        return _json_response(200, {"spreadsheetId": spreadsheet_id, "replies": replies})
+
+    # -------------------------------- Docs -------------------------------- #
+
+    def _docs(self, method, path, payload):
+        path = urllib.parse.unquote(path).lstrip("/")
+        if not path and method == "POST":
+            document = self.add_file(payload.get("title", "Untitled"), DOCUMENT_MIME_TYPE)
+            return _json_response(200, {"documentId": document["id"], "title": document["name"]})
+        if path.endswith(":batchUpdate"):
+            document = self.documents[path[:-len(":batchUpdate")]]
+            requests_list = payload.get("requests", [])
+            document["requests"].extend(requests_list)
+            self._touch(document["documentId"])
+            return _json_response(200, {"documentId": document["documentId"],
+                                        "replies": [{} for _ in requests_list]})
+        if method == "GET":
+            document = self.documents[path]
+            return _json_response(200, {"documentId": path, "title": document["title"]})
+        return _error(404, f"Unknown Docs endpoint {method} {path}")
+
+    # -------------------------------- Batch ------------------------------- #
+
+    def _batch(self, body, headers):
+        content_type = headers.get("content-type", "")
+        boundary = re.search(r'boundary="?([^";]+)"?', content_type).group(1)
+        chunks = []
+        for chunk in body.split("--" + boundary)[1:]:
+            if chunk.startswith("--"):
+                break
+            chunks.append(chunk)
+        # Как и настоящий Drive, запросы одного batch выполняются в
+        # произвольном порядке
+        self.random.shuffle(chunks)
+        parts = []
+        for chunk in chunks:
+            outer_headers, _, inner = chunk.strip("\r\n").partition("\n\n")
+            content_id = re.search(r"Content-ID: <([^>]*)>", outer_headers).group(1)
+            request_line, _, rest = inner.partition("\n")
+            inner_headers, _, inner_body = rest.partition("\n\n")
+            method, target, _ = request_line.split(" ", 2)
+            header_map = {}
+            for line in inner_headers.splitlines():
+                key, _, value = line.partition(":")
+                header_map[key.strip().lower()] = value.strip()
+            url = "https://" + header_map.get("host", "www.googleapis.com") + target
+            self._lock.release()
+            try:
+                status, _, content = self.handle(method, url, inner_body or None, header_map)
+            finally:
+                self._lock.acquire()
+            parts.append(
+                f"--batch_fake\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{content.decode('utf-8')}\r\n"
+            )
+        payload = "".join(parts) + "--batch_fake--"
+        return 200, {"content-type": "multipart/mixed; boundary=batch_fake"}, payload.encode("utf-8")
+
+
+# ---------------------------- FakeYandexDisk ---------------------------- #
+
+class FakeYandexDisk:
+    """Поддельный REST API Яндекс Диска (ресурсы, папки и загрузка файлов).
+
+    Используется через serve(): загрузка идёт настоящим HTTP-запросом, как
+    в drive2drive.py. error_rate - доля загрузок, завершающихся 503.
+    """
+
+    API_PATH = "/v1/disk"
+
+    def __init__(self, error_rate=0.0, seed=None):
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.files = {}
+        self.folders = {"/"}
+        self.requests = 0
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _path(path):
+        path = path[len("disk:"):] if path.startswith("disk:") else path
+        return "/" + path.strip("/")
+
+    @staticmethod
+    def _error(status, error):
+        return _json_response(status, {"error": error, "message": error})
+
+    def handle(self, method, url, body=None, headers=None):
+        with self._lock:
+            self.requests += 1
+            parsed = urllib.parse.urlsplit(url)
+            params = dict(urllib.parse.parse_qsl(parsed.query))
+            path = self._path(params.get("path", ""))
+            parent = path.rsplit("/", 1)[0] or "/"
+            if parsed.path.startswith("/upload/") and method == "PUT":
+                if self.error_rate and self.random.random() < self.error_rate:
+                    return self._error(503, "ServiceUnavailable")
+                target = self._uploads.pop(parsed.path, None)
+                if target is None:
+                    return self._error(404, "UploadNotFound")
+                self.files[target] = body or b""
+                return 201, {}, b""
+            endpoint = parsed.path[len(self.API_PATH):]
+            if endpoint == "/resources" and method == "GET":
+                if path in self.folders:
+                    return _json_response(200, {"path": "disk:" + path, "type": "dir"})
+                if path not in self.files:
+                    return self._error(404, "DiskNotFoundError")
+                content = self.files[path]
+                return _json_response(200, {"path": "disk:" + path, "type": "file",
+                                            "size": len(content),
+                                            "md5": hashlib.md5(content).hexdigest()})
+            if endpoint == "/resources" and method == "PUT":
+                if path in self.folders or path in self.files:
+                    return self._error(409, "DiskPathPointsToExistentDirectoryError")
+                if parent not in self.folders:
+                    return self._error(409, "DiskPathDoesntExistsError")
+                self.folders.add(path)
+                return _json_response(201, {"href": url, "method": "GET"})
+            if endpoint == "/resources/upload" and method == "GET":
+                if parent not in self.folders:
+                    return self._error(409, "DiskPathDoesntExistsError")
+                if path in self.files and params.get("overwrite") != "true":
+                    return self._error(409, "DiskResourceAlreadyExistsError")
+                upload = f"/upload/{len(self._uploads)}-{self.requests}"
+                self._uploads[upload] = path
+                href = f"{parsed.scheme}://{parsed.netloc}{upload}"
+                return _json_response(200, {"href": href, "method": "PUT", "templated": False})
+            return self._error(404, f"Unknown endpoint {method} {parsed.path}")
+
+
+# ------------------------------- Кассеты ------------------------------- #
+
+_BATCH_ID_RE = re.compile(r"Content-ID: <([0-9a-f-]+) \+")
+_RESPONSE_ID_RE = re.compile(r"Content-ID: <response-([0-9a-f-]+) \+")
+
+
+def _normalize_url(url):
+    """URL без ключей доступа - для сопоставления записанных запросов."""
+    parsed = urllib.parse.urlsplit(url)
+    query = [(key, value) for key, value in urllib.parse.parse_qsl(parsed.query, keep_blank_values=True)
+             if key not in ("access_token", "key")]
+    return urllib.parse.urlunsplit(
+        (parsed.scheme, parsed.netloc, parsed.path, urllib.parse.urlencode(sorted(query)), ""))
+
+
+class Cassette:
+    """Записанные ответы Google API.
+
+    Запросы сопоставляются по методу и URL в порядке записи, тело запроса
+    не сравнивается (в batch-запросах оно содержит случайные разделители).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.interactions = []
+        self._queues = None
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self.interactions = json.load(file)
+
+    def record(self, method, url, status, headers, content):
+        if urllib.parse.urlsplit(url).netloc in TOKEN_HOSTS:
+            return
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", errors="replace")
+        with self._lock:
+            self.interactions.append({
+                "method": method,
+                "url": _normalize_url(url),
+                "status": status,
+                "headers": {key: value for key, value in headers.items()
+                            if key.lower() in ("content-type", "content-range", "location")},
+                "content": content,
+            })
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump(self.interactions, file, ensure_ascii=False, indent=1)
+
+    def handle(self, method, url, body=None, headers=None):
+        """Отдаёт следующий записанный ответ на такой же запрос."""
+        with self._lock:
+            if self._queues is None:
+                self._queues = defaultdict(deque)
+                for interaction in self.interactions:
+                    self._queues[(interaction["method"], interaction["url"])].append(interaction)
+            queue = self._queues.get((method, _normalize_url(url)))
+            if not queue:
+                return _error(599, f"Запрос отсутствует в кассете: {method} {url}")
+            interaction = queue.popleft()
+        content = interaction["content"]
+        if "/batch/" in url and body:
+            # Идентификаторы частей batch-запроса генерируются заново
+            if isinstance(body, bytes):
+                body = body.decode("utf-8")
+            new_id = _BATCH_ID_RE.search(body)
+            old_id = _RESPONSE_ID_RE.search(content)
+            if new_id and old_id:
+                content = content.replace(old_id.group(1), new_id.group(1))
+        return interaction["status"], interaction["headers"], content.encode("utf-8")
+
+
+# ------------------------------ Транспорты ------------------------------ #
+
+class HandlerHttp:
+    """httplib2-совместимый транспорт, передающий запросы обработчику."""
+
+    timeout = None
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.connections = {}
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        status, response_headers, content = self.handler.handle(method, uri, body, headers)
+        info = {key.lower(): value for key, value in response_headers.items()}
+        info["status"] = str(status)
+        return httplib2.Response(info), content
+
+    def close(self):
+        pass
+
+
+class RecordingHttp:
+    """httplib2-транспорт, записывающий ответы в кассету."""
+
+    def __init__(self, http, cassette):
+        self.http = http
+        self.cassette = cassette
+
+    def request(self, uri, method="GET", *args, **kwargs):
+        response, content = self.http.request(uri, method, *args, **kwargs)
+        self.cassette.record(method, uri, response.status, dict(response), content)
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+def _requests_response(request, status, headers, content):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    response.raw = io.BytesIO(content)
+    response._content = content
+    response.url = request.url
+    response.request = request
+    response.encoding = "utf-8"
+    return response
+
+
+class HandlerAdapter(BaseAdapter):
+    """Адаптер requests (для gspread), передающий запросы обработчику."""
+
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+
+    def send(self, request, **kwargs):
+        headers = {key.lower(): value for key, value in request.headers.items()}
+        status, response_headers, content = self.handler.handle(
+            request.method, request.url, request.body, headers)
+        return _requests_response(request, status, response_headers, content)
+
+    def close(self):
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Адаптер requests, записывающий ответы в кассету."""
+
+    def __init__(self, cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        self.cassette.record(request.method, request.url, response.status_code,
+                             dict(response.headers), response.content)
+        return response
+
+
+class _ServerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    handler = None
+
+    def _read_chunked(self):
+        body = bytearray()
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if not size:
+                # Завершающие заголовки до пустой строки
+                while self.rfile.readline().strip():
+                    pass
+                return bytes(body)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+
+    def _handle(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = self._read_chunked()
+        else:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else None
+        headers = {key.lower(): value for key, value in self.headers.items()}
+        url = "http://" + self.headers.get("Host", "localhost") + self.path
+        status, response_headers, content = self.handler.handle(self.command, url, body, headers)
+        self.send_response(status)
+        for key, value in response_headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(handler, host="127.0.0.1", port=0):
+    """Запускает обработчик как HTTP-сервер в фоновом потоке.
+
+    Возвращает (сервер, словарь адресов API для AsyncGoogleClient).
+    """
+    server_handler = type("Handler", (_ServerHandler,), {"handler": handler})
+    server = ThreadingHTTPServer((host, port), server_handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://{host}:{server.server_port}"
+    endpoints = {"drive": f"{base}/drive/v3/", "sheets": f"{base}/", "docs": f"{base}/"}
+    return server, endpoints
+
+
+# ------------------------- Выбор режима по окружению ------------------------- #
+
+class Backend:
+    """Подмена транспорта Google API для режимов fake, record и replay."""
+
+    def __init__(self, mode, handler=None, cassette=None):
+        self.mode = mode
+        self.handler = handler
+        self.cassette = cassette
+
+    @property
+    def offline(self):
+        """Работает ли режим без настоящих учётных данных и сети."""
+        return self.mode in ("fake", "replay")
+
+    def wrap_http(self, http):
+        if self.mode == "record":
+            return RecordingHttp(http, self.cassette)
+        return HandlerHttp(self.handler)
+
+    def mount(self, session):
+        adapter = RecordingAdapter(self.cassette) if self.mode == "record" \
+            else HandlerAdapter(self.handler)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+
+def backend_from_env():
+    """Создаёт Backend по переменным окружения или None для обычной работы."""
+    mode = os.environ.get(MODE_ENV, "live")
+    if mode == "live":
+        return None
+    if mode == "fake":
+        state = None
+        if os.environ.get(STATE_ENV):
+            with open(os.environ[STATE_ENV], encoding="utf-8") as file:
+                state = json.load(file)
+        fake = FakeGoogle(
+            state,
+            latency=float(os.environ.get(LATENCY_ENV, 0)),
+            error_rate=float(os.environ.get(ERROR_RATE_ENV, 0)),
+        )
+        return Backend(mode, handler=fake)
+    if mode in ("record", "replay"):
+        cassette = Cassette(os.environ.get(CASSETTE_ENV, "cassette.json"))
+        if mode == "record":
+            cassette.interactions = []
+            atexit.register(cassette.save)
+        return Backend(mode, handler=cassette, cassette=cassette)
+    raise ValueError(f"Неизвестный режим {MODE_ENV}={mode}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поддельный Google API на локальном порту.")
+    parser.add_argument('command', choices=['serve', 'serve-yandex'])
+    parser.add_argument('--state', type=str, help='JSON-файл с начальным состоянием')
+    parser.add_argument('--cassette', type=str, help='Отдавать ответы из кассеты вместо FakeGoogle')
+    parser.add_argument('--port', type=int, default=8000, help='Порт (по умолчанию: 8000)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа, с')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля ответов 429 (503 для serve-yandex)')
+    args = parser.parse_args()
+
+    if args.command == "serve-yandex":
+        server, _ = serve(FakeYandexDisk(error_rate=args.error_rate), port=args.port)
+        print(f"Поддельный Яндекс Диск: DSIN_YANDEX_API=http://127.0.0.1:{server.server_port}"
+              f"{FakeYandexDisk.API_PATH}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+    if args.cassette:
+        handler = Cassette(args.cassette)
+    else:
+        state = None
+        if args.state:
+            with open(args.state, encoding="utf-8") as file:
+                state = json.load(file)
+        handler = FakeGoogle(state, latency=args.latency, error_rate=args.error_rate)
+    server, endpoints = serve(handler, port=args.port)
+    print(f"Поддельный Google API: {endpoints}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
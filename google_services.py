@@ -0,0 +1,149 @@
+"""Общий реестр клиентов Google API.
+
+Учётные данные из credentials.json загружаются один раз за процесс,
+а каждый клиент (Drive v3, Docs v1, Sheets v4, gspread, pygsheets)
+создаётся при первом обращении и дальше переиспользуется всеми скриптами.
+Клиенты googleapiclient и pygsheets работают через одно общее
+keep-alive соединение на каждый хост (см. transport.py).
+
+Переменная окружения DSIN_GOOGLE_MODE переключает все клиенты на
+поддельный API или запись/воспроизведение кассет (см. fake_google.py).
+"""
+import threading
+
+import gspread
+import pygsheets
+from google.auth.credentials import AnonymousCredentials
+from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
+
+from discovery_cache import build_service
+from fake_google import backend_from_env
+from quota import QuotaHTTPClient, QuotaHttpRequest
+from transport import PooledHttp, register_session
+
+SERVICE_ACCOUNT_FILE = "credentials.json"
+SCOPES = [
+    "https://www.googleapis.com/auth/drive",
+    "https://www.googleapis.com/auth/documents",
+    "https://www.googleapis.com/auth/spreadsheets",
+]
+
+# Уже созданные клиенты: (вид клиента, файл ключа) -> экземпляр
+_clients = {}
+_lock = threading.RLock()
+# Подмена транспорта в режимах fake/record/replay, None - обычная работа
+backend = backend_from_env()
+
+
+def _get_or_create(kind, service_account_file, factory):
+    """Возвращает клиент из реестра, создавая его при первом обращении."""
+    key = (kind, service_account_file or SERVICE_ACCOUNT_FILE)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory(key[1])
+                _clients[key] = client
+    return client
+
+
+def get_credentials(service_account_file=None):
+    """Учётные данные сервисного аккаунта со всеми нужными областями доступа."""
+    if backend is not None and backend.offline:
+        return AnonymousCredentials()
+    return _get_or_create(
+        "credentials",
+        service_account_file,
+        lambda path: service_account.Credentials.from_service_account_file(
+            path, scopes=SCOPES),
+    )
+
+
+def get_http():
+    """Общий для клиентов основного потока транспорт с keep-alive соединениями."""
+    return _get_or_create("http", None, lambda path: _new_http())
+
+
+def _new_http():
+    http = PooledHttp()
+    return backend.wrap_http(http) if backend is not None else http
+
+
+def _authorized_http(path):
+    return AuthorizedHttp(get_credentials(path), http=get_http())
+
+
+def _build_service(name, version):
+    def factory(path):
+        # Discovery-документ берётся с диска, без запроса в сеть, а все
+        # запросы клиента выполняются с повторами и учётом квот
+        return build_service(
+            name, version, http=_authorized_http(path),
+            requestBuilder=QuotaHttpRequest)
+    return factory
+
+
+def new_service(name, version, service_account_file=None, credentials=None,
+                http_wrapper=None, api_endpoint=None):
+    """Создаёт отдельный клиент API со своим соединением, минуя реестр.
+
+    Нужен там, где клиенты работают из нескольких потоков: httplib2 не
+    потокобезопасен, поэтому каждому потоку нужен свой экземпляр.
+    http_wrapper позволяет обернуть транспорт (например, ограничителем
+    частоты), api_endpoint - направить запросы на другой адрес.
+    """
+    credentials = credentials or get_credentials(service_account_file)
+    http = AuthorizedHttp(credentials, http=_new_http())
+    if http_wrapper is not None:
+        http = http_wrapper(http)
+    client_options = {"api_endpoint": api_endpoint} if api_endpoint else None
+    return build_service(
+        name, version, http=http, requestBuilder=QuotaHttpRequest,
+        client_options=client_options)
+
+
+def get_drive_service(service_account_file=None):
+    """Клиент Google Drive API v3."""
+    return _get_or_create(
+        "drive", service_account_file, _build_service("drive", "v3"))
+
+
+def get_docs_service(service_account_file=None):
+    """Клиент Google Docs API v1."""
+    return _get_or_create(
+        "docs", service_account_file, _build_service("docs", "v1"))
+
+
+def get_sheets_service(service_account_file=None):
+    """Клиент Google Sheets API v4."""
+    return _get_or_create(
+        "sheets", service_account_file, _build_service("sheets", "v4"))
+
+
+def get_gspread_client(service_account_file=None):
+    """Клиент gspread."""
+    return _get_or_create(
+        "gspread",
+        service_account_file,
+        lambda path: _register_gspread(gspread.authorize(
+            get_credentials(path), http_client=QuotaHTTPClient)),
+    )
+
+
+def _register_gspread(client):
+    if backend is not None:
+        backend.mount(client.http_client.session)
+    register_session(client.http_client.session)
+    return client
+
+
+def get_pygsheets_client(service_account_file=None):
+    """Клиент pygsheets."""
+    return _get_or_create(
+        "pygsheets",
+        service_account_file,
+        lambda path: pygsheets.authorize(
+            custom_credentials=get_credentials(path), http=get_http()),
+    )
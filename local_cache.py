@@ -0,0 +1,64 @@
+"""Файлы локального состояния скриптов в .dsin_cache.
+
+Кэши и закладки (папки Drive, скопированные документы, манифесты
+копирования, закладки ленты изменений, снимки таблиц, отметки строк)
+читаются load_json и пишутся atomic_write_json: содержимое сначала
+записывается во временный файл рядом, а затем подменяет старый через
+os.replace, поэтому сбой посреди записи не оставляет битый файл.
+JsonStore - словарь в таком файле, который сохраняется при каждом изменении.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+
+def load_json(path, default=None):
+    """Содержимое JSON-файла path; default, если файла нет или он повреждён."""
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except ValueError:
+        return default
+
+
+@contextmanager
+def atomic_path(path):
+    """Временный путь для записи; по выходе из блока файл подменяет path."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    yield tmp_path
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(path, data, indent=2):
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=indent)
+
+
+class JsonStore:
+    """Словарь в JSON-файле path, каждое изменение сразу сохраняется.
+
+    Повреждённый файл считается пустым: кэш просто собирается заново.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = load_json(path, {})
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._save()
+
+    def _save(self):
+        atomic_write_json(self.path, self._data)
@@ -0,0 +1,93 @@
+"""Статистика запросов к Google API по методам.
+
+Каждый вызов, прошедший через quota.call_with_retry, записывается сюда:
+метод API (drive.files.copy, sheets.spreadsheets.values.update,
+docs.documents.batchUpdate, ...), полное время с учётом повторов,
+время ожидания квоты и задержек между повторами, размер запроса и ответа
+и число повторов. Запросы внутри batch Drive (drive_batch.execute_batch)
+записываются по отдельности под своими методами, а сам batch - как
+drive.batch. По завершении запуска сводка с перцентилями сохраняется
+в JSON-файл в METRICS_DIR, а самые затратные методы печатаются.
+"""
+import atexit
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+METRICS_DIR = ".dsin_cache/metrics"
+PERCENTILES = (50, 90, 95, 99)
+# Сколько самых затратных методов печатать в конце запуска
+TOP_METHODS = 5
+
+_calls = defaultdict(list)
+_lock = threading.Lock()
+_started = time.monotonic()
+
+
+def record(method, latency, waited=0.0, sent=0, received=0, retries=0, failed=False):
+    """Записывает один вызов метода API."""
+    with _lock:
+        _calls[method].append((latency, waited, sent, received, retries, failed))
+
+
+def percentile(values, p):
+    """Перцентиль p (0-100) отсортированного списка методом ближайшего ранга."""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values), math.ceil(p / 100 * len(values))) - 1)
+    return values[rank]
+
+
+def summary():
+    """Сводка по методам: число вызовов, задержки, объём данных и повторы."""
+    with _lock:
+        calls = {method: list(records) for method, records in _calls.items()}
+    methods = {}
+    for method, records in calls.items():
+        latencies = sorted(record[0] for record in records)
+        stats = {
+            "calls": len(records),
+            "total_s": round(sum(latencies), 4),
+            "waited_s": round(sum(record[1] for record in records), 4),
+            "sent_bytes": sum(record[2] for record in records),
+            "received_bytes": sum(record[3] for record in records),
+            "retries": sum(record[4] for record in records),
+            "errors": sum(1 for record in records if record[5]),
+            "max_s": round(latencies[-1], 4),
+        }
+        for p in PERCENTILES:
+            stats[f"p{p}_s"] = round(percentile(latencies, p), 4)
+        methods[method] = stats
+    return {
+        "script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python",
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "elapsed_s": round(time.monotonic() - _started, 3),
+        "calls": sum(stats["calls"] for stats in methods.values()),
+        "methods": dict(sorted(methods.items(), key=lambda item: -item[1]["total_s"])),
+    }
+
+
+def write_report(metrics_dir=METRICS_DIR):
+    """Сохраняет сводку запуска в JSON и печатает самые затратные методы."""
+    report = summary()
+    if not report["calls"]:
+        return None
+    os.makedirs(metrics_dir, exist_ok=True)
+    name = "{}-{}.json".format(
+        os.path.splitext(report["script"])[0], datetime.now().strftime("%Y%m%d-%H%M%S"))
+    path = os.path.join(metrics_dir, name)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Запросов к Google API: {report['calls']}, статистика сохранена в {path}")
+    for method, stats in list(report["methods"].items())[:TOP_METHODS]:
+        print(f"  {method}: {stats['calls']} выз., всего {stats['total_s']:.1f} с, "
+              f"p50 {stats['p50_s']:.2f} с, p95 {stats['p95_s']:.2f} с, повторов {stats['retries']}")
+    return path
+
+
+atexit.register(write_report)
@@ -0,0 +1,157 @@
+"""Профилирование скриптов по этапам: ``python enabling.py --profile``.
+
+Все скрипты вызывают profile_from_argv() при запуске и отмечают этапы
+работы через set_stage() (в скриптах без функций) или ``with stage(...)``:
+
+* folders - поиск и создание папок на Google Диске;
+* sheet_load - загрузка таблиц;
+* join - сопоставление и обработка данных;
+* docs - сборка документов;
+* upload - копирование файлов и запись результатов в Google.
+
+В конце запуска в PROFILE_DIR сохраняются:
+
+* ``<скрипт>-<время>.prof`` - статистика cProfile основного потока
+  (``python -m pstats`` или snakeviz);
+* ``<скрипт>-<время>.collapsed`` - стеки всех потоков, снятые с частотой
+  SAMPLE_INTERVAL и сгруппированные по этапам, в формате collapsed stacks
+  для flamegraph.pl и speedscope.
+
+На экран выводится время каждого этапа и самые затратные функции.
+"""
+import atexit
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_FLAG = "--profile"
+PROFILE_DIR = ".dsin_cache/profile"
+# Интервал снятия стеков потоков, с
+SAMPLE_INTERVAL = 0.005
+# Сколько функций выводить в конце запуска
+TOP_FUNCTIONS = 15
+
+_stage = "startup"
+_stage_started = time.monotonic()
+_stage_times = Counter()
+_stage_lock = threading.Lock()
+_profiler = None
+
+
+def _switch_stage(name):
+    global _stage, _stage_started
+    with _stage_lock:
+        now = time.monotonic()
+        _stage_times[_stage] += now - _stage_started
+        previous, _stage, _stage_started = _stage, name, now
+    return previous
+
+
+def set_stage(name):
+    """Отмечает начало этапа работы скрипта."""
+    _switch_stage(name)
+
+
+@contextmanager
+def stage(name):
+    """Этап работы внутри блока with, после блока возвращается предыдущий."""
+    previous = _switch_stage(name)
+    try:
+        yield
+    finally:
+        _switch_stage(previous)
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler(threading.Thread):
+    """Фоновый поток, собирающий стеки всех потоков по этапам."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stack.append(_stage)
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Profiler:
+    """cProfile основного потока и сэмплирование стеков всех потоков."""
+
+    def __init__(self, profile_dir=PROFILE_DIR):
+        self.profile_dir = profile_dir
+        self.profile = cProfile.Profile()
+        self.sampler = Sampler()
+
+    def start(self):
+        self.sampler.start()
+        self.profile.enable()
+
+    def stop(self):
+        """Останавливает профилирование и сохраняет результаты."""
+        self.profile.disable()
+        self.sampler.stop()
+        _switch_stage(_stage)
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+        base = os.path.join(
+            self.profile_dir, f"{script}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+        self.profile.dump_stats(base + ".prof")
+        with open(base + ".collapsed", "w", encoding="utf-8") as file:
+            for line, count in sorted(self.sampler.stacks.items()):
+                file.write(f"{line} {count}\n")
+
+        print("Время по этапам:")
+        for name, seconds in sorted(_stage_times.items(), key=lambda item: -item[1]):
+            print(f"  {name}: {seconds:.2f} с")
+        pstats.Stats(self.profile).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        print(f"Профиль сохранён: {base}.prof, {base}.collapsed")
+
+
+def start_profiling(profile_dir=PROFILE_DIR):
+    """Включает профилирование до конца запуска."""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(profile_dir)
+        _profiler.start()
+        atexit.register(_profiler.stop)
+    return _profiler
+
+
+def profile_from_argv(argv=None):
+    """Включает профилирование, если скрипт запущен с флагом --profile.
+
+    Флаг убирается из аргументов, чтобы не мешать их дальнейшему разбору.
+    """
+    argv = sys.argv if argv is None else argv
+    if PROFILE_FLAG in argv:
+        argv.remove(PROFILE_FLAG)
+        return start_profiling()
+    return None
@@ -0,0 +1,284 @@
+"""Повторы и учёт квот для всех запросов к Google API.
+
+Каждый запрос googleapiclient (через QuotaHttpRequest) и gspread (через
+QuotaHTTPClient) проходит через call_with_retry:
+
+* перед запросом QuotaTracker проверяет, сколько запросов к этому API уже
+  сделано за последнюю минуту, и, когда квота подходит к концу, растягивает
+  оставшиеся запросы до конца окна, а не ждёт ошибки 429;
+* ответы 429, 408, 5xx, 403 rateLimitExceeded и обрывы соединения
+  повторяются с экспоненциальной задержкой со случайным разбросом;
+  запросы, создающие файлы без заранее выделенного ID, после 5xx и обрывов
+  не повторяются: первый запрос мог выполниться, и повтор создал бы копию;
+* время, объём данных и число повторов каждого вызова записываются
+  в статистику по методам API (см. metrics.py).
+"""
+import json
+import random
+import threading
+import time
+import urllib.parse
+from collections import deque
+
+import requests
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+
+import metrics
+
+# Квоты на одного пользователя в минуту: (API, чтение/запись) -> запросов
+QUOTAS_PER_MINUTE = {
+    ("sheets", "read"): 60,
+    ("sheets", "write"): 60,
+    ("docs", "read"): 300,
+    ("docs", "write"): 60,
+    ("drive", "read"): 12000,
+    ("drive", "write"): 12000,
+}
+# Когда остаётся меньше этой доли квоты, запросы начинают притормаживать
+SLOWDOWN_SHARE = 0.2
+
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 64.0
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+# Методы, каждый вызов которых создаёт новый объект
+CREATE_METHODS = {
+    "drive.files.create",
+    "drive.files.copy",
+    "docs.documents.create",
+    "sheets.spreadsheets.create",
+}
+TRANSIENT_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+
+class QuotaTracker:
+    """Считает запросы к каждому API в скользящем окне в одну минуту."""
+
+    def __init__(self, quotas=QUOTAS_PER_MINUTE, window=60.0):
+        self.quotas = quotas
+        self.window = window
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        calls = self._calls.setdefault(key, deque())
+        while calls and calls[0] <= now - self.window:
+            calls.popleft()
+        return calls
+
+    def remaining(self, key):
+        """Сколько запросов к API ещё осталось в текущем окне."""
+        limit = self.quotas.get(key)
+        if limit is None:
+            return None
+        with self._lock:
+            return limit - len(self._recent(key, time.monotonic()))
+
+    def acquire(self, key):
+        """Ждёт, пока запрос к API можно отправить, не выходя за квоту."""
+        limit = self.quotas.get(key)
+        if limit is None:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                calls = self._recent(key, now)
+                remaining = limit - len(calls)
+                if remaining <= 0:
+                    wait = calls[0] + self.window - now
+                elif remaining <= limit * SLOWDOWN_SHARE:
+                    # Распределяем остаток квоты равномерно до конца окна
+                    pace = (calls[0] + self.window - now) / remaining
+                    wait = calls[-1] + pace - now
+                else:
+                    wait = 0
+                if wait <= 0:
+                    calls.append(now)
+                    return
+            time.sleep(wait)
+
+
+tracker = QuotaTracker()
+
+
+def _error_reason(content):
+    try:
+        error = json.loads(content)["error"]
+        return error["errors"][0]["reason"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+def is_idempotent(method, body=None):
+    """Можно ли выполнить запрос method с телом body повторно без последствий.
+
+    files.create и files.copy с ID из files.generateIds повторять можно:
+    если первый запрос выполнился, Drive ответит 409.
+    """
+    if method not in CREATE_METHODS:
+        return True
+    if not method.startswith("drive.files.") or not body:
+        return False
+    if isinstance(body, (str, bytes)):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            return False
+    return isinstance(body, dict) and "id" in body
+
+
+def is_retryable(exception, idempotent=True):
+    """Можно ли повторить запрос, завершившийся этой ошибкой.
+
+    Неидемпотентный запрос повторяется, только если Google его не выполнил:
+    после 429 и 403 rateLimitExceeded.
+    """
+    if isinstance(exception, HttpError):
+        status = exception.resp.status
+        content = exception.content
+    elif isinstance(exception, APIError):
+        status = exception.code
+        content = exception.response.text
+    else:
+        return idempotent and isinstance(exception, TRANSIENT_ERRORS)
+    if status in RETRY_STATUSES:
+        return idempotent or status == 429
+    return status == 403 and _error_reason(content) in RATE_LIMIT_REASONS
+
+
+def backoff_delay(attempt):
+    """Задержка перед повтором: экспонента со случайным разбросом."""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def call_with_retry(fn, key, retries=MAX_RETRIES, method=None, traffic=None, idempotent=True):
+    """Вызывает fn с учётом квоты key = (API, чтение/запись) и повторами.
+
+    Вызов записывается в статистику под именем method (по умолчанию - API),
+    traffic() должна вернуть размер запроса и ответа в байтах. Без
+    idempotent повторяются только отклонённые запросы (см. is_retryable).
+    """
+    started = time.monotonic()
+    waited = 0.0
+    attempt = 0
+    failed = True
+    try:
+        for attempt in range(retries + 1):
+            wait_started = time.monotonic()
+            tracker.acquire(key)
+            waited += time.monotonic() - wait_started
+            try:
+                result = fn()
+                failed = False
+                return result
+            except Exception as e:
+                if attempt == retries or not is_retryable(e, idempotent):
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"Google API {key[0]}: {e}. Повтор через {delay:.1f} с")
+                time.sleep(delay)
+                waited += delay
+    finally:
+        sent, received = traffic() if traffic is not None else (0, 0)
+        metrics.record(method or key[0], time.monotonic() - started, waited,
+                       sent, received, attempt, failed)
+
+
+def request_kind(method):
+    return "read" if method.upper() == "GET" else "write"
+
+
+class QuotaHttpRequest(HttpRequest):
+    """Запрос googleapiclient, выполняемый через call_with_retry."""
+
+    def __init__(self, http, postproc, *args, **kwargs):
+        def measured(resp, content):
+            self.received_bytes = len(content or b"")
+            return postproc(resp, content)
+        super().__init__(http, measured, *args, **kwargs)
+        self.received_bytes = 0
+
+    def execute(self, http=None, num_retries=0):
+        api = (self.methodId or "").split(".")[0]
+        return call_with_retry(
+            lambda: HttpRequest.execute(self, http=http),
+            (api, request_kind(self.method)),
+            method=self.methodId,
+            traffic=lambda: (_size(self.body), self.received_bytes),
+            idempotent=is_idempotent(self.methodId, self.body),
+        )
+
+
+def _size(data):
+    if isinstance(data, str):
+        return len(data.encode("utf-8"))
+    return len(data or b"")
+
+
+def gspread_method(method, endpoint):
+    """Имя метода API в стиле methodId googleapiclient для запроса gspread."""
+    path = urllib.parse.urlsplit(endpoint).path
+    method = method.upper()
+    if "/v4/spreadsheets" in path:
+        parts = path.split("/v4/spreadsheets", 1)[1].strip("/").split("/")
+        if len(parts) == 1:
+            action = parts[0].partition(":")[2]
+            return "sheets.spreadsheets." + (action or ("get" if method == "GET" else "create"))
+        if ":" in parts[1]:
+            return "sheets.spreadsheets.values." + parts[1].partition(":")[2]
+        if len(parts) > 2 and ":" in parts[-1]:
+            return "sheets.spreadsheets.values." + parts[-1].rpartition(":")[2]
+        return "sheets.spreadsheets.values." + ("get" if method == "GET" else "update")
+    if "/drive/v3/" in path:
+        parts = path.split("/drive/v3/", 1)[1].strip("/").split("/")
+        if len(parts) == 1:
+            return f"drive.{parts[0]}." + ("list" if method == "GET" else "create")
+        if len(parts) == 2:
+            if parts[1] == "generateIds":
+                return f"drive.{parts[0]}.generateIds"
+            return f"drive.{parts[0]}." + {"GET": "get", "DELETE": "delete"}.get(method, "update")
+        if parts[2] == "copy":
+            return f"drive.{parts[0]}.copy"
+        return f"drive.{parts[2]}." + ("list" if method == "GET" else "create")
+    return f"{method} {path}"
+
+
+def _response_traffic(response):
+    body = response.request.body if response.request is not None else None
+    return _size(body), _size(response.content)
+
+
+class QuotaHTTPClient(HTTPClient):
+    """HTTP-клиент gspread, выполняющий запросы через call_with_retry."""
+
+    def request(self, method, endpoint, *args, **kwargs):
+        api = "sheets" if "sheets.googleapis.com" in endpoint else "drive"
+        responses = []
+
+        def send():
+            try:
+                response = HTTPClient.request(self, method, endpoint, *args, **kwargs)
+            except APIError as e:
+                responses.append(e.response)
+                raise
+            responses.append(response)
+            return response
+
+        name = gspread_method(method, endpoint)
+        return call_with_retry(
+            send,
+            (api, request_kind(method)),
+            method=name,
+            traffic=lambda: _response_traffic(responses[-1]) if responses else (0, 0),
+            idempotent=is_idempotent(name, kwargs.get("json")),
+        )
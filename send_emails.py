@@ -4,6 +4,8 @@ import yagmail
 import argparse
 from typing import List, Dict, Tuple
 
+from profiling import stage, start_profiling
+
 # Функция для загрузки конфигурации из JSON файла
 
 
@@ -77,17 +79,25 @@ def main():
         type=str,
         default='invalid_rows.json',
         help='Путь к файлу для сохранения номеров строк с неверными адресами (по умолчанию: invalid_rows.json)')
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Профилирование по этапам, см. profiling.py')
     args = parser.parse_args()
+    if args.profile:
+        start_profiling()
 
     # Загрузка конфигурации
     config = load_config(args.config)
 
     # Загрузка данных из Google Sheets
     # Замените "Emails" на название вашего столбца
-    email_data = load_sheet_data("TestTable", "Email")
+    with stage("sheet_load"):
+        email_data = load_sheet_data("TestTable", "Email")
 
     # Отправка писем
-    send_emails(email_data, config, args.sent_emails, args.invalid_rows)
+    with stage("upload"):
+        send_emails(email_data, config, args.sent_emails, args.invalid_rows)
 
 
 if __name__ == "__main__":
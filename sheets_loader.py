@@ -0,0 +1,704 @@
+"""Загрузка данных Google Таблиц в pandas DataFrame.
+
+load_sheets получает список SheetSpec (таблица, лист, нужные столбцы) и
+читает все листы одной таблицы одним запросом values.batchGet, а не
+отдельным get_all_records() на каждый лист. Если листы заданы номерами,
+перед этим одним spreadsheets.get читаются их названия. load_sheets_async
+делает то же через AsyncGoogleClient, загружая разные таблицы параллельно.
+
+Если у SheetSpec заданы только столбцы, размер листа берётся из его
+gridProperties, а из первой строки - положение столбцов, и batchGet
+запрашивает лишь эти столбцы (соседние - одним диапазоном) до конца сетки.
+Первая строка приходит в том же spreadsheets.get, что и размеры листов.
+Так объём ответа пропорционален числу нужных столбцов, а число строк
+ничем не ограничено.
+
+iter_sheet_chunks читает большой лист (например, таблицу ответов на форму)
+окнами по CHUNK_ROWS строк, а read_filtered оставляет из каждого окна только
+нужные строки, так что память не растёт вместе с листом. SheetSpec.schema
+(и параметр schema у iter_sheet_chunks) приводит столбцы к типам из
+student_schema.py. read_new_rows с RowCursor читает только строки,
+добавленные после прошлого запуска.
+
+С SnapshotCache значения листов сохраняются в SNAPSHOT_DIR вместе с
+ревизией таблицы (version и modifiedTime файла Drive). При следующей
+загрузке ревизия проверяется одним files.get, и если таблица не менялась,
+листы берутся из локальной копии без batchGet.
+
+Если установлен pyarrow, значения листов хранятся в колоночном формате
+Arrow IPC (Feather v2): файл снимка отображается в память, и таблица
+читается без разбора JSON и построчного создания DataFrame. Без pyarrow
+снимки хранятся в JSON. ``python sheets_loader.py bench <ID таблицы>``
+сравнивает загрузку через pygsheets get_as_df и из снимков обоих форматов.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from gspread.utils import numericise, numericise_all
+
+from google_services import get_drive_service, get_pygsheets_client, get_sheets_service
+from local_cache import JsonStore, atomic_path, atomic_write_json, load_json
+from student_schema import apply_schema
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+SNAPSHOT_DIR = os.path.join(".dsin_cache", "sheets")
+REVISION_FIELDS = "version,modifiedTime"
+SHEET_FIELDS = "sheets.properties(title,index,gridProperties.rowCount)"
+# То же вместе с ячейками диапазонов ranges (первых строк листов)
+GRID_FIELDS = ("sheets(properties(title,index,gridProperties.rowCount),"
+               "data(startRow,rowData.values.formattedValue))")
+# Число строк в окне iter_sheet_chunks
+CHUNK_ROWS = 1000
+ROW_CURSOR_FILE = os.path.join(".dsin_cache", "sheet_rows.json")
+# Строки Arrow в pandas - тот же тип str, что и у values_to_dataframe, но
+# без копирования (по умолчанию to_pandas копирует строки в новые буферы)
+ARROW_TYPES = {pa.string(): pd.StringDtype("pyarrow", na_value=np.nan)} if pa is not None else {}
+
+# worksheet - номер листа (с 0) или его название, columns - нужные
+# столбцы (None - все), range - диапазон внутри листа (None - весь лист),
+# schema - типы столбцов (см. student_schema.py)
+SheetSpec = namedtuple(
+    "SheetSpec", "spreadsheet_id worksheet columns range schema", defaults=(None, None, None))
+
+
+def values_to_dataframe(values, typed=False):
+    """Превращает ответ values.get (список строк) в DataFrame.
+
+    Первая строка - заголовок. Sheets API не возвращает пустые ячейки в конце
+    строки, поэтому короткие строки дополняются пустыми строками. С typed
+    числа в ячейках превращаются в int и float, как в get_all_records().
+    """
+    if not values:
+        return pd.DataFrame()
+    header, rows = _rows(values)
+    if typed:
+        rows = [numericise_all(row) for row in rows]
+    return pd.DataFrame(rows, columns=header)
+
+
+def _rows(values):
+    header = values[0]
+    rows = [row + [""] * (len(header) - len(row)) for row in values[1:]]
+    return header, [row[:len(header)] for row in rows]
+
+
+def values_to_table(values):
+    """Ответ values.get в виде таблицы Arrow со строковыми столбцами."""
+    header, rows = _rows(values)
+    columns = list(zip(*rows)) if rows else [()] * len(header)
+    return pa.Table.from_arrays(
+        [pa.array(column, type=pa.string()) for column in columns],
+        names=[str(name) for name in header])
+
+
+def _numericise_column(column):
+    # Каждое различное значение столбца преобразуется один раз
+    encoded = column.combine_chunks().dictionary_encode()
+    values = np.array([numericise(value) for value in encoded.dictionary.to_pylist()],
+                      dtype=object)
+    return pd.Series(values[encoded.indices.to_numpy(zero_copy_only=False)]).infer_objects()
+
+
+def table_to_dataframe(table, typed=False):
+    """DataFrame из таблицы Arrow; с typed - числа как в get_all_records().
+
+    Без typed строковые столбцы остаются в буферах Arrow (для таблицы из
+    снимка - в отображённом в память файле) и не копируются.
+    """
+    if not typed:
+        return table.to_pandas(types_mapper=ARROW_TYPES.get)
+    frame = pd.DataFrame(
+        {index: _numericise_column(column) for index, column in enumerate(table.columns)})
+    frame.columns = table.column_names
+    return frame
+
+
+class SnapshotCache:
+    """Локальные копии значений таблиц, привязанные к ревизии файла Drive.
+
+    drive_service нужен только load_sheets; load_sheets_async читает
+    ревизию через AsyncGoogleClient. columnar - хранить значения в Arrow
+    (по умолчанию - если установлен pyarrow).
+    """
+
+    def __init__(self, drive_service=None, directory=SNAPSHOT_DIR, columnar=None):
+        self.drive_service = drive_service
+        self.directory = directory
+        self.columnar = pa is not None if columnar is None else columnar
+
+    @staticmethod
+    def revision(file):
+        """Ревизия таблицы по ответу files.get с полями REVISION_FIELDS."""
+        return f"{file.get('version')}/{file.get('modifiedTime')}"
+
+    def fetch_revision(self, spreadsheet_id):
+        return self.revision(self.drive_service.files().get(
+            fileId=spreadsheet_id, fields=REVISION_FIELDS).execute())
+
+    def _path(self, spreadsheet_id):
+        return os.path.join(self.directory, f"{spreadsheet_id}.json")
+
+    def _table_name(self, spreadsheet_id, sheet_range):
+        digest = hashlib.md5(sheet_range.encode("utf-8")).hexdigest()[:12]
+        return f"{spreadsheet_id}-{digest}.arrow"
+
+    def load(self, spreadsheet_id, revision):
+        """Снимок таблицы этой ревизии или пустой снимок, если её нет.
+
+        Значения диапазонов - списки строк (JSON) или таблицы Arrow,
+        отображённые в память.
+        """
+        snapshot = dict(_empty_snapshot(), revision=revision)
+        saved = load_json(self._path(spreadsheet_id))
+        if saved is None or saved.get("revision") != revision:
+            return snapshot
+        for sheet_range, values in saved["ranges"].items():
+            if isinstance(values, dict):
+                if pa is None:
+                    # Снимок записан с pyarrow, а сейчас его нет
+                    return snapshot
+                source = pa.memory_map(os.path.join(self.directory, values["arrow"]))
+                saved["ranges"][sheet_range] = pa.ipc.open_file(source).read_all()
+        return saved
+
+    def save(self, spreadsheet_id, snapshot):
+        ranges = {}
+        for sheet_range, values in snapshot["ranges"].items():
+            if isinstance(values, list) and not (self.columnar and values):
+                ranges[sheet_range] = values
+                continue
+            name = self._table_name(spreadsheet_id, sheet_range)
+            # Таблицы, прочитанные из снимка, уже лежат на диске
+            if isinstance(values, list):
+                with atomic_path(os.path.join(self.directory, name)) as tmp_path:
+                    with pa.OSFile(tmp_path, "wb") as sink:
+                        table = values_to_table(values)
+                        with pa.ipc.new_file(sink, table.schema) as writer:
+                            writer.write_table(table)
+            ranges[sheet_range] = {"arrow": name}
+        atomic_write_json(self._path(spreadsheet_id), dict(snapshot, ranges=ranges), indent=None)
+        self._remove_stale_tables(
+            spreadsheet_id, {values["arrow"] for values in ranges.values() if isinstance(values, dict)})
+
+    def _remove_stale_tables(self, spreadsheet_id, keep):
+        """Удаляет файлы Arrow таблицы, на которые снимок больше не ссылается.
+
+        В диапазоны входит размер сетки листа, поэтому после каждого
+        изменения листа имена файлов меняются, и старые копились бы.
+        """
+        pattern = re.compile(re.escape(spreadsheet_id) + r"-[0-9a-f]{12}\.arrow")
+        for name in os.listdir(self.directory):
+            if pattern.fullmatch(name) and name not in keep:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    # Например, в Windows файл ещё отображён в память
+                    pass
+
+
+def _empty_snapshot():
+    return {"revision": None, "titles": None, "rows": None, "ranges": {}}
+
+
+def _group(specs):
+    """ID таблицы -> номера её листов в specs, в порядке первого появления."""
+    groups = {}
+    for index, spec in enumerate(specs):
+        groups.setdefault(spec.spreadsheet_id, []).append(index)
+    return groups
+
+
+def _projected(spec):
+    # Столбцы читаются отдельными диапазонами, если диапазон не задан явно
+    return spec.columns is not None and spec.range is None
+
+
+def _known_title(spec, snapshot):
+    if not isinstance(spec.worksheet, int):
+        return True
+    titles = snapshot["titles"] or []
+    return spec.worksheet < len(titles) and titles[spec.worksheet] is not None
+
+
+def _needs_metadata(specs, snapshot):
+    for spec in specs:
+        if not _known_title(spec, snapshot):
+            return True
+        if _projected(spec) and _title(spec, snapshot) not in (snapshot.get("rows") or {}):
+            return True
+    return False
+
+
+def _metadata_query(specs, snapshot, needs_header=_projected):
+    """Параметры spreadsheets.get для метаданных листов specs.
+
+    Первые строки листов, для которых needs_header, запрашиваются в том же
+    вызове (ranges и GRID_FIELDS). Диапазон без названия листа API относит
+    к первому листу, поэтому лист номер 0 можно запросить как "1:1", не
+    зная его названия. Для других листов с неизвестными названиями сначала
+    читаются названия всех листов (SHEET_FIELDS), а первые строки - потом.
+    """
+    ranges = []
+    for spec in specs:
+        if not _known_title(spec, snapshot):
+            if spec.worksheet != 0:
+                return {"fields": SHEET_FIELDS}
+            ranges.append("1:1")
+        elif needs_header(spec):
+            ranges.append(f"{_quote(_title(spec, snapshot))}!1:1")
+    return {"fields": GRID_FIELDS, "ranges": list(dict.fromkeys(ranges))}
+
+
+def _apply_metadata(snapshot, sheets):
+    """Запоминает названия листов, число строк их сетки и первые строки.
+
+    С ranges API возвращает только запрошенные листы, поэтому сведения
+    дополняют уже известные, а номер листа берётся из properties.index.
+    """
+    titles = list(snapshot["titles"] or [])
+    rows = dict(snapshot.get("rows") or {})
+    for position, sheet in enumerate(sheets):
+        properties = sheet["properties"]
+        index, title = properties.get("index", position), properties["title"]
+        titles.extend([None] * (index + 1 - len(titles)))
+        titles[index] = title
+        rows[title] = properties.get("gridProperties", {}).get("rowCount", 0)
+        for data in sheet.get("data", []):
+            if data.get("startRow", 0) == 0:
+                snapshot["ranges"][f"{_quote(title)}!1:1"] = _grid_values(data)
+    snapshot["titles"], snapshot["rows"] = titles, rows
+
+
+def _grid_values(data):
+    """Ячейки GridData в виде ответа values.get: без пустых ячеек в конце."""
+    values = []
+    for row in data.get("rowData", []):
+        cells = [cell.get("formattedValue", "") for cell in row.get("values", [])]
+        while cells and cells[-1] == "":
+            cells.pop()
+        values.append(cells)
+    while values and not values[-1]:
+        values.pop()
+    return values
+
+
+def _title(spec, snapshot):
+    return snapshot["titles"][spec.worksheet] if isinstance(spec.worksheet, int) \
+        else spec.worksheet
+
+
+def _quote(title):
+    return "'{}'".format(title.replace("'", "''"))
+
+
+def _column_letter(index):
+    """Буквенное обозначение столбца по номеру с 0: 0 -> A, 26 -> AA."""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def _header_ranges(specs, snapshot):
+    """Диапазоны первых строк листов, из которых выбираются столбцы."""
+    return [f"{_quote(_title(spec, snapshot))}!1:1" for spec in specs if _projected(spec)]
+
+
+def _column_runs(title, header, columns):
+    """Отрезки [первый, последний] номеров столбцов columns по строке header.
+
+    Соседние столбцы объединяются в один отрезок.
+    """
+    positions = {}
+    for index, name in enumerate(header):
+        positions.setdefault(name, index)
+    unknown = [column for column in columns if column not in positions]
+    if unknown:
+        raise KeyError(f"На листе {title!r} нет столбцов {unknown}")
+    runs = []
+    for index in sorted({positions[column] for column in columns}):
+        if runs and runs[-1][1] == index - 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return runs
+
+
+def _column_ranges(spec, snapshot):
+    """Диапазоны столбцов spec.columns до конца сетки листа."""
+    title = _title(spec, snapshot)
+    header = snapshot["ranges"][f"{_quote(title)}!1:1"]
+    header = header[0] if isinstance(header, list) and header \
+        else getattr(header, "column_names", [])
+    rows = max(snapshot["rows"][title], 1)
+    return [f"{_quote(title)}!{_column_letter(first)}1:{_column_letter(last)}{rows}"
+            for first, last in _column_runs(title, header, spec.columns)]
+
+
+def _ranges(specs, snapshot):
+    """Диапазоны batchGet в нотации A1 для каждого листа specs."""
+    ranges = []
+    for spec in specs:
+        if _projected(spec):
+            ranges.append(_column_ranges(spec, snapshot))
+            continue
+        sheet_range = _quote(_title(spec, snapshot))
+        ranges.append([f"{sheet_range}!{spec.range}" if spec.range else sheet_range])
+    return ranges
+
+
+def _missing(snapshot, ranges):
+    """Диапазоны, которых нет в снимке, без повторов."""
+    return [sheet_range for sheet_range in dict.fromkeys(ranges)
+            if sheet_range not in snapshot["ranges"]]
+
+
+def _frame(values, typed):
+    return values_to_dataframe(values, typed) if isinstance(values, list) \
+        else table_to_dataframe(values, typed)
+
+
+def _frames(specs, snapshot, ranges, typed):
+    frames = []
+    for spec, spec_ranges in zip(specs, ranges):
+        frame = _combine(
+            [_frame(snapshot["ranges"][sheet_range], typed) for sheet_range in spec_ranges])
+        frames.append(_select(frame, spec.columns, spec.schema))
+    return frames
+
+
+def _combine(parts):
+    """Склеивает DataFrame соседних диапазонов одних и тех же строк."""
+    if len(parts) == 1:
+        return parts[0]
+    # API не возвращает пустые строки в конце диапазона, поэтому короткие
+    # столбцы дополняются пустыми значениями
+    length = max(len(part) for part in parts)
+    return pd.concat([part.reindex(range(length), fill_value="") for part in parts], axis=1)
+
+
+def _flatten(ranges):
+    return [sheet_range for spec_ranges in ranges for sheet_range in spec_ranges]
+
+
+def load_sheets(service, specs, typed=True, snapshots=None):
+    """Загружает листы specs клиентом Sheets API, по batchGet на таблицу.
+
+    Возвращает список DataFrame в порядке specs. Если у SheetSpec заданы
+    columns без range, по метаданным таблицы находится размер листа, и
+    читаются только эти столбцы до последней строки сетки. С snapshots
+    (SnapshotCache) неизменившиеся таблицы берутся из локальных копий.
+    """
+    specs = [SheetSpec(*spec) for spec in specs]
+    frames = [None] * len(specs)
+
+    def batch_get(spreadsheet_id, snapshot, ranges):
+        missing = _missing(snapshot, ranges)
+        if missing:
+            response = service.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheet_id, ranges=missing).execute()
+            for sheet_range, value_range in zip(missing, response.get("valueRanges", [])):
+                snapshot["ranges"][sheet_range] = value_range.get("values", [])
+        return bool(missing)
+
+    for spreadsheet_id, indexes in _group(specs).items():
+        group = [specs[index] for index in indexes]
+        # Ревизия читается до значений: если таблица изменится между
+        # запросами, снимок просто обновится при следующем запуске
+        snapshot = snapshots.load(spreadsheet_id, snapshots.fetch_revision(spreadsheet_id)) \
+            if snapshots is not None else _empty_snapshot()
+        changed = False
+        if _needs_metadata(group, snapshot):
+            response = service.spreadsheets().get(
+                spreadsheetId=spreadsheet_id, **_metadata_query(group, snapshot)).execute()
+            _apply_metadata(snapshot, response.get("sheets", []))
+            changed = True
+        changed |= batch_get(spreadsheet_id, snapshot, _header_ranges(group, snapshot))
+        ranges = _ranges(group, snapshot)
+        changed |= batch_get(spreadsheet_id, snapshot, _flatten(ranges))
+        if changed and snapshots is not None:
+            snapshots.save(spreadsheet_id, snapshot)
+        for index, frame in zip(indexes, _frames(group, snapshot, ranges, typed)):
+            frames[index] = frame
+    return frames
+
+
+async def load_sheets_async(google, specs, typed=True, snapshots=None):
+    """То же, что load_sheets, через AsyncGoogleClient: таблицы параллельно."""
+    specs = [SheetSpec(*spec) for spec in specs]
+
+    async def batch_get(spreadsheet_id, snapshot, ranges):
+        missing = _missing(snapshot, ranges)
+        if missing:
+            values = await google.batch_get_values(spreadsheet_id, missing)
+            snapshot["ranges"].update(zip(missing, values))
+        return bool(missing)
+
+    async def load(spreadsheet_id, group):
+        snapshot = _empty_snapshot()
+        if snapshots is not None:
+            file = await google.get_file(spreadsheet_id, fields=REVISION_FIELDS)
+            snapshot = snapshots.load(spreadsheet_id, snapshots.revision(file))
+        changed = False
+        if _needs_metadata(group, snapshot):
+            _apply_metadata(snapshot, await google.get_sheet_properties(
+                spreadsheet_id, **_metadata_query(group, snapshot)))
+            changed = True
+        changed |= await batch_get(spreadsheet_id, snapshot, _header_ranges(group, snapshot))
+        ranges = _ranges(group, snapshot)
+        changed |= await batch_get(spreadsheet_id, snapshot, _flatten(ranges))
+        if changed and snapshots is not None:
+            snapshots.save(spreadsheet_id, snapshot)
+        return _frames(group, snapshot, ranges, typed)
+
+    groups = _group(specs)
+    results = await asyncio.gather(
+        *(load(spreadsheet_id, [specs[index] for index in indexes])
+          for spreadsheet_id, indexes in groups.items()))
+    frames = [None] * len(specs)
+    for indexes, group_frames in zip(groups.values(), results):
+        for index, frame in zip(indexes, group_frames):
+            frames[index] = frame
+    return frames
+
+
+def iter_sheet_chunks(service, spreadsheet_id, worksheet=0, columns=None,
+                      chunk_rows=CHUNK_ROWS, typed=False, schema=None, start_row=2,
+                      end_row=None):
+    """Читает лист окнами по chunk_rows строк и выдаёт DataFrame каждого окна.
+
+    Читаются строки листа с start_row (по умолчанию - первой строки после
+    заголовков) по end_row (None - до конца сетки).
+
+    Сначала одним spreadsheets.get читаются размер сетки листа и строка
+    заголовков (см. _metadata_query), затем каждое
+    окно - отдельным batchGet (с columns - только эти столбцы). Индекс окна -
+    номер строки листа минус 2, как у DataFrame всего листа, поэтому по нему
+    можно писать обратно в таблицу. Пустые окна пропускаются, а если строк
+    нет совсем, выдаётся один пустой DataFrame с заголовками. С schema
+    столбцы окна приводятся к типам схемы.
+    """
+    spec = SheetSpec(spreadsheet_id, worksheet)
+    snapshot = _empty_snapshot()
+    response = service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        **_metadata_query([spec], snapshot, needs_header=lambda _: True)).execute()
+    _apply_metadata(snapshot, response.get("sheets", []))
+    title = _title(spec, snapshot)
+    header = snapshot["ranges"].get(f"{_quote(title)}!1:1")
+    if header is None:
+        header = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id, range=f"{_quote(title)}!1:1").execute().get("values")
+    if not header or not header[0]:
+        return
+    header = header[0]
+    runs = _column_runs(title, header, columns) if columns is not None \
+        else [[0, len(header) - 1]]
+    rows = snapshot["rows"][title] if end_row is None else min(end_row, snapshot["rows"][title])
+    empty = True
+    for first_row in range(max(start_row, 2), rows + 1, chunk_rows):
+        last_row = min(first_row + chunk_rows - 1, rows)
+        response = service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[f"{_quote(title)}!{_column_letter(first)}{first_row}:"
+                    f"{_column_letter(last)}{last_row}" for first, last in runs],
+        ).execute()
+        frame = _combine([
+            values_to_dataframe([header[first:last + 1]] + value_range.get("values", []), typed)
+            for (first, last), value_range in zip(runs, response.get("valueRanges", []))])
+        if frame.empty:
+            continue
+        empty = False
+        frame.index = range(first_row - 2, first_row - 2 + len(frame))
+        yield _select(frame, columns, schema)
+    if empty:
+        yield _select(values_to_dataframe([header]), columns, schema)
+
+
+def _select(frame, columns, schema):
+    if columns is not None:
+        frame = frame[columns]
+    return apply_schema(frame, schema) if schema else frame
+
+
+def read_filtered(service, spreadsheet_id, predicate, worksheet=0, columns=None,
+                  chunk_rows=CHUNK_ROWS, typed=False, schema=None):
+    """Строки листа, отобранные predicate, одним DataFrame.
+
+    predicate получает окно iter_sheet_chunks и возвращает булеву маску,
+    например ``lambda chunk: chunk["Статус"] == "Внести"``. В памяти
+    одновременно держатся только текущее окно и уже отобранные строки.
+    """
+    return _concat_chunks([chunk[predicate(chunk)] for chunk in iter_sheet_chunks(
+        service, spreadsheet_id, worksheet, columns, chunk_rows, typed, schema)], columns, schema)
+
+
+def _concat_chunks(frames, columns, schema):
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    frame = pd.concat(frames)
+    # Категории разных окон не совпадают, и concat делает из них строки
+    return apply_schema(frame, schema) if schema else frame
+
+
+class RowCursor(JsonStore):
+    """JSON-файл: (имя обработки, ID таблицы) -> отметка последней обработанной строки.
+
+    Отметка (high-water mark) для read_new_rows - номер строки и значение
+    её первого столбца: следующий запуск читает только строки после неё,
+    а если строка на этом месте уже другая, лист читается целиком.
+    """
+
+    def __init__(self, path=ROW_CURSOR_FILE):
+        super().__init__(path)
+
+    def get(self, name, spreadsheet_id):
+        """Отметка листа или None, если лист ещё не читался."""
+        return super().get(f"{name}:{spreadsheet_id}")
+
+    def set(self, name, spreadsheet_id, mark):
+        super().set(f"{name}:{spreadsheet_id}", mark)
+
+
+def _row_mark(chunk, position):
+    return {"row": int(chunk.index[position]) + 2, "key": str(chunk.iloc[position, 0])}
+
+
+def read_new_rows(service, spreadsheet_id, predicate, mark=None, pending=None,
+                  worksheet=0, columns=None, chunk_rows=CHUNK_ROWS, typed=False, schema=None,
+                  recheck=None):
+    """То же, что read_filtered, но только по строкам листа после отметки mark.
+
+    mark - отметка из RowCursor: номер последней обработанной строки ("row")
+    и значение её первого читаемого столбца ("key"; в таблице ответов на
+    форму это отметка времени, которая у ответа не меняется). Строка mark
+    читается вместе с новыми, и если значение не совпало (строки удалили,
+    отсортировали или очистили), лист читается целиком.
+
+    Возвращает (DataFrame, mark) с новой отметкой. pending(chunk) отмечает
+    строки, которые ещё могут понадобиться в следующий раз (например, ответы,
+    которым пока не проставлен статус): отметка останавливается перед первой
+    такой строкой.
+
+    recheck - столбцы, по которым считается predicate. Они перечитываются
+    для строк до отметки, и если какая-то из них снова подходит (например,
+    статус "Ошибка" исправили на "Внести"), лист читается целиком.
+    """
+    def read_all():
+        return read_new_rows(service, spreadsheet_id, predicate, None, pending, worksheet,
+                             columns, chunk_rows, typed, schema)
+
+    if mark is not None and recheck is not None:
+        # Столбцов recheck немного, поэтому строки до отметки читаются одним окном
+        for chunk in iter_sheet_chunks(service, spreadsheet_id, worksheet, recheck, mark["row"],
+                                       typed, schema, end_row=mark["row"]):
+            if predicate(chunk).fillna(False).any():
+                print(f"Строки таблицы {spreadsheet_id} до отметки снова ждут обработки, "
+                      "лист читается целиком")
+                return read_all()
+    frames = []
+    new_mark, waiting = mark, False
+    chunks = iter_sheet_chunks(service, spreadsheet_id, worksheet, columns, chunk_rows,
+                               typed, schema, mark["row"] if mark else 2)
+    for chunk in chunks:
+        if mark is not None:
+            if chunk.empty or _row_mark(chunk, 0) != mark:
+                chunks.close()
+                print(f"Строка {mark['row']} таблицы {spreadsheet_id} изменилась "
+                      "после прошлого запуска, лист читается целиком")
+                return read_all()
+            chunk, mark = chunk.iloc[1:], None
+        frames.append(chunk[predicate(chunk)])
+        if chunk.empty or waiting:
+            continue
+        done = len(chunk)
+        if pending is not None:
+            flags = pending(chunk).fillna(False).to_numpy(dtype=bool)
+            if flags.any():
+                done, waiting = flags.argmax(), True
+        if done:
+            new_mark = _row_mark(chunk, done - 1)
+    return _concat_chunks(frames, columns, schema), new_mark
+
+
+def _measure(fn, repeat):
+    """Лучшее время выполнения fn за repeat попыток, с."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench(spreadsheet_id, repeat=5, service_account_file="credentials.json"):
+    """Сравнивает загрузку первого листа таблицы разными способами."""
+    drive_service = get_drive_service(service_account_file)
+    sheets_service = get_sheets_service(service_account_file)
+    worksheet = get_pygsheets_client(service_account_file).open_by_key(spreadsheet_id)[0]
+    specs = [SheetSpec(spreadsheet_id, 0)]
+    directory = tempfile.mkdtemp(prefix="dsin-sheets-bench-")
+    try:
+        caches = {"JSON": SnapshotCache(drive_service, os.path.join(directory, "json"), False)}
+        if pa is not None:
+            caches["Arrow"] = SnapshotCache(drive_service, os.path.join(directory, "arrow"), True)
+        revision = next(iter(caches.values())).fetch_revision(spreadsheet_id)
+        for cache in caches.values():
+            load_sheets(sheets_service, specs, snapshots=cache)
+
+        def from_snapshot(cache):
+            snapshot = cache.load(spreadsheet_id, revision)
+            return _frames(specs, snapshot, _ranges(specs, snapshot), True)
+
+        timings = [("pygsheets get_as_df", _measure(worksheet.get_as_df, repeat))]
+        timings += [(f"снимок {name}", _measure(lambda cache=cache: from_snapshot(cache), repeat))
+                    for name, cache in caches.items()]
+        rows = len(from_snapshot(next(iter(caches.values())))[0])
+        print(f"Таблица {spreadsheet_id}, строк: {rows}")
+        for name, seconds in timings:
+            print(f"{name:<24}{seconds * 1000:>12.1f} мс")
+        if pa is None:
+            print("pyarrow не установлен, снимок Arrow не замерялся")
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка Google Таблиц и их снимков.")
+    parser.add_argument(
+        'command',
+        choices=['bench'],
+        help='bench - сравнить время загрузки листа через pygsheets и из снимков')
+    parser.add_argument('spreadsheet_id', help='ID таблицы, например базы БДНС')
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='Число повторов каждого замера (по умолчанию: 5)')
+    parser.add_argument(
+        '--credentials',
+        type=str,
+        default='credentials.json',
+        help='Файл сервисного аккаунта (по умолчанию: credentials.json)')
+    args = parser.parse_args()
+    bench(args.spreadsheet_id, args.repeat, args.credentials)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,113 +1,105 @@
 # Подключение необходимого
 
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from datetime import datetime
-import gspread
 import pandas as pd
-import re
+
+from google_services import get_drive_service, get_gspread_client, get_sheets_service
+from profiling import profile_from_argv, set_stage
+from sheets_loader import SheetSpec, SnapshotCache, load_sheets
+from student_schema import BDNS_SCHEMA, DATE, FORM_SCHEMA, INT, apply_schema, convert, to_sheet_values
+
+# python stat_base.py --profile - запуск с профилированием по этапам
+profile_from_argv()
 
 SERVICE_ACCOUNT_FILE = "credentials.json"
+BDNS_ID = "1Cqa_CERAIpnf3jCPoczB498na8drEMZpDAlUrz9_1cU"  # БДНС ВМК
+FORM_RESPONSES_ID = "1fZhfUDWSGGr6uHQVdMpA1O2KNX32uXpKe8hMMNkoeMM"  # Ответы на форму
+BDNS_COLUMNS = ["Студенческий", "Курс", "Срок действия", "Статус"]
+FORM_COLUMNS = ["Номер студенческого билета", "Курс", "Статус"]
+# Номер студенческого и срок действия читаются текстом: к типам они
+# приводятся только для сравнений, а ячейки, которые не удалось разобрать
+# (например, срок "бессрочно"), попадают в итоговую таблицу как есть
+TEXT_COLUMNS = {"Студенческий", "Срок действия", "Номер студенческого билета"}
 
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE,
-    scopes=[
-        "https://www.googleapis.com/auth/drive",
-        "https://www.googleapis.com/auth/documents",
-    ],
-)
 
-# Создание таблицы из базы
+def text_kept(schema):
+    """Схема без столбцов TEXT_COLUMNS."""
+    return {column: kind for column, kind in schema.items() if column not in TEXT_COLUMNS}
+
 
-gc = gspread.authorize(credentials)
+def student_id(series):
+    """Номер студенческого числом, а если он не разобрался - исходным текстом."""
+    number = convert(series, INT)
+    text = series.astype("string").str.strip()
+    return number.astype(object).mask(number.isna() & (text != ""), text)
 
-ws_bdns = gc.open_by_key(
-    "1Cqa_CERAIpnf3jCPoczB498na8drEMZpDAlUrz9_1cU")  # БДНС ВМК
-data1 = pd.DataFrame(ws_bdns.get_worksheet(0).get_all_records())  # Бюджет ЧП
-data2 = pd.DataFrame(ws_bdns.get_worksheet(1).get_all_records())  # Контракт ЧП
-data_bdns = pd.concat([data1, data2], ignore_index=True)  # объединение листов
 
+# Создание таблицы из базы
 
-data_bdns = data_bdns[["Студенческий", "Курс", "Срок действия", "Статус"]]
+gc = get_gspread_client(SERVICE_ACCOUNT_FILE)
+
+# Оба листа БДНС (Бюджет ЧП, Контракт ЧП) и форма ответов загружаются
+# одним batchGet на таблицу, неизменившиеся таблицы берутся из локальных копий
+set_stage("sheet_load")
+data1, data2, data = load_sheets(get_sheets_service(SERVICE_ACCOUNT_FILE), [
+    SheetSpec(BDNS_ID, 0, BDNS_COLUMNS, schema=text_kept(BDNS_SCHEMA)),
+    SheetSpec(BDNS_ID, 1, BDNS_COLUMNS, schema=text_kept(BDNS_SCHEMA)),
+    SheetSpec(FORM_RESPONSES_ID, 0, FORM_COLUMNS, schema=text_kept(FORM_SCHEMA)),
+], typed=False, snapshots=SnapshotCache(get_drive_service(SERVICE_ACCOUNT_FILE)))
+
+set_stage("join")
+# Категории двух листов различаются, и concat делает из них строки,
+# поэтому объединённые листы снова приводятся к схеме
+data_bdns = apply_schema(pd.concat([data1, data2], ignore_index=True), text_kept(BDNS_SCHEMA))
 data_bdns = data_bdns.rename(
     columns={
         "Студенческий": "Номер студенческого",
         "Срок действия": "Истечение документов",
     }
 )
-data_bdns["Статус"] = data_bdns["Статус"].replace(
+# Статусы заменяются уже как строки: новых значений среди категорий нет
+data_bdns["Статус"] = data_bdns["Статус"].astype("string").fillna("").replace(
     ["", "Ок"], ["В обработке", "Все в порядке"]
 )
 
-# Дополнение таблицы формой ответов
-
-ws_ans = gc.open_by_key(
-    "1fZhfUDWSGGr6uHQVdMpA1O2KNX32uXpKe8hMMNkoeMM"
-)  # Ответы на форму
-data = pd.DataFrame(ws_ans.get_worksheet(0).get_all_records())
+# Проверка истекания даты: пустые и неразобранные даты (NaT) не истекают
+expired = convert(data_bdns["Истечение документов"], DATE) <= pd.Timestamp.today()
+data_bdns.loc[expired, "Статус"] = "Истек срок действия документов"
 
+# Дополнение таблицы формой ответов
 data = data[
-    data["Номер студенческого билета"] != ""
+    data["Номер студенческого билета"].str.strip() != ""
 ]  # оставляем лишь тех, у кого есть номер студака
 
-list_stud = list(data_bdns["Номер студенческого"])
-
 data = data[
-    ~data["Номер студенческого билета"].isin(list_stud)
+    ~student_id(data["Номер студенческого билета"]).isin(
+        student_id(data_bdns["Номер студенческого"]))
 ]  # Этих людей ещё не внесли в базу
 
-data = data[["Номер студенческого билета", "Курс", "Статус"]]
 data = data.rename(
     columns={
         "Номер студенческого билета": "Номер студенческого"})
-data["Статус"] = data["Статус"].replace(
+data["Статус"] = data["Статус"].astype("string").fillna("").replace(
     ["Внести", "Продлить", "", "Ошибка"],
     ["В обработке", "В обработке", "В обработке", "В обработке"],
 )
 
 # Объединение датафреймов
 
-data_bdns = pd.concat(
-    [data_bdns, data], ignore_index=True).fillna("В обработке")
-
-
-# Преобразование "Номер студенческого" в int с заменой на стандартное
-# значение в случае неудачи
-def safe_cast(val, to_type, default=0):
-    try:
-        return to_type(val)
-    except (ValueError, TypeError):
-        print(f"Не удалось преобразовать {val} в {to_type}")
-        return default
-
-
-data_bdns["Номер студенческого"] = data_bdns["Номер студенческого"].map(
-    lambda x: safe_cast(x, int)
-)
-data_bdns = data_bdns.sort_values(by=["Номер студенческого"])
-
-# Проверка истекания даты
-
-
-def search(x): return (
-    datetime.strptime(x, "%d.%m.%Y") <= datetime.today()
-    if re.search(r"\d{2}.\d{2}.\d{4}", x)
-    else False
-)
-
-
-data_bdns["tmp"] = data_bdns["Истечение документов"].map(
-    search
-)  # создаём вспомогательный столбец для проверки истечения даты
+# У строк формы срока нет
+data_bdns = pd.concat([data_bdns, data], ignore_index=True)
+data_bdns["Истечение документов"] = data_bdns["Истечение документов"].fillna("В обработке")
 
-data_bdns["Статус"][data_bdns["tmp"]] = "Истек срок действия документов"
-del data_bdns["tmp"]
+# Номер студенческого записывается числом, неразобранный - текстом,
+# пустой - нулём; по порядку неразобранные идут вместе с пустыми
+data_bdns["Номер студенческого"] = student_id(data_bdns["Номер студенческого"]).fillna(0)
+data_bdns = data_bdns.sort_values(
+    by=["Номер студенческого"], key=lambda ids: convert(ids, INT).fillna(0), kind="stable")
 
 # Загрузка файла на диск
+set_stage("upload")
 
 sh = gc.open_by_key(
     "1XYnZHF1nyA4RANVcNYgn1AxKudt0xC8C-XytDrAf8ck"
 )  # id итоговой таблицы
 worksheet = sh.get_worksheet(0)
-worksheet.update([data_bdns.columns.values.tolist()] +
-                 data_bdns.values.tolist())
+worksheet.update(to_sheet_values(data_bdns))
@@ -0,0 +1,101 @@
+"""Схемы столбцов таблиц со студентами и их компактные типы pandas.
+
+Листы читаются строками, поэтому одни и те же столбцы в разных скриптах
+оказывались то строками, то числами (номер студенческого - int после
+numericise и str без него), и сравнения вроде
+``df["Студенческий"] == str(value)`` молча ничего не находили. Схема
+задаёт тип каждого известного столбца один раз:
+
+* INT - целое с пропусками (Int64), например номер студенческого;
+* CATEGORY - категория для столбцов с небольшим набором значений
+  (курс, направление, форма обучения, категория, статус);
+* DATE - дата в формате ДД.ММ.ГГГГ (datetime64).
+
+Пустые ячейки и значения, которые не удалось разобрать, становятся
+пропусками (NA/NaT). apply_schema приводит DataFrame к схеме,
+SheetSpec(..., schema=...) в sheets_loader делает это при загрузке, а
+to_sheet_values превращает результат обратно в строки для записи в таблицу.
+"""
+import pandas as pd
+
+INT = "int"
+CATEGORY = "category"
+DATE = "date"
+
+DATE_FORMAT = "%d.%m.%Y"
+
+# База БДНС (листы "Бюджет ЧП" и "Контракт ЧП", база ВМК в bases_diff.py)
+BDNS_SCHEMA = {
+    "Студенческий": INT,
+    "Форма": CATEGORY,
+    "Направление": CATEGORY,
+    "Курс": CATEGORY,
+    "Категория": CATEGORY,
+    "Статус": CATEGORY,
+    "Срок действия": DATE,
+}
+
+# База ОПК (OPK_COLUMNS в bases_diff.py)
+OPK_SCHEMA = {
+    "Студ. билет": INT,
+    "бюдж\\контр": CATEGORY,
+    "Направление": CATEGORY,
+    "Курс": CATEGORY,
+    "Категория": CATEGORY,
+    "Справки": DATE,
+}
+
+# Таблица ответов на форму
+FORM_SCHEMA = {
+    "Номер студенческого билета": INT,
+    "Курс": CATEGORY,
+    "Статус": CATEGORY,
+    "База данных": CATEGORY,
+}
+
+
+def _blank_to_na(series):
+    series = series.astype("string").str.strip()
+    return series.mask(series == "")
+
+
+def convert(series, kind):
+    """Приводит столбец к типу kind (INT, CATEGORY или DATE)."""
+    if kind == INT:
+        return pd.to_numeric(_blank_to_na(series), errors="coerce").astype("Int64")
+    if kind == CATEGORY:
+        return _blank_to_na(series).astype(object).astype("category")
+    if kind == DATE:
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series
+        return pd.to_datetime(_blank_to_na(series), format=DATE_FORMAT, errors="coerce")
+    raise ValueError(f"Неизвестный тип столбца: {kind}")
+
+
+def apply_schema(frame, schema):
+    """Копия frame, в которой столбцы из schema приведены к своим типам.
+
+    Столбцы, которых нет в frame, пропускаются, остальные не меняются.
+    После pd.concat категории разных листов не совпадают, и pandas
+    превращает такие столбцы в строки, поэтому объединённый DataFrame
+    стоит снова привести к схеме.
+    """
+    frame = frame.copy()
+    for column, kind in schema.items():
+        if column in frame.columns:
+            frame[column] = convert(frame[column], kind)
+    return frame
+
+
+def to_sheet_values(frame):
+    """Строки frame (с заголовком) для записи в Google Таблицу.
+
+    Даты записываются как ДД.ММ.ГГГГ, пропуски - пустыми ячейками.
+    """
+    frame = frame.copy()
+    for column in frame.columns:
+        series = frame[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime(DATE_FORMAT)
+        frame[column] = series.astype(object).where(series.notna(), "")
+    return [frame.columns.tolist()] + frame.values.tolist()
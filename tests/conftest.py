@@ -0,0 +1,43 @@
+"""Общие фикстуры тестов: все запросы к Google уходят в FakeGoogle.
+
+Режим выбирается при импорте google_services, поэтому переменная
+окружения задаётся до импорта модулей проекта.
+"""
+import atexit
+import os
+import sys
+
+import pytest
+
+os.environ["DSIN_GOOGLE_MODE"] = "fake"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import drive_pool  # noqa: E402
+import google_services  # noqa: E402
+import metrics  # noqa: E402
+
+# Статистика запросов тестов никуда не сохраняется
+atexit.unregister(metrics.write_report)
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    """FakeGoogle, общий для всех тестов; локальные кэши пишутся в tmp_path.
+
+    Состояние FakeGoogle не сбрасывается, поэтому каждый тест работает
+    со своими файлами и таблицами, а запросы считает разницей fake.requests.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(drive_pool.drive_write_limiter, "rate", 1000.0)
+    monkeypatch.setattr(drive_pool.drive_write_limiter, "capacity", 1000.0)
+    return google_services.backend.handler
+
+
+@pytest.fixture
+def drive(fake):
+    return google_services.get_drive_service()
+
+
+@pytest.fixture
+def sheets(fake):
+    return google_services.get_sheets_service()
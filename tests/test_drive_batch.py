@@ -0,0 +1,91 @@
+"""Копирование документов студентов: манифест и замена копий ярлыками."""
+import pytest
+
+import drive_batch
+from drive_batch import CopyManifest, ingest_student_documents
+from drive_dedup import CopyIndex
+from drive_listing import FOLDER_MIME_TYPE, SHORTCUT_MIME_TYPE
+
+DOCUMENTS = 3
+
+
+@pytest.fixture
+def parent(fake):
+    """Папка месяца и исходные документы; возвращает (ID папки, студенты)."""
+    parent_id = fake.add_file("Включение", FOLDER_MIME_TYPE)["id"]
+    sources = [fake.add_file(f"scan{i}.pdf", md5Checksum=f"md5-{parent_id}-{i}")["id"]
+               for i in range(DOCUMENTS)]
+    # Первые двое - однофамильцы с одинаковым именем папки
+    students = [(str(1000 + i), "ИвановИИ" if i < 2 else f"Студент{i}",
+                 {f"{j}.pdf": source for j, source in enumerate(sources)})
+                for i in range(5)]
+    return parent_id, students
+
+
+def children(fake, folder_id):
+    return [file for file in fake.files.values() if file.get("parents") == [folder_id]]
+
+
+def created_files(fake, parent_id):
+    folders = children(fake, parent_id)
+    return folders, [file for folder in folders for file in children(fake, folder["id"])]
+
+
+def test_manifest_rerun_creates_nothing(fake, drive, parent):
+    parent_id, students = parent
+    folder_ids = ingest_student_documents(
+        drive, parent_id, students, manifest=CopyManifest.for_folder(parent_id))
+    folders, documents = created_files(fake, parent_id)
+    assert None not in folder_ids
+    assert len(folders) == len(students)
+    assert len(documents) == len(students) * DOCUMENTS
+
+    again = ingest_student_documents(
+        drive, parent_id, students, manifest=CopyManifest.for_folder(parent_id))
+    assert again == folder_ids
+    assert created_files(fake, parent_id) == (folders, documents)
+
+
+def test_manifest_resumes_after_crash(fake, drive, parent, monkeypatch):
+    parent_id, students = parent
+    execute_batch = drive_batch.execute_batch
+
+    def crash(*args, **kwargs):
+        # Запросы выполнены, но до отметок в манифесте дело не дошло
+        execute_batch(*args, **kwargs)
+        raise RuntimeError("сбой")
+
+    monkeypatch.setattr(drive_batch, "execute_batch", crash)
+    with pytest.raises(RuntimeError):
+        ingest_student_documents(
+            drive, parent_id, students, manifest=CopyManifest.for_folder(parent_id))
+    monkeypatch.setattr(drive_batch, "execute_batch", execute_batch)
+
+    ingest_student_documents(
+        drive, parent_id, students, manifest=CopyManifest.for_folder(parent_id))
+    folders, documents = created_files(fake, parent_id)
+    assert len(folders) == len(students)
+    assert len(documents) == len(students) * DOCUMENTS
+
+
+def test_namesakes_get_separate_folders(fake, drive, parent):
+    parent_id, students = parent
+    ingest_student_documents(
+        drive, parent_id, students, manifest=CopyManifest.for_folder(parent_id))
+    namesakes = [folder for folder in children(fake, parent_id) if folder["name"] == "ИвановИИ"]
+    assert len(namesakes) == 2
+    assert [len(children(fake, folder["id"])) for folder in namesakes] == [DOCUMENTS, DOCUMENTS]
+
+
+def test_unchanged_documents_become_shortcuts(fake, drive, parent):
+    parent_id, students = parent
+    ingest_student_documents(drive, parent_id, students, copy_index=CopyIndex())
+    _, copies = created_files(fake, parent_id)
+
+    next_parent_id = fake.add_file("Продление", FOLDER_MIME_TYPE)["id"]
+    ingest_student_documents(drive, next_parent_id, students, copy_index=CopyIndex())
+    _, documents = created_files(fake, next_parent_id)
+    assert len(documents) == len(students) * DOCUMENTS
+    assert {file["mimeType"] for file in documents} == {SHORTCUT_MIME_TYPE}
+    copy_ids = {file["id"] for file in copies}
+    assert {file["shortcutDetails"]["targetId"] for file in documents} <= copy_ids
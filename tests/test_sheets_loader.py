@@ -0,0 +1,54 @@
+"""Чтение таблиц: новые строки после отметки и локальные снимки."""
+from sheets_loader import RowCursor, SheetSpec, SnapshotCache, load_sheets, read_new_rows
+
+HEADER = ["Отметка времени", "ФИО", "Статус", "База данных"]
+
+
+def answers(fake, spreadsheet_id, rows):
+    fake.load({"spreadsheets": {spreadsheet_id: {
+        "title": "Ответы на форму", "sheets": [{"title": "Ответы", "values": [HEADER] + rows}]}}})
+    return fake.spreadsheets[spreadsheet_id]["sheets"][0]["values"]
+
+
+def needs_enabling(chunk):
+    return (chunk["Статус"] == "Внести") & (chunk["База данных"] != "Ок")
+
+
+def test_row_cursor_reads_only_new_rows(fake, sheets):
+    values = answers(fake, "form-rows", [[f"t{i}", f"Студент {i}", "Внести", ""] for i in range(5)])
+    cursor = RowCursor()
+
+    rows, mark = read_new_rows(sheets, "form-rows", needs_enabling, cursor.get("test", "form-rows"))
+    assert list(rows["ФИО"]) == [f"Студент {i}" for i in range(5)]
+    assert mark == {"row": 6, "key": "t4"}
+    cursor.set("test", "form-rows", mark)
+
+    values.append(["t5", "Студент 5", "Внести", ""])
+    rows, mark = read_new_rows(sheets, "form-rows", needs_enabling, RowCursor().get("test", "form-rows"))
+    assert list(rows["ФИО"]) == ["Студент 5"]
+    assert mark == {"row": 7, "key": "t5"}
+
+
+def test_row_cursor_rescans_changed_sheet(fake, sheets):
+    values = answers(fake, "form-sorted", [[f"t{i}", f"Студент {i}", "Внести", ""] for i in range(3)])
+    _, mark = read_new_rows(sheets, "form-sorted", needs_enabling)
+    # Строки отсортировали: отметка указывает на другую строку
+    values[1:] = values[:0:-1]
+    rows, _ = read_new_rows(sheets, "form-sorted", needs_enabling, mark)
+    assert sorted(rows["ФИО"]) == [f"Студент {i}" for i in range(3)]
+
+
+def test_snapshot_cache_hit(fake, sheets, drive):
+    answers(fake, "base-snapshot", [[f"t{i}", f"Студент {i}", "Продлить", "Ок"] for i in range(50)])
+    specs = [SheetSpec("base-snapshot", 0), SheetSpec("base-snapshot", 0, ["ФИО", "Статус"])]
+
+    before = fake.requests
+    first = load_sheets(sheets, specs, snapshots=SnapshotCache(drive))
+    assert fake.requests - before > 1
+
+    before = fake.requests
+    second = load_sheets(sheets, specs, snapshots=SnapshotCache(drive))
+    # Таблица не менялась: только files.get с ревизией
+    assert fake.requests - before == 1
+    for frame, cached in zip(first, second):
+        assert frame.equals(cached)
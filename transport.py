@@ -0,0 +1,75 @@
+"""HTTP-транспорт с постоянными соединениями и статистикой их переиспользования.
+
+Все клиенты googleapiclient и pygsheets одного потока работают через общий
+PooledHttp: соединение с каждым хостом Google открывается один раз и
+дальше переиспользуется (keep-alive), поэтому TLS-рукопожатие не повторяется
+для каждого нового клиента. gspread работает через requests.Session со своим
+пулом соединений urllib3, его статистика тоже попадает в отчёт.
+
+HTTP/2 в httplib2, на котором построен googleapiclient, не поддерживается,
+поэтому мультиплексирования нет - только переиспользование соединений.
+"""
+import atexit
+import threading
+
+import httplib2
+
+# Общая статистика всех экземпляров PooledHttp
+_stats = {"requests": 0, "connections": 0}
+_stats_lock = threading.Lock()
+# Сессии requests, статистика которых добавляется в отчёт
+_sessions = []
+
+
+class PooledHttp(httplib2.Http):
+    """httplib2.Http, считающий запросы и открытые соединения."""
+
+    def _conn_request(self, conn, request_uri, method, body, headers):
+        with _stats_lock:
+            _stats["requests"] += 1
+            # Соединение без сокета будет открыто заново внутри httplib2
+            if getattr(conn, "sock", None) is None:
+                _stats["connections"] += 1
+        return super()._conn_request(conn, request_uri, method, body, headers)
+
+
+def register_session(session):
+    """Добавляет requests.Session (например, gspread) в отчёт о соединениях."""
+    _sessions.append(session)
+
+
+def _session_stats(session):
+    requests = connections = 0
+    for adapter in session.adapters.values():
+        if not hasattr(adapter, "poolmanager"):
+            continue
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools[key]
+            requests += pool.num_requests
+            connections += pool.num_connections
+    return requests, connections
+
+
+def transport_stats():
+    """Возвращает число запросов и открытых соединений за запуск."""
+    with _stats_lock:
+        requests, connections = _stats["requests"], _stats["connections"]
+    for session in _sessions:
+        session_requests, session_connections = _session_stats(session)
+        requests += session_requests
+        connections += session_connections
+    return {"requests": requests, "connections": connections}
+
+
+def report_transport_stats():
+    """Печатает, какая доля запросов прошла по уже открытым соединениям."""
+    stats = transport_stats()
+    if not stats["requests"]:
+        return
+    reused = stats["requests"] - stats["connections"]
+    print(f"HTTP: запросов {stats['requests']}, открыто соединений {stats['connections']}, "
+          f"по уже открытым соединениям {reused / stats['requests']:.0%}")
+
+
+atexit.register(report_transport_stats)
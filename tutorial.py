@@ -1,8 +1,8 @@
 # _________ ОБЯЗАТЕЛЬНАЯ ЧАСТЬ В ЛЮБОЙ ПРОГРАММЕ _________ #
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from datetime import datetime
 
+from google_services import get_docs_service, get_drive_service
+
 # Получение текущей даты
 current_date = datetime.now().date()
 
@@ -10,16 +10,9 @@ current_date = datetime.now().date()
 SERVICE_ACCOUNT_FILE = 'credentials.json'
 FOLDER_ID = '1jp9bDnn225CvC250JadqWft2z4RSP11l'
 
-# Аутентификация с использованием учетных данных службы
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE,
-    scopes=['https://www.googleapis.com/auth/drive',
-            'https://www.googleapis.com/auth/documents']
-)
-
-# Создание экземпляра клиента для работы с API Google Drive и Google Docs
-drive_service = build('drive', 'v3', credentials=credentials)
-docs_service = build('docs', 'v1', credentials=credentials)
+# Клиенты для работы с API Google Drive и Google Docs (общие на процесс)
+drive_service = get_drive_service(SERVICE_ACCOUNT_FILE)
+docs_service = get_docs_service(SERVICE_ACCOUNT_FILE)
 
 # ________________________________________________________ #
 